@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# Author: Nicolás Pernas Maradei <nicolas.pernas.maradei@emutex.com>
+#
+# See license in LICENSE.txt file.
+#
+# This example is inspired on Arduino Button example.
+# http://arduino.cc/en/Tutorial/Button
+#
+# This example will work "out of the box" on an Intel® Edison board. If
+# you are using a different board such as an Intel® Galileo Gen2, just change the
+# import below. wiringx86 uses the same API for all the boards it supports.
+
+# This example does the same as the button example but, instead of reading the
+# button state in a loop, it asks to be called whenever the button changes.
+
+# Import the time module to wait while the interrupts do the work.
+import time
+
+# Import the GPIOEdison class from the wiringx86 module.
+from wiringx86 import GPIOEdison as GPIO
+
+# Create a new instance of the GPIOEdison class.
+# Setting debug=True gives information about the interaction with sysfs.
+gpio = GPIO(debug=False)
+pin = 13
+button = 2
+
+print 'Setting up pins %d and %d...' % (pin, button)
+
+# Set pin 13 to be used as an output GPIO pin.
+gpio.pinMode(pin, gpio.OUTPUT)
+
+# Set pin 2 to be used as an input GPIO pin.
+gpio.pinMode(button, gpio.INPUT)
+
+
+# This function is called from a background thread every time the button is
+# pressed or released. The timestamp tells when that happened.
+def button_changed(button, timestamp):
+    # If the button is pressed turn ON pin 13
+    if gpio.digitalRead(button) == 1:
+        gpio.digitalWrite(pin, gpio.HIGH)
+
+    # If the button is not pressed turn OFF pin 13
+    else:
+        gpio.digitalWrite(pin, gpio.LOW)
+
+# Call button_changed on both edges of pin 2.
+gpio.attachInterrupt(button, button_changed, gpio.CHANGE)
+
+print 'Waiting for button %d changes now...' % button
+try:
+    while(True):
+        # Nothing to do here. The CPU stays idle until the button changes.
+        time.sleep(1)
+
+# Kill the loop with Ctrl-C.
+except KeyboardInterrupt:
+    # Leave the led turned off.
+    print '\nCleaning up...'
+    gpio.detachInterrupt(button)
+    gpio.digitalWrite(pin, gpio.LOW)
+
+    # Do a general cleanup. Calling this function is not mandatory.
+    gpio.cleanup()
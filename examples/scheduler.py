@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# This example will work "out of the box" on an Intel® Edison board. If
+# you are using a different board such as an Intel® Galileo Gen2, just change the
+# import below. wiringx86 uses the same API for all the boards it supports.
+
+# This example blinks two leds at different rates without any sleep in the
+# program. A scheduler calls the blink functions at exact times instead, so the
+# rates do not drift however long each write takes.
+
+# Import the GPIOEdison and Scheduler classes from the wiringx86 module.
+from wiringx86 import GPIOEdison as GPIO, Scheduler
+
+# Create a new instance of the GPIOEdison class.
+# Setting debug=True gives information about the interaction with sysfs.
+gpio = GPIO(debug=False)
+pins = [12, 13]
+states = {}
+
+# Set pins 12 and 13 to be used as output GPIO pins.
+print 'Setting up pins %s' % pins
+gpio.pinModes({12: gpio.OUTPUT, 13: gpio.OUTPUT})
+for pin in pins:
+    states[pin] = gpio.LOW
+
+
+# This function toggles the state of a pin.
+def blink(pin):
+    states[pin] = gpio.LOW if states[pin] == gpio.HIGH else gpio.HIGH
+    gpio.digitalWrite(pin, states[pin])
+
+# Blink pin 12 every half a second and pin 13 four times faster.
+scheduler = Scheduler()
+slow = scheduler.every(0.5, blink, 12)
+fast = scheduler.every(0.125, blink, 13)
+
+print 'Blinking pins %s now...' % pins
+try:
+    # Run the tasks from here until the program is killed.
+    scheduler.run()
+
+# When you get tired of seeing the leds blinking kill the program with Ctrl-C.
+except KeyboardInterrupt:
+    # Report how well the blinks kept their times.
+    print '\nMissed %d and %d blinks' % (slow.misses, fast.misses)
+
+    # Leave the leds turned off.
+    print 'Cleaning up...'
+    for pin in pins:
+        gpio.digitalWrite(pin, gpio.LOW)
+
+    # Do a general cleanup. Calling this function is not mandatory.
+    gpio.cleanup()
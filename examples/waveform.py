@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# This example will work "out of the box" on an Intel® Edison board. If
+# you are using a different board such as an Intel® Galileo Gen2, just change the
+# import below. wiringx86 uses the same API for all the boards it supports.
+
+# This example does the same as the fade example but, instead of writing every
+# brightness step from a loop, it hands the whole fade to the library, which
+# plays it from a background thread with steady timing.
+
+# Import the time module to wait while the waveform plays.
+import time
+
+# Import the GPIOEdison class from the wiringx86 module.
+from wiringx86 import GPIOEdison as GPIO
+
+# Create a new instance of the GPIOEdison class.
+# Setting debug=True gives information about the interaction with sysfs.
+gpio = GPIO(debug=False)
+pin = 3
+
+# Brightness going up and down in steps of 5. The values must be between 0 and
+# 255, like for analogWrite.
+fade = range(0, 255, 5) + range(255, 0, -5)
+
+# Set pin 3 to be used as a PWM pin.
+print 'Setting up pin %d' % pin
+gpio.pinMode(pin, gpio.PWM)
+
+print 'Fading pin %d now...' % pin
+# Play a new brightness value every 30ms, over and over again.
+gpio.playWaveform(pin, fade, 0.03, loop=True)
+try:
+    while(True):
+        # Nothing to do here. The led fades by itself.
+        time.sleep(1)
+
+# When you get tired of seeing the led fading kill the loop with Ctrl-C.
+except KeyboardInterrupt:
+    # Stop fading and leave the led turned off.
+    print '\nCleaning up...'
+    gpio.stopWaveform(pin)
+    gpio.analogWrite(pin, 0)
+
+    # Do a general cleanup. Calling this function is not mandatory.
+    gpio.cleanup()
@@ -9,15 +9,21 @@
 # See license in LICENSE.txt file.
 
 
+import sys
 from distutils.core import setup
 
+modules = ['wiringx86']
+# The asyncio support does not even compile on older versions.
+if sys.version_info >= (3, 7):
+    modules.append('wiringx86_asyncio')
+
 setup(
     name='Wiring-x86',
     version='1.0.0',
     author='Nicolás Pernas Maradei',
     author_email='nicolas.pernas.maradei@emutex.com',
     url='https://github.com/emutex/wiring-x86',
-    py_modules=['wiringx86'],
+    py_modules=modules,
     license='BSD',
     description='A Python module to use most Arduino wiring functions on Intel® Arduino capable boards.',
     long_description=open('README.rst').read(),
@@ -25,5 +31,6 @@ setup(
         'License :: OSI Approved :: BSD License',
         'Programming Language :: Python',
         'Programming Language :: Python :: 2.7',
+        'Programming Language :: Python :: 3',
     ],
 )
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Shared helpers of the tests, which run the board classes against a
+# SysfsSimulator.
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import wiringx86
+
+BOARDS = (wiringx86.GPIOGalileo, wiringx86.GPIOGalileoGen2,
+          wiringx86.GPIOEdison)
+
+
+def sysfs_files(simulator):
+    # Path relative to the root -> first line of every simulated file.
+    files = {}
+    for directory, _, names in os.walk(simulator.root):
+        for name in names:
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as f:
+                files[path[len(simulator.root):]] = f.readline()
+    return files
+
+
+def line_state(simulator):
+    # Requested line -> (output, level) of the simulated GPIO chips.
+    chip = simulator.gpiochip
+    state = {}
+    for lines, output, edge, pipe in chip.requests.values():
+        for line in lines:
+            state[line] = (output, chip.levels.get(line, 0))
+    return state
+
+
+class SimulatorTestCase(unittest.TestCase):
+
+    def board(self, board, **kwargs):
+        # Cleanups run last in first out: the board before its simulator.
+        simulator = wiringx86.SysfsSimulator(board)
+        self.addCleanup(simulator.destroy)
+        gpio = board(simulator=simulator, **kwargs)
+        self.addCleanup(gpio.cleanup)
+        return gpio, simulator
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of analogReadMany.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import array
+import unittest
+
+from helpers import BOARDS, SimulatorTestCase
+from wiringx86 import ANALOG_INPUT, INPUT
+
+RAW = {14: 4095, 15: 0, 16: 2048, 17: 7}
+
+
+class AnalogReadManyTest(SimulatorTestCase):
+
+    def configure(self, board):
+        gpio, simulator = self.board(board)
+        gpio.pinModes(dict((pin, ANALOG_INPUT) for pin in RAW))
+        for pin, raw in RAW.items():
+            simulator.set_analog(pin, raw)
+        return gpio, simulator
+
+    def test_read_many(self):
+        for board in BOARDS:
+            gpio, simulator = self.configure(board)
+            values = gpio.analogReadMany((17, 14, 16, 15))
+            self.assertEqual(values, array.array('H', [1, 1023, 512, 0]))
+            self.assertEqual(list(values), [gpio.analogRead(pin)
+                                            for pin in (17, 14, 16, 15)])
+
+    def test_raw(self):
+        gpio, simulator = self.configure(BOARDS[1])
+        self.assertEqual(list(gpio.analogReadMany((14, 17), raw=True)),
+                         [4095, 7])
+
+    def test_out_reused(self):
+        gpio, simulator = self.configure(BOARDS[1])
+        out = array.array('H', [0, 0])
+        self.assertIs(gpio.analogReadMany((14, 16), out=out), out)
+        self.assertEqual(list(out), [1023, 512])
+        simulator.set_analog(14, 0)
+        gpio.analogReadMany((14, 16), out=out)
+        self.assertEqual(list(out), [0, 512])
+
+    def test_invalid_pins(self):
+        gpio, simulator = self.configure(BOARDS[1])
+        gpio.pinMode(2, INPUT)
+        self.assertIsNone(gpio.analogReadMany((14, 2)))
+        self.assertIsNone(gpio.analogReadMany((14, 18)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of the asyncio support. Edges are only waited for on boards using the
+# GPIO character devices, as epoll refuses the simulated value files.
+#
+# Written without the async syntax, so that the older Pythons skip them
+# instead of failing to compile them.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import sys
+import unittest
+
+from helpers import SimulatorTestCase
+import wiringx86
+from wiringx86 import ANALOG_INPUT, CHANGE, FALLING, INPUT, RISING
+
+if sys.version_info >= (3, 7):
+    import asyncio
+    from wiringx86_asyncio import AsyncGPIO
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'requires Python 3.7')
+class AsyncGPIOTest(SimulatorTestCase):
+
+    def setUp(self):
+        self.gpio, self.simulator = self.board(wiringx86.GPIOGalileoGen2,
+                                               gpiochip=True)
+        self.gpio.pinMode(2, INPUT)
+        self.async_gpio = AsyncGPIO(self.gpio)
+        self.addCleanup(self.async_gpio.close)
+
+    def run_loop(self, coroutines, *levels):
+        # Run coroutines concurrently on a new event loop, driving the level
+        # of pin 2 through levels meanwhile. Returns their results.
+        loop = asyncio.new_event_loop()
+        try:
+            for index, level in enumerate(levels):
+                loop.call_later(0.02 * (index + 1),
+                                self.simulator.set_digital, 2, level)
+            tasks = [loop.create_task(coroutine) for coroutine in coroutines]
+            return loop.run_until_complete(asyncio.gather(*tasks))
+        finally:
+            loop.close()
+
+    def test_wait_for_edge(self):
+        timestamp, = self.run_loop(
+            [self.async_gpio.wait_for_edge(2, RISING, timeout=1)], 1)
+        self.assertLessEqual(timestamp, wiringx86._monotonic())
+
+    def test_waiters_for_different_edges(self):
+        waits = [self.async_gpio.wait_for_edge(2, RISING, timeout=1),
+                 self.async_gpio.wait_for_edge(2, FALLING, timeout=1),
+                 self.async_gpio.wait_for_edge(2, CHANGE, timeout=1)]
+        rising, falling, change = self.run_loop(waits, 1, 0)
+        self.assertLess(rising, falling)
+        self.assertEqual(change, rising)
+
+    def test_other_edge_does_not_complete(self):
+        wait = self.async_gpio.wait_for_edge(2, FALLING, timeout=0.1)
+        with self.assertRaises(asyncio.TimeoutError):
+            self.run_loop([wait], 1)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            self.run_loop([self.async_gpio.wait_for_edge(20)])
+        with self.assertRaises(ValueError):
+            self.run_loop([self.async_gpio.wait_for_edge(2, 'up')])
+
+    def test_unwatch_cancels_waits(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        task = loop.create_task(self.async_gpio.wait_for_edge(2))
+        loop.call_later(0.02, self.async_gpio.unwatch, 2)
+        with self.assertRaises(asyncio.CancelledError):
+            loop.run_until_complete(task)
+        self.assertEqual(self.gpio.line_events, {})
+        self.assertEqual(self.gpio.digitalRead(2), 0)
+
+    def test_new_event_loop(self):
+        for level in (1, 0, 1):
+            self.run_loop([self.async_gpio.wait_for_edge(2, timeout=1)],
+                          level)
+        self.assertIsNotNone(self.async_gpio.loop)
+
+    def test_sample(self):
+        self.gpio.pinMode(14, ANALOG_INPUT)
+        self.simulator.set_analog(14, 4095)
+        samples = self.async_gpio.sample(14, 0.01, count=3)
+        values = []
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        while True:
+            try:
+                values.append(loop.run_until_complete(samples.__anext__()))
+            except StopAsyncIteration:
+                break
+        self.assertEqual([value for timestamp, value in values],
+                         [1023] * 3)
+        periods = [b[0] - a[0] for a, b in zip(values, values[1:])]
+        self.assertTrue(all(period >= 0.009 for period in periods), periods)
+
+
+if __name__ == '__main__':
+    unittest.main()
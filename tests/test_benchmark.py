@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of tools/benchmark.py, run with a few iterations.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+BENCHMARK = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         os.pardir, 'tools', 'benchmark.py')
+ENTRY_POINTS = ['analogRead', 'analogWrite', 'digitalRead', 'digitalWrite',
+                'pinMode', 'setPWMPeriod']
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def benchmark(self, *args):
+        output = subprocess.check_output([sys.executable, BENCHMARK,
+                                          '-n', '20'] + list(args))
+        return output.decode('utf-8').splitlines()
+
+    def test_output_and_compare(self):
+        path = os.path.join(self.directory, 'results.json')
+        lines = self.benchmark('--output', path)
+        # A header and a row per board and entry point, nothing else.
+        self.assertEqual(len(lines), 1 + 3 * len(ENTRY_POINTS))
+        with open(path) as f:
+            report = json.load(f)
+        self.assertFalse(report['hardware'])
+        self.assertEqual(sorted(report['results']),
+                         ['edison', 'galileo', 'galileo2'])
+        for results in report['results'].values():
+            self.assertEqual(sorted(results), ENTRY_POINTS)
+            for result in results.values():
+                self.assertEqual(result['iterations'], 20)
+                self.assertGreater(result['ops_per_sec'], 0)
+                self.assertLessEqual(result['p50_us'], result['p99_us'])
+
+        lines = self.benchmark('galileo2', '--only', 'digitalWrite',
+                               '--compare', path)
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0].split()[-1], 'change')
+        self.assertTrue(lines[1].split()[-1].endswith('%'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of analogCapture.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import array
+import unittest
+
+from helpers import BOARDS, SimulatorTestCase
+import wiringx86
+from wiringx86 import IIO_SYSFS
+
+
+class CaptureTest(SimulatorTestCase):
+
+    def capture_board(self, board=wiringx86.GPIOGalileoGen2,
+                      scan_type='be:u12/16>>0'):
+        simulator = wiringx86.SysfsSimulator(board, scan_type=scan_type)
+        self.addCleanup(simulator.destroy)
+        gpio = board(simulator=simulator)
+        self.addCleanup(gpio.cleanup)
+        return gpio, simulator
+
+    def iio(self, gpio, simulator, name):
+        return simulator.read('%s/iio:device%d/%s' %
+                              (IIO_SYSFS, gpio.adc_iio_device, name))
+
+    def test_read(self):
+        for board in BOARDS:
+            gpio, simulator = self.capture_board(board)
+            capture = gpio.analogCapture((15, 14))
+            # Readings come in channel order, whatever the order of pins.
+            self.assertEqual(capture.pins, (14, 15))
+            simulator.feed_capture([(4095, 0), (2048, 1024)])
+            self.assertEqual(list(capture.read(2)), [1023, 0, 512, 256])
+            capture.stop()
+
+    def test_raw(self):
+        gpio, simulator = self.capture_board()
+        capture = gpio.analogCapture((14, ), raw=True)
+        simulator.feed_capture([(4095, ), (17, )])
+        self.assertEqual(list(capture.read(2)), [4095, 17])
+
+    def test_little_endian_shifted(self):
+        gpio, simulator = self.capture_board(scan_type='le:u12/16>>4')
+        capture = gpio.analogCapture((14, 16), raw=True)
+        simulator.feed_capture([(4095, 1), (2, 3)])
+        self.assertEqual(list(capture.read(2)), [4095, 1, 2, 3])
+
+    def test_readinto(self):
+        gpio, simulator = self.capture_board()
+        capture = gpio.analogCapture((14, 15))
+        simulator.feed_capture([(4, 8), (12, 16), (20, 24)])
+        # Only whole scans fit.
+        out = array.array('H', [0] * 5)
+        self.assertEqual(capture.readinto(out), 4)
+        self.assertEqual(list(out), [1, 2, 3, 4, 0])
+
+    def test_settings_and_stop(self):
+        gpio, simulator = self.capture_board()
+        capture = gpio.analogCapture((14, ), trigger='hrtimer-trig0',
+                                     length=64)
+        self.assertEqual(self.iio(gpio, simulator,
+                                  'trigger/current_trigger'), 'hrtimer-trig0')
+        self.assertEqual(self.iio(gpio, simulator, 'buffer/length'), '64')
+        self.assertEqual(self.iio(gpio, simulator, 'buffer/enable'), '1')
+        self.assertEqual(self.iio(gpio, simulator,
+                                  'scan_elements/in_voltage0_en'), '1')
+        capture.stop()
+        self.assertEqual(self.iio(gpio, simulator, 'buffer/enable'), '0')
+        self.assertEqual(self.iio(gpio, simulator,
+                                  'scan_elements/in_voltage0_en'), '0')
+        self.assertIsNone(gpio.capture)
+        capture.stop()
+
+    def test_one_capture_at_a_time(self):
+        gpio, simulator = self.capture_board()
+        capture = gpio.analogCapture((14, ))
+        self.assertIsNone(gpio.analogCapture((15, )))
+        capture.stop()
+        self.assertIsNotNone(gpio.analogCapture((15, )))
+
+    def test_invalid_pins(self):
+        gpio, simulator = self.capture_board()
+        self.assertIsNone(gpio.analogCapture(()))
+        self.assertIsNone(gpio.analogCapture((14, 2)))
+        self.assertIsNone(gpio.capture)
+
+    def test_cleanup_stops_capture(self):
+        gpio, simulator = self.capture_board()
+        gpio.analogCapture((14, ))
+        gpio.cleanup()
+        self.assertIsNone(gpio.capture)
+        self.assertEqual(self.iio(gpio, simulator, 'buffer/enable'), '0')
+
+
+if __name__ == '__main__':
+    unittest.main()
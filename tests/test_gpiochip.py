@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of the GPIO character device backend.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import errno
+import sys
+import unittest
+
+from helpers import BOARDS, SimulatorTestCase
+import wiringx86
+from wiringx86 import (ANALOG_INPUT, CHANGE, INPUT, INPUT_PULLUP, OUTPUT,
+                       PWM)
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+BIAS_DISABLE = 1 << 7
+# Pull resistor GPIO of pin 2 on the Galileo Gen2.
+PULL_LINE = 35
+
+
+class GPIOChipTest(SimulatorTestCase):
+
+    def test_high_impedance_bias_disabled(self):
+        gpio, simulator = self.board(wiringx86.GPIOGalileoGen2, gpiochip=True)
+        flags = simulator.gpiochip.flags
+        gpio.pinMode(2, INPUT)
+        self.assertEqual(gpio.gpio_state[PULL_LINE]['drive'], 'hiz')
+        self.assertEqual(flags[PULL_LINE], BIAS_DISABLE)
+        self.assertEqual(flags[gpio.GPIO_MAPPING[2]], 0)
+        # The pull resistor GPIO becomes an output driving it.
+        gpio.pinMode(2, INPUT_PULLUP)
+        self.assertEqual(flags[PULL_LINE], 0)
+        gpio.pinMode(2, INPUT)
+        self.assertEqual(flags[PULL_LINE], BIAS_DISABLE)
+
+    def test_bias_unsupported(self):
+        gpio, simulator = self.board(wiringx86.GPIOGalileoGen2, gpiochip=True)
+        chip = simulator.gpiochip
+        request_lines = chip.request_lines
+
+        def old_kernel(fd, offsets, output, values, label, flags=0):
+            if flags:
+                raise OSError(errno.EINVAL, 'Invalid argument')
+            return request_lines(fd, offsets, output, values, label, flags)
+
+        chip.request_lines = old_kernel
+        stdout = sys.stdout
+        sys.stdout = output = StringIO()
+        try:
+            gpio.pinMode(2, INPUT)
+            gpio.pinMode(4, INPUT)
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(output.getvalue().count('bias not supported'), 1)
+        self.assertFalse(gpio.line_bias)
+        self.assertIn(PULL_LINE, chip.requested)
+        self.assertEqual(chip.flags[PULL_LINE], 0)
+
+    def test_line_handles_released(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board, gpiochip=True)
+            gpio.pinModes({2: INPUT, 3: PWM, 4: OUTPUT, 14: ANALOG_INPUT})
+            self.assertEqual(simulator.exported(), set())
+            self.assertIn(board.GPIO_MAPPING[4], simulator.gpiochip.requested)
+            gpio.releasePin(4)
+            self.assertNotIn(board.GPIO_MAPPING[4],
+                             simulator.gpiochip.requested)
+            self.assertNotIn(board.GPIO_MAPPING[4], gpio.line_handles)
+            gpio.cleanup()
+            self.assertEqual(simulator.gpiochip.requested, set())
+            self.assertEqual(simulator.gpiochip.requests, {})
+            self.assertEqual(simulator.gpiochip.chips, {})
+            self.assertEqual(gpio.line_handles, {})
+
+    def test_interrupt_keeps_line_requested(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board, gpiochip=True)
+            gpio.pinMode(2, INPUT)
+            linux_pin = board.GPIO_MAPPING[2]
+            callback = lambda pin, timestamp: None
+            self.assertTrue(gpio.attachInterrupt(2, callback, CHANGE))
+            self.assertIn(linux_pin, gpio.line_events)
+            gpio.detachInterrupt(2)
+            self.assertNotIn(linux_pin, gpio.line_events)
+            self.assertIn(linux_pin, simulator.gpiochip.requested)
+            gpio.cleanup()
+            self.assertEqual(simulator.gpiochip.requested, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
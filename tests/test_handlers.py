@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of digitalWrite, digitalRead and analogRead through the open value
+# handlers.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import os
+import unittest
+
+from helpers import BOARDS, SimulatorTestCase
+from wiringx86 import ANALOG_INPUT, HIGH, INPUT, LOW, OUTPUT
+
+
+class HandlersTest(SimulatorTestCase):
+
+    def test_digital_write(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            gpio.pinMode(13, OUTPUT)
+            for state in (HIGH, LOW, HIGH, HIGH):
+                gpio.digitalWrite(13, state)
+                self.assertEqual(simulator.get_digital(13),
+                                 0 if state == LOW else 1)
+
+    def test_digital_read_follows_changes(self):
+        # The descriptors are never moved from offset 0, so every read sees
+        # the current value.
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            gpio.pinMode(2, INPUT)
+            for level in (1, 1, 0, 1, 0):
+                simulator.set_digital(2, level)
+                self.assertEqual(gpio.digitalRead(2), level)
+
+    def test_analog_read_scales_to_10_bits(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            gpio.pinMode(14, ANALOG_INPUT)
+            for raw, value in ((0, 0), (4095, 1023), (2048, 512), (7, 1)):
+                simulator.set_analog(14, raw)
+                self.assertEqual(gpio.analogRead(14), value)
+
+    def test_handler_shared_by_calls(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            gpio.pinMode(13, OUTPUT)
+            fd = gpio.gpio_handlers[board.GPIO_MAPPING[13]]
+            gpio.digitalWrite(13, HIGH)
+            gpio.pinMode(13, OUTPUT)
+            self.assertEqual(gpio.gpio_handlers[board.GPIO_MAPPING[13]], fd)
+            self.assertEqual(os.lseek(fd, 0, os.SEEK_CUR), 0)
+
+    def test_invalid_pins(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            self.assertIsNone(gpio.digitalWrite(20, HIGH))
+            self.assertIsNone(gpio.digitalRead(20))
+            self.assertIsNone(gpio.analogRead(2))
+
+
+if __name__ == '__main__':
+    unittest.main()
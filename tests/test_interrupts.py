@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of attachInterrupt and of the thread dispatching the edges.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import os
+import threading
+import unittest
+
+from helpers import BOARDS, SimulatorTestCase
+import wiringx86
+from wiringx86 import CHANGE, FALLING, INPUT, RISING
+
+TIMEOUT = 2
+
+
+class Recorder(object):
+
+    """Callback recording its calls, which can be waited for."""
+
+    def __init__(self, raises=False):
+        self.calls = []
+        self.raises = raises
+        self.event = threading.Event()
+
+    def __call__(self, pin, timestamp):
+        self.calls.append((pin, timestamp))
+        self.event.set()
+        if self.raises:
+            raise RuntimeError('callback failure')
+
+    def wait(self, count=1):
+        while len(self.calls) < count:
+            self.event.clear()
+            if len(self.calls) >= count:
+                break
+            if not self.event.wait(TIMEOUT):
+                return False
+        return True
+
+
+def read_bytes(fd):
+    # Stand-in for GPIOChipIO.read_events on a pipe: one edge per byte.
+    return len(os.read(fd, 64))
+
+
+class DispatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatcher = wiringx86._InterruptDispatcher()
+        self.dispatcher.start()
+        self.addCleanup(self.dispatcher.stop)
+
+    def pipe(self):
+        read_end, write_end = os.pipe()
+        self.addCleanup(os.close, read_end)
+        self.addCleanup(os.close, write_end)
+        return read_end, write_end
+
+    def test_callback_per_edge(self):
+        read_end, write_end = self.pipe()
+        callback = Recorder()
+        self.dispatcher.add(read_end, 7, callback, read_bytes)
+        os.write(write_end, b'xxx')
+        self.assertTrue(callback.wait(3))
+        self.assertEqual([pin for pin, timestamp in callback.calls],
+                         [7, 7, 7])
+
+    def test_failing_callback_keeps_thread_alive(self):
+        read_end, write_end = self.pipe()
+        callback = Recorder(raises=True)
+        self.dispatcher.add(read_end, 7, callback, read_bytes)
+        os.write(write_end, b'x')
+        self.assertTrue(callback.wait(1))
+        os.write(write_end, b'x')
+        self.assertTrue(callback.wait(2))
+        self.assertTrue(self.dispatcher.is_alive())
+
+    def test_failing_read_keeps_thread_alive(self):
+        read_end, write_end = self.pipe()
+
+        def closed(fd):
+            raise OSError(9, os.strerror(9))
+
+        self.dispatcher.add(read_end, 7, Recorder(), closed)
+        os.write(write_end, b'x')
+        self.dispatcher.remove(read_end)
+        other_read, other_write = self.pipe()
+        callback = Recorder()
+        self.dispatcher.add(other_read, 8, callback, read_bytes)
+        os.write(other_write, b'x')
+        self.assertTrue(callback.wait(1))
+        self.assertTrue(self.dispatcher.is_alive())
+
+    def test_removed_descriptor_is_ignored(self):
+        read_end, write_end = self.pipe()
+        callback = Recorder()
+        self.dispatcher.add(read_end, 7, callback, read_bytes)
+        self.dispatcher.remove(read_end)
+        os.write(write_end, b'x')
+        self.assertFalse(callback.event.wait(0.1))
+
+
+class AttachInterruptTest(SimulatorTestCase):
+
+    def test_edges_on_lines(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board, gpiochip=True)
+            gpio.pinMode(2, INPUT)
+            callback = Recorder()
+            self.assertTrue(gpio.attachInterrupt(2, callback, CHANGE))
+            simulator.set_digital(2, 1)
+            simulator.set_digital(2, 0)
+            self.assertTrue(callback.wait(2))
+            self.assertEqual(callback.calls[0][0], 2)
+
+    def test_only_requested_edges(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board, gpiochip=True)
+            gpio.pinMode(2, INPUT)
+            rising = Recorder()
+            gpio.pinMode(4, INPUT)
+            falling = Recorder()
+            self.assertTrue(gpio.attachInterrupt(2, rising, RISING))
+            self.assertTrue(gpio.attachInterrupt(4, falling, FALLING))
+            simulator.set_digital(2, 1)
+            simulator.set_digital(4, 1)
+            self.assertTrue(rising.wait(1))
+            self.assertFalse(falling.event.wait(0.1))
+            simulator.set_digital(2, 0)
+            simulator.set_digital(4, 0)
+            self.assertTrue(falling.wait(1))
+            self.assertEqual(len(rising.calls), 1)
+
+    def test_detach_stops_callbacks(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board, gpiochip=True)
+            gpio.pinMode(2, INPUT)
+            callback = Recorder()
+            self.assertTrue(gpio.attachInterrupt(2, callback, CHANGE))
+            gpio.detachInterrupt(2)
+            self.assertNotIn(2, gpio.interrupt_fds)
+            simulator.set_digital(2, 1)
+            self.assertFalse(callback.event.wait(0.1))
+            # The pin is readable again through its line handle.
+            self.assertEqual(gpio.digitalRead(2), 1)
+
+    def test_invalid_arguments(self):
+        gpio, simulator = self.board(wiringx86.GPIOGalileoGen2)
+        self.assertFalse(gpio.attachInterrupt(20, Recorder(), CHANGE))
+        self.assertFalse(gpio.attachInterrupt(2, Recorder(), 'both'))
+        self.assertIsNone(gpio.dispatcher)
+
+    def test_sysfs_edge_reset_on_failure(self):
+        # Simulated value files are regular files, which epoll refuses.
+        gpio, simulator = self.board(wiringx86.GPIOGalileoGen2)
+        gpio.pinMode(2, INPUT)
+        self.assertFalse(gpio.attachInterrupt(2, Recorder(), RISING))
+        path = '%s/gpio%d/edge' % (wiringx86.GPIO_SYSFS,
+                                   gpio.GPIO_MAPPING[2])
+        self.assertEqual(simulator.read(path), 'none')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of the export registry: releasePin, cleanup and failed exports.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import errno
+import os
+import unittest
+
+from helpers import BOARDS, SimulatorTestCase
+from wiringx86 import ANALOG_INPUT, GPIO_SYSFS, INPUT, OUTPUT, PWM
+
+
+class LifecycleTest(SimulatorTestCase):
+
+    def test_release_pin_unexports_unused_gpios(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            gpio.pinMode(2, INPUT)
+            gpio.pinMode(4, OUTPUT)
+            gpio.releasePin(4)
+            self.assertNotIn(board.GPIO_MAPPING[4], simulator.exported())
+            # Still in use by pin 2.
+            self.assertIn(board.GPIO_MAPPING[2], simulator.exported())
+            # Released GPIOs are exported again when needed.
+            gpio.pinMode(4, OUTPUT)
+            self.assertIn(board.GPIO_MAPPING[4], simulator.exported())
+
+    def test_pin_mode_twice_exports_once(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            gpio.pinMode(4, OUTPUT)
+            exports = gpio.stats().get('export', {}).get('count', 0)
+            gpio.pinMode(4, INPUT)
+            gpio.pinMode(4, OUTPUT)
+            self.assertEqual(
+                gpio.stats().get('export', {}).get('count', 0), exports)
+
+    def test_cleanup_unexports_everything(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            gpio.pinModes({2: INPUT, 3: PWM, 4: OUTPUT, 14: ANALOG_INPUT})
+            gpio.cleanup()
+            self.assertEqual(simulator.exported(), set())
+            self.assertEqual(gpio.pins_in_use, set())
+            self.assertEqual(gpio.gpio_state, {})
+            self.assertEqual(gpio.fd_paths, {})
+
+    def test_export_retried_after_failure(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            linux_pin = board.GPIO_MAPPING[13]
+            if linux_pin in simulator.exported():
+                # The Edison exports all its GPIOs up front.
+                continue
+            notify = simulator.notify
+            failed = []
+
+            def flaky_notify(path, value):
+                if path == GPIO_SYSFS + '/export' and \
+                        int(value) == linux_pin and not failed:
+                    failed.append(value)
+                    raise OSError(errno.EAGAIN, os.strerror(errno.EAGAIN))
+                notify(path, value)
+
+            simulator.notify = flaky_notify
+            gpio.pinMode(13, OUTPUT)
+            self.assertEqual(len(failed), 1)
+            self.assertNotIn(linux_pin, gpio.pins_in_use)
+            gpio.pinMode(13, OUTPUT)
+            self.assertIn(linux_pin, simulator.exported())
+            self.assertIn(linux_pin, gpio.pins_in_use)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of digitalWriteMany and digitalReadMany.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import itertools
+import unittest
+
+from helpers import BOARDS, SimulatorTestCase
+import wiringx86
+from wiringx86 import HIGH, INPUT, LOW, OUTPUT
+
+OUTPUTS = (4, 7, 8, 13)
+INPUTS = (2, 5)
+
+
+class ManyTest(SimulatorTestCase):
+
+    def configure(self, board, **kwargs):
+        gpio, simulator = self.board(board, **kwargs)
+        modes = dict((pin, OUTPUT) for pin in OUTPUTS)
+        modes.update((pin, INPUT) for pin in INPUTS)
+        self.assertTrue(gpio.pinModes(modes))
+        return gpio, simulator
+
+    def check_write_many(self, gpio, simulator):
+        states = {4: HIGH, 7: LOW, 8: HIGH, 13: HIGH}
+        gpio.digitalWriteMany(states)
+        self.assertEqual(dict((pin, simulator.get_digital(pin))
+                              for pin in states),
+                         {4: 1, 7: 0, 8: 1, 13: 1})
+        gpio.digitalWriteMany({4: LOW, 13: LOW})
+        self.assertEqual([simulator.get_digital(pin) for pin in OUTPUTS],
+                         [0, 0, 1, 0])
+
+    def check_read_many(self, gpio, simulator):
+        simulator.set_digital(2, 1)
+        simulator.set_digital(5, 0)
+        self.assertEqual(gpio.digitalReadMany((2, 5)), (1, 0))
+        self.assertEqual(gpio.digitalReadMany([5, 2, 5]), (0, 1, 0))
+        simulator.set_digital(5, 1)
+        self.assertEqual(gpio.digitalReadMany((2, 5)), (1, 1))
+
+    def test_write_many(self):
+        for board in BOARDS:
+            self.check_write_many(*self.configure(board))
+
+    def test_write_many_on_lines(self):
+        for board in BOARDS:
+            self.check_write_many(*self.configure(board, gpiochip=True))
+
+    def test_read_many(self):
+        for board in BOARDS:
+            self.check_read_many(*self.configure(board))
+
+    def test_read_many_on_lines(self):
+        for board in BOARDS:
+            self.check_read_many(*self.configure(board, gpiochip=True))
+
+    def test_unconfigured_pin(self):
+        for gpiochip in (None, True):
+            gpio, simulator = self.configure(wiringx86.GPIOGalileoGen2,
+                                             gpiochip=gpiochip)
+            self.assertIsNone(gpio.digitalReadMany((2, 3)))
+            self.assertIsNone(gpio.digitalWriteMany({4: HIGH, 12: HIGH}))
+
+    def test_pin_sets_cache_bounded(self):
+        gpio, simulator = self.configure(wiringx86.GPIOGalileoGen2)
+        pins = OUTPUTS + INPUTS
+        for size in range(1, len(pins) + 1):
+            for subset in itertools.permutations(pins, size):
+                gpio.digitalReadMany(subset)
+        self.assertLessEqual(len(gpio.many_fds), wiringx86._MANY_FDS_CACHED)
+        simulator.set_digital(2, 1)
+        self.assertEqual(gpio.digitalReadMany((2, 4)), (1, 0))
+
+    def test_handlers_reopened_after_release(self):
+        gpio, simulator = self.configure(wiringx86.GPIOGalileoGen2)
+        self.assertEqual(gpio.digitalReadMany((2, 5)), (0, 0))
+        gpio.releasePin(5)
+        self.assertIsNone(gpio.digitalReadMany((2, 5)))
+        gpio.pinMode(5, INPUT)
+        simulator.set_digital(5, 1)
+        self.assertEqual(gpio.digitalReadMany((2, 5)), (0, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
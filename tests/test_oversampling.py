@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of analogReadOversampled.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import unittest
+
+from helpers import BOARDS, SimulatorTestCase
+import wiringx86
+from wiringx86 import ANALOG_INPUT, INPUT
+
+
+class OversamplingTest(SimulatorTestCase):
+
+    def configure(self, board=wiringx86.GPIOGalileoGen2):
+        gpio, simulator = self.board(board)
+        gpio.pinMode(14, ANALOG_INPUT)
+        return gpio, simulator
+
+    def feed(self, samples):
+        # Make the ADC reads return samples, one after the other.
+        samples = iter(samples)
+        pread = wiringx86._pread
+
+        def fake_pread(fd, size):
+            return ('%d\n' % next(samples)).encode('ascii')
+
+        wiringx86._pread = fake_pread
+        self.addCleanup(setattr, wiringx86, '_pread', pread)
+
+    def test_constant_input(self):
+        for board in BOARDS:
+            gpio, simulator = self.configure(board)
+            simulator.set_analog(14, 2048)
+            self.assertEqual(gpio.analogReadOversampled(14, 8), 512)
+            self.assertEqual(gpio.analogReadOversampled(14, 8, bits=12), 2048)
+            self.assertEqual(gpio.analogReadOversampled(14, 8, bits=14), 8192)
+
+    def test_full_scale(self):
+        gpio, simulator = self.configure()
+        simulator.set_analog(14, 4095)
+        self.assertEqual(gpio.analogReadOversampled(14, 4), 1023)
+        self.assertEqual(gpio.analogReadOversampled(14, 4, bits=12), 4095)
+        self.assertEqual(gpio.analogReadOversampled(14, 16, bits=14), 16380)
+
+    def test_mean_adds_resolution(self):
+        gpio, simulator = self.configure()
+        # Mean 100.5 in 12 bits, 402 in 14 bits.
+        self.feed([100, 101] * 8)
+        self.assertEqual(gpio.analogReadOversampled(14, 16, bits=14), 402)
+
+    def test_mean_rounds_to_nearest(self):
+        gpio, simulator = self.configure()
+        # Mean 6 in 12 bits, 1.5 in 10 bits.
+        self.feed([4, 8])
+        self.assertEqual(gpio.analogReadOversampled(14, 2), 2)
+
+    def test_median_ignores_spikes(self):
+        gpio, simulator = self.configure()
+        self.feed([400, 4095, 404, 0, 408])
+        self.assertEqual(gpio.analogReadOversampled(14, 5, 'median', 12),
+                         404)
+        self.feed([400, 4095, 404, 0])
+        self.assertEqual(gpio.analogReadOversampled(14, 4, 'median', 12),
+                         402)
+
+    def test_invalid_arguments(self):
+        gpio, simulator = self.configure()
+        gpio.pinMode(2, INPUT)
+        self.assertIsNone(gpio.analogReadOversampled(2, 4))
+        self.assertIsNone(gpio.analogReadOversampled(15, 4))
+        self.assertIsNone(gpio.analogReadOversampled(14, 0))
+        self.assertIsNone(gpio.analogReadOversampled(14, 4, 'mode'))
+
+
+if __name__ == '__main__':
+    unittest.main()
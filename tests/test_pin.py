@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of the Pin objects, and of the calls on pins not configured yet.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import sys
+import unittest
+
+from helpers import BOARDS, SimulatorTestCase
+import wiringx86
+from wiringx86 import ANALOG_INPUT, HIGH, INPUT, LOW, OUTPUT, PWM
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class PinTest(SimulatorTestCase):
+
+    def test_write_and_read(self):
+        for board in BOARDS:
+            for gpiochip in (None, True):
+                gpio, simulator = self.board(board, gpiochip=gpiochip)
+                gpio.pinMode(13, OUTPUT)
+                gpio.pinMode(2, INPUT)
+                out, inp = gpio.pin(13), gpio.pin(2)
+                out.write(HIGH)
+                self.assertEqual(simulator.get_digital(13), 1)
+                out.write(LOW)
+                self.assertEqual(simulator.get_digital(13), 0)
+                simulator.set_digital(2, 1)
+                self.assertEqual(inp.read(), 1)
+
+    def test_analog_read(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            gpio.pinMode(14, ANALOG_INPUT)
+            simulator.set_analog(14, 2000)
+            self.assertEqual(gpio.pin(14).read(), 500)
+
+    def test_duty(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            gpio.pinMode(3, PWM)
+            gpio.pin(3).duty(255)
+            state = gpio.pwmState()[3]
+            self.assertEqual(state['value'], 255)
+            self.assertEqual(state['duty_cycle'], state['period'])
+
+    def test_same_object_across_pin_mode(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            gpio.pinMode(13, INPUT)
+            pin = gpio.pin(13)
+            gpio.pinMode(13, OUTPUT)
+            self.assertIs(gpio.pin(13), pin)
+            self.assertEqual(pin.mode, OUTPUT)
+            pin.write(HIGH)
+            self.assertEqual(simulator.get_digital(13), 1)
+
+    def test_released_pin_raises(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            gpio.pinMode(13, OUTPUT)
+            pin = gpio.pin(13)
+            gpio.releasePin(13)
+            self.assertIsNone(gpio.pin(13))
+            self.assertRaises(OSError, pin.write, HIGH)
+
+
+class NotConfiguredTest(SimulatorTestCase):
+
+    def call(self, func, *args):
+        # Returns the result of func and what it printed.
+        stdout = sys.stdout
+        sys.stdout = output = StringIO()
+        try:
+            result = func(*args)
+        finally:
+            sys.stdout = stdout
+        return result, output.getvalue()
+
+    def test_reported(self):
+        gpio, simulator = self.board(wiringx86.GPIOGalileoGen2)
+        for func, args in ((gpio.digitalWrite, (13, HIGH)),
+                           (gpio.digitalRead, (2, )),
+                           (gpio.analogRead, (14, ))):
+            result, output = self.call(func, *args)
+            self.assertIsNone(result)
+            self.assertIn('has not been configured', output)
+        self.assertEqual(gpio.pin(13), None)
+
+    def test_invalid_pins_ignored(self):
+        gpio, simulator = self.board(wiringx86.GPIOGalileoGen2)
+        for func, args in ((gpio.digitalWrite, (20, HIGH)),
+                           (gpio.digitalRead, (20, )),
+                           (gpio.analogRead, (2, ))):
+            self.assertEqual(self.call(func, *args), (None, ''))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of pinModes.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import random
+import unittest
+
+from helpers import BOARDS, SimulatorTestCase, line_state, sysfs_files
+from wiringx86 import (ANALOG_INPUT, INPUT, INPUT_PULLDOWN, INPUT_PULLUP,
+                       OUTPUT, PWM)
+
+MODES = (OUTPUT, INPUT, INPUT_PULLUP, INPUT_PULLDOWN, ANALOG_INPUT, PWM)
+
+
+def random_modes(board, rand):
+    # Valid modes for a random subset of the pins of a board.
+    modes = {}
+    for pin in rand.sample(range(20), rand.randint(1, 8)):
+        mode = rand.choice(MODES)
+        if mode == ANALOG_INPUT and pin not in board.ADC_MAPPING:
+            continue
+        if mode == PWM and board.PWM_MAPPING.get(pin) is None:
+            continue
+        modes[pin] = mode
+    return modes
+
+
+class PinModesTest(SimulatorTestCase):
+
+    def check_equivalence(self, gpiochip):
+        rand = random.Random(1)
+        for board in BOARDS:
+            for trial in range(20):
+                modes = random_modes(board, rand)
+                if not modes:
+                    continue
+                sequential, sequential_sim = self.board(board,
+                                                        gpiochip=gpiochip)
+                for pin in sorted(modes):
+                    self.assertTrue(sequential.pinMode(pin, modes[pin]))
+                merged, merged_sim = self.board(board, gpiochip=gpiochip)
+                self.assertTrue(merged.pinModes(modes))
+
+                message = '%s %r' % (board.__name__, modes)
+                self.assertEqual(sequential_sim.exported(),
+                                 merged_sim.exported(), message)
+                self.assertEqual(sequential.gpio_state, merged.gpio_state,
+                                 message)
+                self.assertEqual(sysfs_files(sequential_sim),
+                                 sysfs_files(merged_sim), message)
+                self.assertEqual(line_state(sequential_sim),
+                                 line_state(merged_sim), message)
+                sequential.cleanup()
+                merged.cleanup()
+
+    def test_same_result_as_pin_mode(self):
+        self.check_equivalence(None)
+
+    def test_same_result_as_pin_mode_on_lines(self):
+        self.check_equivalence(True)
+
+    def test_invalid_mode_touches_nothing(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            files = sysfs_files(simulator)
+            self.assertFalse(gpio.pinModes({13: OUTPUT, 2: ANALOG_INPUT}))
+            self.assertEqual(sysfs_files(simulator), files)
+
+    def test_invalid_pin_touches_nothing(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            files = sysfs_files(simulator)
+            self.assertFalse(gpio.pinModes({13: OUTPUT, 20: INPUT}))
+            self.assertEqual(sysfs_files(simulator), files)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of the PWM writes skipped when the value is set already, and of the
+# PWM periods.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import errno
+import os
+import unittest
+
+from helpers import BOARDS, SimulatorTestCase
+from wiringx86 import PWM
+
+
+class PWMTest(SimulatorTestCase):
+
+    def configure(self, board):
+        gpio, simulator = self.board(board)
+        gpio.pinMode(3, PWM)
+        return gpio, simulator
+
+    def record(self, simulator, fail=None):
+        # Returns the list of the attributes written from now on. Writes to
+        # attributes ending with fail raise EIO until it is set to None.
+        notify = simulator.notify
+        writes = []
+        self.failing = fail
+
+        def recording_notify(path, value):
+            if self.failing is not None and path.endswith(self.failing):
+                raise OSError(errno.EIO, os.strerror(errno.EIO))
+            writes.append(os.path.basename(path))
+            notify(path, value)
+
+        simulator.notify = recording_notify
+        return writes
+
+    def test_analog_write_skips_same_value(self):
+        for board in BOARDS:
+            gpio, simulator = self.configure(board)
+            gpio.resetStats()
+            gpio.analogWrite(3, 100)
+            gpio.analogWrite(3, 100)
+            self.assertEqual(gpio.stats()['pwm_duty']['count'], 1)
+            gpio.analogWrite(3, 101)
+            self.assertEqual(gpio.stats()['pwm_duty']['count'], 2)
+
+    def test_period_skips_same_value(self):
+        for board in BOARDS:
+            gpio, simulator = self.configure(board)
+            writes = self.record(simulator)
+            gpio.setPWMPeriod(3, 2000000)
+            gpio.setPWMPeriod(3, 2000000)
+            self.assertEqual([w for w in writes if w.endswith('period')],
+                             ['pwm_period' if board.__name__.endswith('Gen2')
+                              else 'period'])
+            self.assertEqual(gpio.pwmState()[3]['period'], 2000000)
+
+    def test_failed_period_not_recorded(self):
+        for board in BOARDS:
+            gpio, simulator = self.configure(board)
+            period = gpio._get_pwm_period(3)
+            writes = self.record(simulator, fail='period')
+            gpio.setPWMPeriod(3, 2000000)
+            self.assertEqual(writes, [])
+            self.assertEqual(gpio._get_pwm_period(3), period)
+            self.assertEqual(gpio.pwmState()[3]['period'], period)
+            # Nothing was set, so the same period is written again.
+            self.failing = None
+            gpio.setPWMPeriod(3, 2000000)
+            self.assertEqual(gpio._get_pwm_period(3), 2000000)
+            self.assertEqual(gpio.pwmState()[3]['period'], 2000000)
+
+    def test_invalid_period_ignored(self):
+        for board in BOARDS:
+            gpio, simulator = self.configure(board)
+            writes = self.record(simulator)
+            gpio.setPWMPeriod(3, board.PWM_MIN_PERIOD - 1)
+            gpio.setPWMPeriod(3, board.PWM_MAX_PERIOD + 1)
+            self.assertEqual(writes, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of the duty cycles kept when the PWM period changes.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import unittest
+
+from helpers import BOARDS, SimulatorTestCase
+import wiringx86
+from wiringx86 import PWM
+
+
+class PWMPeriodTest(SimulatorTestCase):
+
+    def configure(self, board, pins):
+        gpio, simulator = self.board(board)
+        for pin, value in pins.items():
+            gpio.pinMode(pin, PWM)
+            gpio.analogWrite(pin, value)
+        return gpio, simulator
+
+    def record(self, gpio):
+        # Returns the list of the (operation, value) PWM writes made from
+        # now on, in order.
+        writes = []
+        for name in ('_write_handler', '_write_sysfs'):
+            def recording(caller, target, value, write=getattr(gpio, name),
+                          **kwargs):
+                if 'pwm' in caller:
+                    writes.append((caller, int(value)))
+                return write(caller, target, value, **kwargs)
+            setattr(gpio, name, recording)
+        return writes
+
+    def test_duty_cycles_kept(self):
+        for board in BOARDS:
+            gpio, simulator = self.configure(board, {3: 255, 5: 51})
+            for period in (1000000, 2000000):
+                gpio.setPWMPeriod(3, period)
+                gpio.setPWMPeriod(5, period)
+                state = gpio.pwmState()
+                self.assertEqual(state[3]['duty_cycle'], period)
+                self.assertEqual(state[5]['duty_cycle'], period // 5)
+                self.assertEqual(state[5]['value'], 51)
+
+    def test_shared_period_rescales_all_channels(self):
+        gpio, simulator = self.configure(wiringx86.GPIOGalileoGen2,
+                                         {3: 255, 5: 51, 6: 0})
+        writes = self.record(gpio)
+        # Shorter: the duty cycles go first, so none is ever longer than
+        # the period.
+        gpio.setPWMPeriod(3, 1000000)
+        self.assertEqual(writes[-1], ('_set_pwm_period', 1000000))
+        self.assertEqual(sorted(writes[:-1]),
+                         [('_set_pwm_duty_cycle', 200000),
+                          ('_set_pwm_duty_cycle', 1000000)])
+        # Longer: the period goes first.
+        del writes[:]
+        gpio.setPWMPeriod(5, 2000000)
+        self.assertEqual(writes[0], ('_set_pwm_period', 2000000))
+        self.assertEqual(sorted(writes[1:]),
+                         [('_set_pwm_duty_cycle', 400000),
+                          ('_set_pwm_duty_cycle', 2000000)])
+        state = gpio.pwmState()
+        self.assertEqual([state[pin]['period'] for pin in (3, 5, 6)],
+                         [2000000] * 3)
+        self.assertEqual(state[6]['duty_cycle'], 0)
+
+    def test_new_channel_gets_shared_period(self):
+        gpio, simulator = self.configure(wiringx86.GPIOGalileoGen2, {3: 255})
+        gpio.setPWMPeriod(3, 1000000)
+        gpio.pinMode(5, PWM)
+        gpio.analogWrite(5, 255)
+        state = gpio.pwmState()[5]
+        self.assertEqual(state['period'], 1000000)
+        self.assertEqual(state['duty_cycle'], 1000000)
+
+    def test_per_channel_periods(self):
+        for board in BOARDS:
+            if board is wiringx86.GPIOGalileoGen2:
+                continue
+            gpio, simulator = self.configure(board, {3: 255, 5: 255})
+            gpio.setPWMPeriod(3, 1000000)
+            state = gpio.pwmState()
+            self.assertEqual(state[3]['duty_cycle'], 1000000)
+            self.assertEqual(state[5]['duty_cycle'],
+                             board.PWM_DEFAULT_PERIOD)
+
+
+if __name__ == '__main__':
+    unittest.main()
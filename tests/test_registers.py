@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of the memory mapped GPIO register backend, against an ordinary file
+# standing for the register window.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+
+from helpers import SimulatorTestCase
+import wiringx86
+from wiringx86 import HIGH, INPUT, LOW, OUTPUT
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class RegistersTest(SimulatorTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'resource')
+        self.create(4096)
+
+    def create(self, size):
+        with open(self.path, 'wb') as f:
+            f.write(b'\0' * size)
+
+    def word(self, offset):
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return struct.unpack('<I', f.read(4))[0]
+
+    def set_word(self, offset, value):
+        with open(self.path, 'r+b') as f:
+            f.seek(offset)
+            f.write(struct.pack('<I', value))
+
+    def registers_board(self, board):
+        gpio, simulator = self.board(board, registers=self.path)
+        self.assertIsNotNone(gpio.register_map)
+        return gpio, simulator
+
+    def test_read_modify_write(self):
+        # Galileo Gen2: pin 13 is bit 7 of the data register at 0x00.
+        gpio, simulator = self.registers_board(wiringx86.GPIOGalileoGen2)
+        self.set_word(0x00, 0x01)
+        gpio.pinMode(13, OUTPUT)
+        self.assertIsInstance(gpio.pin(13), wiringx86._RegisterPin)
+        gpio.digitalWrite(13, HIGH)
+        self.assertEqual(self.word(0x00), 0x81)
+        gpio.digitalWrite(13, LOW)
+        self.assertEqual(self.word(0x00), 0x01)
+        # Written to the registers, not to the value file.
+        self.assertEqual(simulator.get_digital(13), 0)
+        self.set_word(0x50, 0x80)
+        self.assertEqual(gpio.digitalRead(13), 1)
+        self.set_word(0x50, 0x7f)
+        self.assertEqual(gpio.digitalRead(13), 0)
+
+    def test_set_and_clear_registers(self):
+        # Edison: pin 13 is GPIO 40, bit 8 of the second bank.
+        gpio, simulator = self.registers_board(wiringx86.GPIOEdison)
+        gpio.pinMode(13, OUTPUT)
+        gpio.digitalWrite(13, HIGH)
+        self.assertEqual(self.word(0x38), 0x100)
+        self.assertEqual(self.word(0x50), 0)
+        gpio.digitalWrite(13, LOW)
+        self.assertEqual(self.word(0x50), 0x100)
+        self.set_word(0x08, 0x100)
+        self.assertEqual(gpio.pin(13).read(), 1)
+
+    def test_pins_without_registers_use_sysfs(self):
+        gpio, simulator = self.registers_board(wiringx86.GPIOGalileoGen2)
+        gpio.pinMode(12, OUTPUT)
+        gpio.pinMode(2, INPUT)
+        self.assertIs(type(gpio.pin(12)), wiringx86.Pin)
+        gpio.digitalWrite(12, HIGH)
+        self.assertEqual(simulator.get_digital(12), 1)
+
+    def test_timed_through_sysfs(self):
+        gpio, simulator = self.registers_board(wiringx86.GPIOGalileoGen2)
+        gpio.pinMode(13, OUTPUT)
+        gpio.resetStats()
+        gpio.enableHandlerStats()
+        gpio.digitalWrite(13, HIGH)
+        self.assertEqual(simulator.get_digital(13), 1)
+        self.assertEqual(self.word(0x00), 0)
+        gpio.enableHandlerStats(False)
+        gpio.digitalWrite(13, LOW)
+        gpio.digitalWrite(13, HIGH)
+        self.assertEqual(self.word(0x00), 0x80)
+        self.assertEqual(gpio.stats()['value_write']['count'], 3)
+
+    def test_not_mapped(self):
+        for board, size in ((wiringx86.GPIOGalileo, 4096),
+                            (wiringx86.GPIOGalileoGen2, 16)):
+            self.create(size)
+            stdout = sys.stdout
+            sys.stdout = output = StringIO()
+            try:
+                gpio, simulator = self.board(board, registers=self.path)
+            finally:
+                sys.stdout = stdout
+            self.assertTrue(output.getvalue())
+            self.assertIsNone(gpio.register_map)
+            gpio.pinMode(13, OUTPUT)
+            gpio.digitalWrite(13, HIGH)
+            self.assertEqual(simulator.get_digital(13), 1)
+
+    def test_cleanup_unmaps(self):
+        gpio, simulator = self.registers_board(wiringx86.GPIOGalileoGen2)
+        gpio.pinMode(13, OUTPUT)
+        gpio.digitalWrite(13, HIGH)
+        gpio.cleanup()
+        self.assertIsNone(gpio.register_map)
+        self.assertEqual(gpio.register_words, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of SampleBus and of the sampler publishing into it.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from helpers import SimulatorTestCase
+import wiringx86
+from wiringx86 import ANALOG_INPUT, INPUT, SampleBus
+
+
+class SampleBusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'bus')
+
+    def create(self, **kwargs):
+        bus = SampleBus.create(self.path, **kwargs)
+        self.addCleanup(bus.close)
+        return bus
+
+    def attach(self):
+        bus = SampleBus.attach(self.path)
+        self.addCleanup(bus.close)
+        return bus
+
+    def test_publish_and_read(self):
+        bus = self.create(analog_pins=(14, 15), digital_pins=(2, 3, 4))
+        reader = self.attach()
+        self.assertEqual(reader.analog_pins, (14, 15))
+        self.assertEqual(reader.digital_pins, (2, 3, 4))
+        self.assertIsNone(reader.latest())
+        bus.publish(1.5, (1023, 0), (1, 0, 1))
+        bus.publish(2.5, (512, 7), (0, 1, 0))
+        samples, cursor = reader.read()
+        self.assertEqual(samples, [(1.5, (1023, 0), (1, 0, 1)),
+                                   (2.5, (512, 7), (0, 1, 0))])
+        self.assertEqual(reader.read(cursor), ([], 2))
+        self.assertEqual(reader.latest(), (2.5, (512, 7), (0, 1, 0)))
+
+    def test_overwritten_samples_skipped(self):
+        bus = self.create(analog_pins=(14, ), slots=4)
+        for i in range(10):
+            bus.publish(i, (i, ), ())
+        samples, cursor = self.attach().read()
+        self.assertEqual([sample[0] for sample in samples], [6, 7, 8, 9])
+        self.assertEqual(cursor, 10)
+
+    def test_attach_invalid(self):
+        self.assertIsNone(SampleBus.attach(self.path))
+        with open(self.path, 'wb') as f:
+            f.write(b'\0' * 4096)
+        self.assertIsNone(SampleBus.attach(self.path))
+
+    def test_recreate_while_attached(self):
+        bus = self.create(analog_pins=(14, ), slots=1024)
+        for i in range(1024):
+            bus.publish(i, (i, ), ())
+        reader = self.attach()
+        self.create(analog_pins=(14, ), slots=1)
+        # A reader killed by SIGBUS would take the test runner with it, so
+        # it reads the old bus from a child process.
+        pid = os.fork()
+        if pid == 0:
+            samples, cursor = reader.read()
+            os._exit(0 if len(samples) == 1024 else 1)
+        self.assertEqual(os.waitpid(pid, 0)[1], 0)
+        self.assertEqual(self.attach().slots, 1)
+        self.assertEqual(os.listdir(self.directory), ['bus'])
+
+
+class SamplerTest(SimulatorTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'bus')
+
+    def test_samples_published(self):
+        gpio, simulator = self.board(wiringx86.GPIOGalileoGen2)
+        gpio.pinMode(14, ANALOG_INPUT)
+        gpio.pinMode(2, INPUT)
+        simulator.set_analog(14, 4095)
+        simulator.set_digital(2, 1)
+        self.assertIsNotNone(gpio.startSampler(self.path, (14, ), (2, )))
+        reader = SampleBus.attach(self.path)
+        self.addCleanup(reader.close)
+        deadline = time.time() + 5
+        while reader.latest() is None and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(reader.latest()[1:], ((1023, ), (1, )))
+        self.assertIsNone(gpio.startSampler(self.path, (14, )))
+        gpio.stopSampler()
+        self.assertIsNone(gpio.sampler)
+
+    def test_pins_not_configured(self):
+        gpio, simulator = self.board(wiringx86.GPIOGalileoGen2)
+        self.assertIsNone(gpio.startSampler(self.path, (14, )))
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of the Scheduler.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import threading
+import time
+import unittest
+
+from wiringx86 import Scheduler
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def start(self):
+        scheduler = Scheduler()
+        scheduler.start()
+        self.addCleanup(scheduler.stop)
+        return scheduler
+
+    def wait_runs(self, task, runs):
+        deadline = time.time() + 5
+        while task.runs < runs and time.time() < deadline:
+            time.sleep(0.005)
+        self.assertGreaterEqual(task.runs, runs)
+
+    def test_runs_in_order(self):
+        scheduler = Scheduler()
+        calls = []
+
+        def record(name):
+            calls.append(name)
+            if len(calls) == 6:
+                scheduler.stop()
+
+        scheduler.every(0.01, record, 'a')
+        scheduler.every(0.01, record, 'b')
+        scheduler.run()
+        self.assertEqual(calls, ['a', 'b'] * 3)
+        self.assertIsNone(scheduler.wakeup)
+
+    def test_woken_up_by_new_task(self):
+        scheduler = self.start()
+        scheduler.every(60, lambda: None)
+        time.sleep(0.05)
+        ran = threading.Event()
+        start = time.time()
+        scheduler.every(0.01, ran.set)
+        self.assertTrue(ran.wait(5))
+        self.assertLess(time.time() - start, 0.09)
+
+    def test_stop_wakes_up(self):
+        scheduler = Scheduler()
+        scheduler.every(60, lambda: None)
+        scheduler.start()
+        time.sleep(0.05)
+        start = time.time()
+        scheduler.stop()
+        self.assertLess(time.time() - start, 0.09)
+        self.assertIsNone(scheduler.thread)
+        self.assertIsNone(scheduler.wakeup)
+
+    def test_misses_counted(self):
+        scheduler = self.start()
+        task = scheduler.every(0.01, time.sleep, 0.035)
+        self.wait_runs(task, 3)
+        scheduler.stop()
+        self.assertGreaterEqual(task.misses, 2 * (task.runs - 1))
+        self.assertGreater(task.max_lateness, 0)
+
+    def test_cancel(self):
+        scheduler = self.start()
+        task = scheduler.every(0.005, lambda: None)
+        self.wait_runs(task, 2)
+        task.cancel()
+        # It may be running at that very moment.
+        time.sleep(0.02)
+        runs = task.runs
+        time.sleep(0.05)
+        self.assertEqual(task.runs, runs)
+        self.assertNotIn(task, scheduler.tasks)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of the shadow mux state kept by pinMode, and of resync.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import unittest
+
+from helpers import BOARDS, SimulatorTestCase
+from wiringx86 import (ANALOG_INPUT, GPIO_SYSFS, HIGH, INPUT, INPUT_PULLUP,
+                       OUTPUT, PWM)
+
+# Operations that only configure the GPIOs, which pinMode skips when the
+# shadow state says they are already done.
+SETUP_OPS = ('export', 'direction', 'drive', 'mux', 'line_request')
+
+PIN_MODES = ((4, OUTPUT), (3, PWM), (14, ANALOG_INPUT), (2, INPUT_PULLUP))
+
+
+def setup_counts(gpio):
+    stats = gpio.stats()
+    return dict((op, stats[op]['count']) for op in SETUP_OPS if op in stats)
+
+
+class ShadowStateTest(SimulatorTestCase):
+
+    def test_repeated_pin_mode_skips_writes(self):
+        for board in BOARDS:
+            for gpiochip in (None, True):
+                gpio, simulator = self.board(board, gpiochip=gpiochip)
+                for pin, mode in PIN_MODES:
+                    gpio.pinMode(pin, mode)
+                counts = setup_counts(gpio)
+                for pin, mode in PIN_MODES:
+                    gpio.pinMode(pin, mode)
+                self.assertEqual(setup_counts(gpio), counts,
+                                 '%s gpiochip=%r' % (board.__name__,
+                                                     gpiochip))
+
+    def test_output_starts_low_again(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            gpio.pinMode(13, OUTPUT)
+            gpio.digitalWrite(13, HIGH)
+            gpio.pinMode(13, OUTPUT)
+            self.assertEqual(simulator.get_digital(13), 0)
+
+    def test_resync_after_external_change(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            gpio.pinMode(4, OUTPUT)
+            path = '%s/gpio%d/direction' % (GPIO_SYSFS,
+                                            board.GPIO_MAPPING[4])
+            simulator._write(simulator.root + path, INPUT)
+            # Unnoticed without resync, as the shadow state says output.
+            gpio.pinMode(4, OUTPUT)
+            self.assertEqual(simulator.read(path), INPUT)
+            gpio.resync()
+            gpio.pinMode(4, OUTPUT)
+            self.assertEqual(simulator.read(path), OUTPUT)
+
+    def test_resync_after_external_unexport(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            gpio.pinMode(4, OUTPUT)
+            linux_pin = board.GPIO_MAPPING[4]
+            simulator.notify(GPIO_SYSFS + '/unexport', str(linux_pin))
+            gpio.resync()
+            gpio.pinMode(4, OUTPUT)
+            self.assertIn(linux_pin, simulator.exported())
+            gpio.digitalWrite(4, HIGH)
+            self.assertEqual(simulator.get_digital(4), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
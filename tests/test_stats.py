@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of the operation counters returned by stats.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import errno
+import os
+import unittest
+
+from helpers import BOARDS, SimulatorTestCase
+import wiringx86
+from wiringx86 import ANALOG_INPUT, GPIO_SYSFS, HIGH, INPUT, LOW, OUTPUT
+
+
+class StatsTest(SimulatorTestCase):
+
+    def configure(self, board=wiringx86.GPIOGalileoGen2, **kwargs):
+        gpio, simulator = self.board(board, **kwargs)
+        gpio.pinModes({13: OUTPUT, 2: INPUT, 14: ANALOG_INPUT})
+        return gpio, simulator
+
+    def exercise(self, gpio):
+        for state in (HIGH, LOW, HIGH):
+            gpio.digitalWrite(13, state)
+        gpio.digitalRead(2)
+        gpio.pin(2).read()
+        gpio.analogRead(14)
+        gpio.digitalWriteMany({13: LOW})
+        gpio.digitalReadMany((2, ))
+        gpio.analogReadMany((14, ))
+        gpio.analogReadOversampled(14, 4)
+
+    def assert_counts(self, stats):
+        self.assertEqual(dict((op, stats[op]['count']) for op in (
+            'value_write', 'value_read', 'adc_read', 'value_write_many',
+            'value_read_many', 'adc_read_many', 'adc_read_oversampled')),
+            {'value_write': 3, 'value_read': 2, 'adc_read': 1,
+             'value_write_many': 1, 'value_read_many': 1, 'adc_read_many': 1,
+             'adc_read_oversampled': 1})
+
+    def test_sysfs_writes_timed(self):
+        for board in BOARDS:
+            gpio, simulator = self.configure(board)
+            stats = gpio.stats()
+            self.assertGreater(stats['pin_mode']['count'], 0)
+            for op in ('pin_mode', 'direction'):
+                self.assertGreater(stats[op]['total'], 0)
+                self.assertEqual(sum(n for limit, n in
+                                     stats[op]['histogram']),
+                                 stats[op]['count'])
+
+    def test_handler_operations_counted(self):
+        for board in BOARDS:
+            gpio, simulator = self.configure(board)
+            gpio.resetStats()
+            self.exercise(gpio)
+            stats = gpio.stats()
+            self.assert_counts(stats)
+            self.assertEqual(stats['value_write']['total'], 0)
+            self.assertEqual(stats['value_write']['histogram'], [])
+
+    def test_handler_operations_timed(self):
+        gpio, simulator = self.configure()
+        pin_class = type(gpio.pin(13))
+        gpio.enableHandlerStats()
+        self.assertIs(type(gpio.pin(13)), pin_class)
+        gpio.resetStats()
+        self.exercise(gpio)
+        stats = gpio.stats()
+        self.assert_counts(stats)
+        self.assertGreater(stats['value_write']['total'], 0)
+        self.assertEqual(sum(n for limit, n in
+                             stats['value_write']['histogram']), 3)
+        # Counting goes on once timing stops.
+        gpio.enableHandlerStats(False)
+        gpio.digitalWrite(13, LOW)
+        self.assertEqual(gpio.stats()['value_write']['count'], 4)
+
+    def test_counted_while_tracing(self):
+        gpio, simulator = self.configure()
+        gpio.startTrace()
+        gpio.resetStats()
+        self.exercise(gpio)
+        self.assert_counts(gpio.stats())
+
+    def test_line_handles_counted(self):
+        gpio, simulator = self.configure(gpiochip=True)
+        gpio.resetStats()
+        gpio.digitalWrite(13, HIGH)
+        gpio.digitalRead(2)
+        gpio.digitalReadMany((2, ))
+        stats = gpio.stats()
+        self.assertEqual(stats['value_write']['count'], 1)
+        self.assertEqual(stats['value_read']['count'], 1)
+        self.assertEqual(stats['value_read_many']['count'], 1)
+        gpio.enableHandlerStats()
+        gpio.digitalWrite(13, LOW)
+        self.assertEqual(gpio.stats()['value_write']['count'], 2)
+        self.assertGreater(gpio.stats()['value_write']['total'], 0)
+
+    def test_errors_counted(self):
+        gpio, simulator = self.board(wiringx86.GPIOGalileoGen2)
+        notify = simulator.notify
+
+        def failing_notify(path, value):
+            if path == GPIO_SYSFS + '/export':
+                raise OSError(errno.EBUSY, os.strerror(errno.EBUSY))
+            notify(path, value)
+
+        simulator.notify = failing_notify
+        gpio.pinMode(13, OUTPUT)
+        stats = gpio.stats()['export']
+        self.assertGreater(stats['errors'], 0)
+        self.assertEqual(stats['errors'], stats['count'])
+
+    def test_reset(self):
+        gpio, simulator = self.configure()
+        self.exercise(gpio)
+        gpio.resetStats()
+        self.assertEqual(gpio.stats(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of the trace recorder and of tools/replay_trace.py.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from helpers import BOARDS, SimulatorTestCase
+import wiringx86
+from wiringx86 import GPIO_SYSFS, HIGH, LOW, OUTPUT, PWM, TraceRecorder
+
+REPLAY = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                      'tools', 'replay_trace.py')
+
+
+class TraceTest(SimulatorTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'trace')
+
+    def replay(self):
+        # Replays the dumped trace on a simulator and returns the summary.
+        output = subprocess.check_output([sys.executable, REPLAY, '--json',
+                                          '--simulate', self.path])
+        return json.loads(output.decode('utf-8'))
+
+    def test_records(self):
+        gpio, simulator = self.board(wiringx86.GPIOGalileoGen2)
+        gpio.startTrace()
+        gpio.pinMode(13, OUTPUT)
+        gpio.digitalWrite(13, HIGH)
+        records = gpio.stopTrace().records()
+        linux_pin = gpio.GPIO_MAPPING[13]
+        self.assertIn(('write', GPIO_SYSFS + '/export', str(linux_pin)),
+                      [record[:3] for record in records])
+        self.assertIn(('write', '%s/gpio%d/direction' % (GPIO_SYSFS,
+                                                       linux_pin), 'out'),
+                      [record[:3] for record in records])
+        self.assertEqual(records[-1][:3], ('pwrite', '%s/gpio%d/value' %
+                                           (GPIO_SYSFS, linux_pin), '1'))
+        self.assertTrue(all(record[4] >= 0 for record in records))
+
+    def test_values_not_interned(self):
+        gpio, simulator = self.board(wiringx86.GPIOGalileoGen2)
+        gpio.pinMode(3, PWM)
+        trace = gpio.startTrace(size=64)
+        strings = len(trace.strings)
+        for value in range(256):
+            gpio.analogWrite(3, value)
+        self.assertLessEqual(len(trace.strings), strings + 1)
+        self.assertEqual(trace.records()[-1][2],
+                         str(gpio.pwmState()[3]['duty_cycle']))
+
+    def test_dump_and_load(self):
+        gpio, simulator = self.board(wiringx86.GPIOGalileoGen2)
+        gpio.startTrace(size=16)
+        gpio.pinMode(13, OUTPUT)
+        for state in (HIGH, LOW) * 20:
+            gpio.digitalWrite(13, state)
+        self.assertEqual(gpio.dumpTrace(self.path), 16)
+        trace = TraceRecorder.load(self.path)
+        self.assertEqual(trace.board, 'GPIOGalileoGen2')
+        self.assertEqual(trace.records(), gpio.tracer.records())
+        self.assertEqual(trace.setup_writes(), gpio.tracer.setup_writes())
+        self.assertEqual(trace.overwritten(), gpio.tracer.overwritten())
+        self.assertGreater(trace.overwritten(), 0)
+
+    def test_replay_after_wrap(self):
+        for board in BOARDS:
+            gpio, simulator = self.board(board)
+            gpio.startTrace(size=32)
+            gpio.pinMode(13, OUTPUT)
+            gpio.pinMode(3, PWM)
+            for value in range(100):
+                gpio.digitalWrite(13, value & 1)
+                gpio.analogWrite(3, value)
+            gpio.dumpTrace(self.path)
+            summary = self.replay()
+            self.assertGreater(summary['overwritten'], 0)
+            self.assertGreater(summary['setup'], 0)
+            self.assertEqual(summary['setup_errors'], 0)
+            self.assertEqual(sum(group['errors'] for group in
+                                 summary['operations'].values()), 0)
+
+    def test_setup_from_state_before_trace(self):
+        gpio, simulator = self.board(wiringx86.GPIOGalileoGen2)
+        gpio.pinMode(13, OUTPUT)
+        gpio.digitalWrite(13, HIGH)
+        trace = gpio.startTrace()
+        linux_pin = gpio.GPIO_MAPPING[13]
+        setup = trace.setup_writes()
+        self.assertIn((GPIO_SYSFS + '/export', str(linux_pin)), setup)
+        self.assertIn(('%s/gpio%d/direction' % (GPIO_SYSFS, linux_pin),
+                       'out'), setup)
+        gpio.digitalWrite(13, LOW)
+        gpio.dumpTrace(self.path)
+        summary = self.replay()
+        self.assertEqual(summary['setup_errors'], 0)
+        self.assertEqual(summary['operations']['pwrite value']['errors'], 0)
+
+    def test_unexport_folded(self):
+        gpio, simulator = self.board(wiringx86.GPIOGalileoGen2)
+        trace = gpio.startTrace(size=8)
+        gpio.pinMode(13, OUTPUT)
+        linux_pin = gpio.GPIO_MAPPING[13]
+        gpio.releasePin(13)
+        gpio.pinMode(12, OUTPUT)
+        for state in (HIGH, LOW) * 10:
+            gpio.digitalWrite(12, state)
+        paths = [path for path, value in trace.setup_writes()]
+        self.assertFalse([path for path in paths
+                          if '/gpio%d/' % linux_pin in path])
+        self.assertNotIn((GPIO_SYSFS + '/export', str(linux_pin)),
+                         trace.setup_writes())
+        self.assertIn((GPIO_SYSFS + '/export',
+                       str(gpio.GPIO_MAPPING[12])), trace.setup_writes())
+
+
+if __name__ == '__main__':
+    unittest.main()
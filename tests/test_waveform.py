@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Tests of playWaveform and stopWaveform.
+#
+# Run them from the top directory with: python -m unittest discover tests
+
+import time
+import unittest
+
+from helpers import BOARDS, SimulatorTestCase
+import wiringx86
+from wiringx86 import OUTPUT, PWM
+
+
+class WaveformTest(SimulatorTestCase):
+
+    def configure(self, board=wiringx86.GPIOGalileoGen2, pins=(3, )):
+        gpio, simulator = self.board(board)
+        for pin in pins:
+            gpio.pinMode(pin, PWM)
+        return gpio, simulator
+
+    def wait(self, gpio, pin):
+        deadline = time.time() + 5
+        while gpio.isPlaying(pin) and time.time() < deadline:
+            time.sleep(0.005)
+        self.assertFalse(gpio.isPlaying(pin))
+
+    def value(self, gpio, pin):
+        return gpio.pwmState()[pin]['value']
+
+    def test_plays_to_last_value(self):
+        for board in BOARDS:
+            gpio, simulator = self.configure(board, (3, 5))
+            self.assertTrue(gpio.playWaveform((3, 5), [0, 100, 255], 0.01))
+            self.assertTrue(gpio.isPlaying(3))
+            self.wait(gpio, 3)
+            self.wait(gpio, 5)
+            for pin in (3, 5):
+                state = gpio.pwmState()[pin]
+                self.assertEqual(state['value'], 255)
+                self.assertEqual(state['duty_cycle'], state['period'])
+
+    def test_replays_after_analog_write(self):
+        gpio, simulator = self.configure()
+        gpio.playWaveform(3, [0], 0.01)
+        self.wait(gpio, 3)
+        gpio.analogWrite(3, 200)
+        gpio.playWaveform(3, [0], 0.01)
+        self.wait(gpio, 3)
+        self.assertEqual(self.value(gpio, 3), 0)
+        self.assertEqual(gpio.pwmState()[3]['duty_cycle'], 0)
+
+    def test_loop_until_stopped(self):
+        gpio, simulator = self.configure()
+        gpio.playWaveform(3, [10, 20], 0.005, loop=True)
+        time.sleep(0.05)
+        self.assertTrue(gpio.isPlaying(3))
+        gpio.stopWaveform(3)
+        self.wait(gpio, 3)
+        value = self.value(gpio, 3)
+        self.assertIn(value, (10, 20))
+        time.sleep(0.02)
+        self.assertEqual(self.value(gpio, 3), value)
+        gpio.stopWaveform()
+        self.assertIsNone(gpio.player)
+
+    def test_invalid_arguments(self):
+        gpio, simulator = self.configure()
+        gpio.pinMode(13, OUTPUT)
+        self.assertFalse(gpio.playWaveform(13, [0], 0.01))
+        self.assertFalse(gpio.playWaveform(5, [0], 0.01))
+        self.assertFalse(gpio.playWaveform(3, [], 0.01))
+        self.assertFalse(gpio.playWaveform(3, [0], 0))
+        self.assertIsNone(gpio.player)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Benchmark the main API entry points of every board class.
+#
+# Each entry point is called repeatedly against a simulated sysfs tree of the
+# board, or against the real sysfs with --hardware, and timed call by call.
+# The report gives the calls per second, the median and 99th percentile
+# latency and the number of read and write system calls made per call, as
+# counted by the kernel in /proc/self/io. Opening and closing files is not
+# part of that count.
+#
+# --output writes the results as JSON, to be kept and compared with the
+# results of another version of the library with --compare.
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import wiringx86
+
+BOARDS = {
+    'galileo': wiringx86.GPIOGalileo,
+    'galileo2': wiringx86.GPIOGalileoGen2,
+    'edison': wiringx86.GPIOEdison,
+}
+
+# Pins used on every board: an output, an input, an analog input and a PWM.
+OUTPUT_PIN = 13
+INPUT_PIN = 2
+ANALOG_PIN = 14
+PWM_PIN = 3
+
+PERIODS = (1000000, 2000000)
+
+
+def syscalls():
+    # Read and write system calls made so far by this process.
+    try:
+        with open('/proc/self/io') as f:
+            counters = dict(line.split(':') for line in f)
+    except (IOError, OSError):
+        return None
+    return int(counters['syscr']) + int(counters['syscw'])
+
+
+def percentile(latencies, fraction):
+    # latencies must be sorted.
+    index = int(round(fraction * (len(latencies) - 1)))
+    return latencies[index]
+
+
+def run(func, iterations):
+    """Call func(i) for i in range(iterations) and time every call.
+
+    Returns a dictionary with the results.
+    """
+    now = wiringx86._monotonic
+    latencies = [0.0] * iterations
+    calls = syscalls()
+    begin = now()
+    for i in range(iterations):
+        start = now()
+        func(i)
+        latencies[i] = now() - start
+    elapsed = now() - begin
+    calls = None if calls is None else syscalls() - calls
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'ops_per_sec': iterations / elapsed,
+        'p50_us': percentile(latencies, 0.5) * 1e6,
+        'p99_us': percentile(latencies, 0.99) * 1e6,
+        'syscalls_per_op': None if calls is None else
+        float(calls) / iterations,
+    }
+
+
+def entry_points(gpio):
+    """Return (name, func) pairs for the entry points to benchmark.
+
+    Every func changes something on each call, so that nothing is skipped
+    because the board already is in the requested state.
+    """
+    modes = (gpio.OUTPUT, gpio.INPUT)
+    values = (64, 192)
+
+    def pin_mode(i):
+        gpio.pinMode(OUTPUT_PIN, modes[i & 1])
+
+    def digital_write(i):
+        gpio.digitalWrite(OUTPUT_PIN, (gpio.LOW, gpio.HIGH)[i & 1])
+
+    def digital_read(i):
+        gpio.digitalRead(INPUT_PIN)
+
+    def analog_read(i):
+        gpio.analogRead(ANALOG_PIN)
+
+    def analog_write(i):
+        gpio.analogWrite(PWM_PIN, values[i & 1])
+
+    def set_pwm_period(i):
+        gpio.setPWMPeriod(PWM_PIN, PERIODS[i & 1])
+
+    return [
+        ('pinMode', pin_mode),
+        ('digitalWrite', digital_write),
+        ('digitalRead', digital_read),
+        ('analogRead', analog_read),
+        ('analogWrite', analog_write),
+        ('setPWMPeriod', set_pwm_period),
+    ]
+
+
+def benchmark(board, iterations, hardware=False, only=None):
+    """Benchmark the entry points of a board class.
+
+    Returns a dictionary mapping entry point names to their results.
+    """
+    simulator = None
+    if hardware:
+        gpio = board()
+    else:
+        simulator = wiringx86.SysfsSimulator(board)
+        gpio = board(simulator=simulator)
+    results = {}
+    try:
+        gpio.pinMode(INPUT_PIN, gpio.INPUT)
+        gpio.pinMode(ANALOG_PIN, gpio.ANALOG_INPUT)
+        gpio.pinMode(PWM_PIN, gpio.PWM)
+        for name, func in entry_points(gpio):
+            if only and name not in only:
+                continue
+            # The output pin is configured here rather than once for all,
+            # since the pinMode benchmark leaves it as an input.
+            gpio.pinMode(OUTPUT_PIN, gpio.OUTPUT)
+            # Warm up the handlers and the shadow state first.
+            run(func, 2)
+            results[name] = run(func, iterations)
+    finally:
+        gpio.cleanup()
+        if simulator is not None:
+            simulator.destroy()
+    return results
+
+
+def print_results(results, baseline=None):
+    columns = '%-10s %-14s %12s %10s %10s %9s'
+    header = ('board', 'operation', 'ops/s', 'p50 us', 'p99 us', 'syscalls')
+    if baseline is not None:
+        columns += ' %8s'
+        header += ('change', )
+    print(columns % header)
+    for board in sorted(results):
+        for name, result in sorted(results[board].items()):
+            calls = result['syscalls_per_op']
+            row = (board, name, '%.0f' % result['ops_per_sec'],
+                   '%.1f' % result['p50_us'], '%.1f' % result['p99_us'],
+                   '-' if calls is None else '%.1f' % calls)
+            if baseline is not None:
+                old = baseline.get(board, {}).get(name)
+                if old is None:
+                    row += ('new', )
+                else:
+                    change = result['ops_per_sec'] / old['ops_per_sec'] - 1
+                    row += ('%+.1f%%' % (change * 100), )
+            print(columns % row)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the wiringx86 API entry points.')
+    parser.add_argument('boards', nargs='*',
+                        help='boards to benchmark: %s (default: all)' %
+                        ', '.join(sorted(BOARDS)))
+    parser.add_argument('-n', '--iterations', type=int, default=10000,
+                        help='calls per entry point (default: 10000)')
+    parser.add_argument('--only', action='append', metavar='OPERATION',
+                        help='benchmark only this entry point, e.g. '
+                        'digitalWrite. May be given several times.')
+    parser.add_argument('--hardware', action='store_true',
+                        help='use the real sysfs of the board this runs on '
+                        'instead of a simulated one')
+    parser.add_argument('--output', metavar='FILE',
+                        help='write the results to FILE as JSON')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='show the change in ops/s from the results in '
+                        'FILE')
+    args = parser.parse_args()
+
+    boards = args.boards or sorted(BOARDS)
+    for board in boards:
+        if board not in BOARDS:
+            parser.error('unknown board %r' % (board, ))
+    if args.hardware and len(boards) != 1:
+        parser.error('--hardware needs the board this runs on')
+
+    results = {}
+    for board in boards:
+        results[board] = benchmark(BOARDS[board], args.iterations,
+                                   args.hardware, args.only)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'hardware': args.hardware,
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# Replay a trace recorded with gpio.startTrace() and gpio.dumpTrace().
+#
+# Without options the trace is only summarised. With --simulate the operations
+# are executed again against a simulated sysfs tree of the board that recorded
+# the trace, with --root against an existing directory tree and with --board
+# against the real sysfs of the board this runs on. The time each operation
+# takes is then compared with the time it took when it was recorded.
+#
+# --compare shows how the sysfs writes of two traces differ, e.g. to check how
+# the muxing sequence of pinMode changed between two versions of the library.
+#
+# Replays start with the configuration of the board when the trace started,
+# updated with the records overwritten when the ring was full, so that the
+# records find the GPIOs and PWM channels they use exported.
+
+from __future__ import print_function
+
+import argparse
+import difflib
+import errno
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import wiringx86
+
+
+def attribute(path):
+    # Kind of sysfs attribute, e.g. value, direction or duty_cycle.
+    return os.path.basename(path)
+
+
+def write(root, path, value, simulator=None):
+    fd = os.open(root + path, os.O_WRONLY)
+    try:
+        os.write(fd, (value + '\n').encode('ascii'))
+    finally:
+        os.close(fd)
+    if simulator is not None:
+        simulator.notify(path, value)
+
+
+def replay_setup(trace, root, simulator=None):
+    """Execute the setup writes of a trace, untimed.
+
+    Returns the number of writes that failed.
+    """
+    failed = 0
+    for path, value in trace.setup_writes():
+        try:
+            write(root, path, value, simulator)
+        except (IOError, OSError):
+            failed += 1
+    return failed
+
+
+def replay(trace, root, simulator=None, realtime=False):
+    """Execute the operations of a trace again.
+
+    The setup writes must have been replayed first with replay_setup.
+
+    Returns a list of (record, duration, errno) tuples, with the time and
+    result of every operation in the replay.
+    """
+    results = []
+    handlers = {}
+    records = trace.records()
+    if not records:
+        return results
+    first = records[0][3]
+    begin = wiringx86._monotonic()
+    for record in records:
+        operation, path, value, timestamp, duration, error = record
+        if realtime:
+            wiringx86._sleep_until(begin + timestamp - first)
+        start = wiringx86._monotonic()
+        error = 0
+        try:
+            if operation == 'write':
+                write(root, path, value, simulator)
+            else:
+                fd = handlers.get((operation, path))
+                if fd is None:
+                    flags = os.O_RDONLY if operation == 'read' else os.O_RDWR
+                    fd = handlers[operation, path] = os.open(root + path,
+                                                            flags)
+                if operation == 'read':
+                    wiringx86._pread(fd, 16)
+                else:
+                    wiringx86._pwrite(fd, (value + '\n').encode('ascii'))
+        except (IOError, OSError) as e:
+            error = e.errno or errno.EIO
+            # The file may have gone with an unexport. Open it again next time.
+            fd = handlers.pop((operation, path), None)
+            if fd is not None:
+                os.close(fd)
+        results.append((record, wiringx86._monotonic() - start, error))
+    for fd in handlers.values():
+        os.close(fd)
+    return results
+
+
+def summarise(rows):
+    """Group (operation, path, recorded, replayed, errno) rows by operation
+    and attribute kind."""
+    groups = {}
+    for operation, path, recorded, replayed, error in rows:
+        key = '%s %s' % (operation, attribute(path))
+        group = groups.setdefault(key, {'count': 0, 'errors': 0,
+                                        'recorded': 0.0, 'replayed': 0.0})
+        group['count'] += 1
+        group['errors'] += 1 if error else 0
+        group['recorded'] += recorded
+        if replayed is not None:
+            group['replayed'] += replayed
+    return groups
+
+
+def print_summary(groups, replayed):
+    print('%-24s %8s %7s %14s' % ('operation', 'count', 'errors',
+                                  'recorded us'), end='')
+    print(' %14s' % 'replayed us' if replayed else '')
+    for key in sorted(groups):
+        group = groups[key]
+        print('%-24s %8d %7d %14.1f' % (key, group['count'], group['errors'],
+                                       group['recorded'] * 1e6 /
+                                       group['count']), end='')
+        print(' %14.1f' % (group['replayed'] * 1e6 / group['count'])
+              if replayed else '')
+
+
+def writes(trace):
+    return ['%s %s' % (path, value)
+            for operation, path, value, timestamp, duration, error
+            in trace.records() if operation == 'write']
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Summarise, replay or compare wiringx86 traces.')
+    parser.add_argument('trace', help='trace file saved with dumpTrace')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--simulate', action='store_true',
+                        help='replay against a simulated sysfs tree')
+    target.add_argument('--root', help='replay against a directory tree')
+    target.add_argument('--board', action='store_true',
+                        help='replay against the real sysfs')
+    parser.add_argument('--realtime', action='store_true',
+                        help='keep the original time between operations')
+    parser.add_argument('--compare', metavar='TRACE',
+                        help='show how the sysfs writes of another trace '
+                             'differ')
+    parser.add_argument('--json', action='store_true',
+                        help='print the summary as JSON')
+    args = parser.parse_args()
+
+    trace = wiringx86.TraceRecorder.load(args.trace)
+
+    if args.compare:
+        other = wiringx86.TraceRecorder.load(args.compare)
+        for line in difflib.unified_diff(writes(trace), writes(other),
+                                         args.trace, args.compare,
+                                         lineterm=''):
+            print(line)
+        return
+
+    simulator = None
+    root = None
+    if args.simulate:
+        simulator = wiringx86.SysfsSimulator(getattr(wiringx86, trace.board))
+        root = simulator.root
+    elif args.root is not None:
+        root = args.root
+    elif args.board:
+        root = ''
+
+    setup = len(trace.setup_writes())
+    failed = 0
+    if root is None:
+        rows = [(operation, path, duration, None, error)
+                for operation, path, value, timestamp, duration, error
+                in trace.records()]
+    else:
+        try:
+            failed = replay_setup(trace, root, simulator)
+            rows = [(record[0], record[1], record[4], duration, error)
+                    for record, duration, error
+                    in replay(trace, root, simulator, args.realtime)]
+        finally:
+            if simulator is not None:
+                simulator.destroy()
+
+    groups = summarise(rows)
+    if args.json:
+        print(json.dumps({'board': trace.board, 'operations': groups,
+                          'overwritten': trace.overwritten(),
+                          'setup': setup, 'setup_errors': failed},
+                         indent=2, sort_keys=True))
+        return
+    print('%d operations recorded on %s' % (len(rows), trace.board))
+    if trace.overwritten():
+        print('%d older operations were overwritten in the ring' %
+              trace.overwritten())
+    if setup and root is not None:
+        print('%d configuration writes replayed first, %d failed' %
+              (setup, failed))
+    print_summary(groups, root is not None)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,8 +15,24 @@
 #  Intel® Gaileo Gen2
 #  Intel® Edison
 
+import array
+import bisect
+import collections
+import ctypes
+import ctypes.util
 import datetime
+import errno
+import mmap
 import os
+import re
+import select
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+import traceback
 
 INPUT = 'in'
 INPUT_PULLUP = 'in_pullup'
@@ -27,6 +43,9 @@ PWM = 'pwm'
 LOW = 'low'
 HIGH = 'high'
 NONE = 'in'
+RISING = 'rising'
+FALLING = 'falling'
+CHANGE = 'both'
 DRIVE_STRONG = 'strong'
 DRIVE_HIZ = 'hiz'
 MODE_0 = 'mode0'
@@ -37,25 +56,1547 @@ MODE_4 = 'mode4'
 MODE_5 = 'mode5'
 ALL_MODES = (MODE_0, MODE_1, MODE_2, MODE_3, MODE_4, MODE_5)
 
+GPIO_SYSFS = '/sys/class/gpio'
+PWM_SYSFS = '/sys/class/pwm/pwmchip0'
+IIO_SYSFS = '/sys/bus/iio/devices'
+IIO_DEVFS = '/dev'
+GPIO_DEVFS = '/dev'
+GPIO_DEBUGFS = '/sys/kernel/debug/gpio_debug'
+
+_libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+
+class _timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def _clock_monotonic():
+    # Python 2 has no monotonic clock in the time module.
+    ts = _timespec()
+    _libc.clock_gettime(1, ctypes.byref(ts))  # CLOCK_MONOTONIC
+    return ts.tv_sec + ts.tv_nsec * 1e-9
+
+
+_monotonic = getattr(time, 'monotonic', _clock_monotonic)
+
+
+def _sleep_until(deadline):
+    # Sleep until an absolute time of the _monotonic clock. clock_nanosleep
+    # wakes up at the deadline itself, rather than after a relative delay
+    # that starts counting late by however long it took to compute it.
+    if deadline <= _monotonic():
+        return
+    ts = _timespec(int(deadline), int((deadline % 1) * 1e9))
+    while True:
+        error = _clock_nanosleep(1, 1, ctypes.byref(ts), None)
+        if error != errno.EINTR:
+            break
+
+
+def _sleep_until_fallback(deadline):
+    delay = deadline - _monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+
+# CLOCK_MONOTONIC with TIMER_ABSTIME. time.monotonic uses the same clock.
+_clock_nanosleep = getattr(_libc, 'clock_nanosleep', None)
+if _clock_nanosleep is None:
+    _sleep_until = _sleep_until_fallback
+
+if hasattr(os, 'pread'):
+    def _pread(fd, size):
+        return os.pread(fd, size, 0)
+
+    def _pwrite(fd, data):
+        return os.pwrite(fd, data, 0)
+else:
+    # Python 2 has no positional I/O. Descriptors are always left at offset
+    # 0, like the value handlers are, so read or write and rewind.
+    def _pread(fd, size):
+        data = os.read(fd, size)
+        os.lseek(fd, 0, os.SEEK_SET)
+        return data
+
+    def _pwrite(fd, data):
+        size = os.write(fd, data)
+        os.lseek(fd, 0, os.SEEK_SET)
+        return size
+
+if hasattr(os, 'readv'):
+    def _readinto(fd, view):
+        return os.readv(fd, [view])
+else:
+    def _readinto(fd, view):
+        data = os.read(fd, len(view))
+        view[:len(data)] = data
+        return len(data)
+
+# Pin sets whose value descriptors are kept by GPIOBase._many_fds.
+_MANY_FDS_CACHED = 64
+
+# Format of IIO scan elements, e.g. le:u12/16>>0.
+_SCAN_TYPE = re.compile(r'([bl]e):([su])(\d+)/(\d+)(?:X\d+)?>>(\d+)$')
+
+# SampleBus layout: header, pin numbers and head counter, then the slots.
+# Every slot is a sequence number followed by the sample.
+_BUS_MAGIC = b'WX86SBUS'
+_BUS_HEADER = struct.Struct('<8sHHII')
+_BUS_HEAD = struct.Struct('<Q')
+_BUS_HEAD_OFFSET = 64
+_BUS_SEQ = struct.Struct('<Q')
+_BUS_SLOTS_OFFSET = 128
+
+# Operation names used in GPIOBase.stats for every caller of _write_sysfs.
+_STATS_OPS = {
+    '_export_pin': 'export',
+    '_unexport_pin': 'unexport',
+    '_set_direction': 'direction',
+    '_set_drive': 'drive',
+    '_muxmode': 'mux',
+    '_write_value': 'value_write',
+    '_set_edge': 'edge',
+    '_export_pwm': 'pwm_export',
+    '_unexport_pwm': 'pwm_unexport',
+    '_enable_pwm': 'pwm_enable',
+    '_set_pwm_duty_cycle': 'pwm_duty',
+    '_set_pwm_period': 'pwm_period',
+    'analogCapture': 'adc_capture',
+}
+
+# Operations through open handlers, counted in GPIOBase.handler_counts and
+# only timed while handler stats are enabled.
+_HANDLER_OPS = ('value_write', 'value_read', 'adc_read', 'value_write_many',
+                'value_read_many', 'adc_read_many', 'adc_read_oversampled')
+
+# Trace files: header, string table with the board name first, setup
+# writes, records. Values are numbers, or -1 - index of a string.
+_TRACE_MAGIC = b'WX86TRC2'
+_TRACE_HEADER = struct.Struct('<8sIIII')
+_TRACE_SETUP = struct.Struct('<Iq')
+_TRACE_RECORD = struct.Struct('<BBIqqI')
+_TRACE_WRITE, _TRACE_PWRITE, _TRACE_READ = range(3)
+
+_LOW_BYTES = b'0'
+_HIGH_BYTES = b'1'
+
+
+# GPIO character device ABI, version 1. See linux/gpio.h.
+class _gpiohandle_request(ctypes.Structure):
+    _fields_ = [('lineoffsets', ctypes.c_uint32 * 64),
+                ('flags', ctypes.c_uint32),
+                ('default_values', ctypes.c_uint8 * 64),
+                ('consumer_label', ctypes.c_char * 32),
+                ('lines', ctypes.c_uint32),
+                ('fd', ctypes.c_int)]
+
+
+class _gpiohandle_data(ctypes.Structure):
+    _fields_ = [('values', ctypes.c_uint8 * 64)]
+
+
+class _gpioevent_request(ctypes.Structure):
+    _fields_ = [('lineoffset', ctypes.c_uint32),
+                ('handleflags', ctypes.c_uint32),
+                ('eventflags', ctypes.c_uint32),
+                ('consumer_label', ctypes.c_char * 32),
+                ('fd', ctypes.c_int)]
+
+
+def _gpio_iowr(number, structure):
+    return (3 << 30) | (ctypes.sizeof(structure) << 16) | (0xb4 << 8) | number
+
+
+_GPIO_GET_LINEHANDLE_IOCTL = _gpio_iowr(0x03, _gpiohandle_request)
+_GPIO_GET_LINEEVENT_IOCTL = _gpio_iowr(0x04, _gpioevent_request)
+_GPIOHANDLE_GET_LINE_VALUES_IOCTL = _gpio_iowr(0x08, _gpiohandle_data)
+_GPIOHANDLE_SET_LINE_VALUES_IOCTL = _gpio_iowr(0x09, _gpiohandle_data)
+_GPIOHANDLES_MAX = 64
+_GPIOHANDLE_REQUEST_INPUT = 1 << 0
+_GPIOHANDLE_REQUEST_OUTPUT = 1 << 1
+_GPIOHANDLE_REQUEST_BIAS_DISABLE = 1 << 7
+_GPIOEVENT_REQUEST_FLAGS = {RISING: 1 << 0, FALLING: 1 << 1, CHANGE: 3}
+# struct gpioevent_data: 64 bits timestamp and 32 bits id, padded.
+_GPIOEVENT_DATA = struct.Struct('=QI4x')
+_GPIOEVENT_EVENT_RISING_EDGE = 1
+_GPIO_CONSUMER = b'wiringx86'
+
+
+class _InterruptDispatcher(threading.Thread):
+
+    """Thread waiting for edges on all the pins with an interrupt attached.
+
+    A single epoll object watches the value files, or the line event
+    requests, of every pin. Callbacks are run from this thread.
+    """
+
+    def __init__(self):
+        super(_InterruptDispatcher, self).__init__()
+        self.daemon = True
+        self.epoll = select.epoll()
+        self.callbacks = {}
+        self.wakeup_read, self.wakeup_write = os.pipe()
+        self.epoll.register(self.wakeup_read, select.EPOLLIN)
+
+    def add(self, fd, pin, callback, read_events=None):
+        # Value files signal edges with POLLPRI and reading them acknowledges
+        # any pending edge. Line event requests are readable while edges are
+        # queued, which read_events consumes and counts.
+        if read_events is None:
+            _pread(fd, 8)
+            events = select.EPOLLPRI | select.EPOLLERR
+        else:
+            events = select.EPOLLIN | select.EPOLLERR
+        self.callbacks[fd] = (pin, callback, read_events)
+        try:
+            self.epoll.register(fd, events)
+        except:
+            del self.callbacks[fd]
+            raise
+
+    def remove(self, fd):
+        self.epoll.unregister(fd)
+        del self.callbacks[fd]
+
+    def stop(self):
+        os.write(self.wakeup_write, b'x')
+        self.join()
+        self.epoll.close()
+        os.close(self.wakeup_read)
+        os.close(self.wakeup_write)
+
+    def run(self):
+        while True:
+            try:
+                events = self.epoll.poll()
+            except (IOError, OSError) as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            timestamp = _monotonic()
+            for fd, mask in events:
+                if fd == self.wakeup_read:
+                    return
+                entry = self.callbacks.get(fd)
+                if entry is None:
+                    continue
+                pin, callback, read_events = entry
+                try:
+                    if read_events is None:
+                        _pread(fd, 8)
+                        edges = 1
+                    else:
+                        # Every queued edge gets its callback.
+                        edges = read_events(fd)
+                except (IOError, OSError):
+                    # Closed by detachInterrupt from another thread.
+                    continue
+                for _ in range(edges):
+                    try:
+                        callback(pin, timestamp)
+                    except Exception:
+                        traceback.print_exc()
+
+
+class Pin(object):
+
+    """GPIO pin configured with pinMode.
+
+    Holds everything needed to drive the pin, already resolved: the Linux
+    GPIO, the value file descriptor and the PWM channel. Tight control loops
+    can keep a Pin around and call its methods directly, without any of the
+    lookups done by digitalWrite and friends. Get one with GPIOBase.pin.
+
+    A Pin stays valid across pinMode calls on the same pin. Once the pin is
+    released, or the board cleaned up, its methods raise OSError.
+    """
+
+    __slots__ = ('board', 'number', 'linux_pin', 'mode', 'fd', 'pwm',
+                 'registers', 'line')
+
+    def __init__(self, board, number):
+        self.board = board
+        self.number = number
+        self.linux_pin = board.GPIO_MAPPING[number]
+        self.mode = None
+        self.fd = -1
+        self.pwm = board.PWM_MAPPING.get(number)
+        # (level, output, clear, mask) when driven through mapped registers.
+        self.registers = None
+        # (_LineHandle, index) when driven through the GPIO character device.
+        self.line = None
+
+    def __repr__(self):
+        return '<Pin %d: gpio%d, mode %s>' % (self.number, self.linux_pin,
+                                              self.mode)
+
+    def write(self, state):
+        """Write a value to the pin. See GPIOBase.digitalWrite."""
+        board = self.board
+        if board.instrumented:
+            start = _monotonic()
+            _pwrite(self.fd, _LOW_BYTES if state == LOW else _HIGH_BYTES)
+            board._handler_io('value_write', (self.fd, ),
+                              (0 if state == LOW else 1, ), start)
+        else:
+            _pwrite(self.fd, _LOW_BYTES if state == LOW else _HIGH_BYTES)
+            board.handler_counts['value_write'] += 1
+
+    def read(self):
+        """Read the pin. See GPIOBase.digitalRead and GPIOBase.analogRead.
+
+        Returns:
+            The state of the pin (0-1), or its 10 bits analog reading
+            (0-1023) if it is configured as ANALOG_INPUT.
+
+        """
+        board = self.board
+        start = _monotonic() if board.instrumented else 0
+        if self.mode == ANALOG_INPUT:
+            # ADC chip on the board reports voltages with 12 bits resolution.
+            # To convert it to 10 bits just shift right 2 bits.
+            value = int(_pread(self.fd, 16)) >> 2
+            op = 'adc_read'
+        else:
+            value = 1 if _pread(self.fd, 1) == _HIGH_BYTES else 0
+            op = 'value_read'
+        if start:
+            board._handler_io(op, (self.fd, ), (value, ), start)
+        else:
+            board.handler_counts[op] += 1
+        return value
+
+    def duty(self, value):
+        """Set the PWM duty cycle (0-255). See GPIOBase.analogWrite."""
+        self.board._analog_write(self.number, self.pwm, value)
+
+
+class _RegisterPin(Pin):
+
+    """Pin driven straight through the mapped GPIO controller registers.
+
+    Pin objects of digital pins are switched to this class when the board
+    has its registers mapped, so reads and writes are a memory access rather
+    than a system call. While handler operations are timed or traced they go
+    through sysfs instead, so that what is measured are the sysfs accesses.
+    """
+
+    __slots__ = ()
+
+    def write(self, state):
+        board = self.board
+        if board.instrumented:
+            return Pin.write(self, state)
+        level, output, clear, mask = self.registers
+        if clear is not None:
+            # Separate set and clear registers, written with just our bit.
+            if state == LOW:
+                clear.value = mask
+            else:
+                output.value = mask
+        elif state == LOW:
+            output.value &= ~mask
+        else:
+            output.value |= mask
+        board.handler_counts['value_write'] += 1
+
+    def read(self):
+        board = self.board
+        if board.instrumented:
+            return Pin.read(self)
+        level, output, clear, mask = self.registers
+        board.handler_counts['value_read'] += 1
+        return 1 if level.value & mask else 0
+
+
+class _LinePin(Pin):
+
+    """Pin driven through a line handle of the GPIO character device.
+
+    The handle also holds the muxing GPIOs requested along with the pin, so
+    every write sets all of them. Their values are kept in the handle and
+    stay the same. Line handles have no sysfs path to trace, so they are
+    only timed by handler stats.
+    """
+
+    __slots__ = ()
+
+    def write(self, state):
+        handle, index = self.line
+        handle.values.values[index] = state != LOW
+        board = self.board
+        if board.handler_stats:
+            start = _monotonic()
+            handle.set()
+            board._record('value_write', start)
+        else:
+            handle.set()
+            board.handler_counts['value_write'] += 1
+
+    def read(self):
+        handle, index = self.line
+        board = self.board
+        if board.handler_stats:
+            start = _monotonic()
+            value = handle.get()[index]
+            board._record('value_read', start)
+        else:
+            value = handle.get()[index]
+            board.handler_counts['value_read'] += 1
+        return value
+
+
+class _LineHandle(object):
+
+    """Lines of a GPIO chip requested together, or a line event request."""
+
+    __slots__ = ('io', 'fd', 'lines', 'output', 'flags', 'event', 'values',
+                 'levels')
+
+    def __init__(self, io, fd, lines, output, values, event=False, flags=0):
+        self.io = io
+        self.fd = fd
+        # Linux GPIO numbers, in the order of the request.
+        self.lines = lines
+        self.output = output
+        self.flags = flags
+        self.event = event
+        # Last values set, and buffer the levels are read into.
+        self.values = _gpiohandle_data()
+        self.levels = _gpiohandle_data()
+        for index, value in enumerate(values):
+            self.values.values[index] = value
+
+    def set(self):
+        self.io.set_values(self.fd, self.values)
+
+    def get(self):
+        self.io.get_values(self.fd, self.levels)
+        return self.levels.values
+
+
+class GPIOChipIO(object):
+
+    """System calls of the GPIO character device backend.
+
+    Boards created with gpiochip=True make all their calls to the GPIO
+    character devices through an object of this class. Any other object with
+    the same methods can be given instead, for instance a fake recording
+    the calls. Every method raises OSError on failure.
+    """
+
+    def open(self, path):
+        """Open a GPIO chip character device and return its descriptor."""
+        return os.open(path, os.O_RDWR)
+
+    def close(self, fd):
+        """Close a chip, line handle or line event descriptor."""
+        os.close(fd)
+
+    def request_lines(self, fd, offsets, output, values, label, flags=0):
+        """Request lines of a GPIO chip as a single handle.
+
+        Args:
+            fd: descriptor of the GPIO chip
+            offsets: offsets of the lines on the chip
+            output: request the lines as outputs rather than inputs
+            values: initial value (0-1) of every line, used for outputs
+            label: consumer label of the lines, as bytes
+            flags: GPIOHANDLE_REQUEST flags other than the direction, such
+                   as the bias
+
+        Returns:
+            Descriptor of the line handle.
+
+        """
+        request = _gpiohandle_request()
+        for index, (offset, value) in enumerate(zip(offsets, values)):
+            request.lineoffsets[index] = offset
+            request.default_values[index] = value
+        request.lines = len(offsets)
+        request.flags = flags | (_GPIOHANDLE_REQUEST_OUTPUT if output else
+                                 _GPIOHANDLE_REQUEST_INPUT)
+        request.consumer_label = label
+        self._ioctl(fd, _GPIO_GET_LINEHANDLE_IOCTL, request)
+        return request.fd
+
+    def get_values(self, fd, data):
+        """Read the levels of the lines of a handle or event into
+        data.values, in the order they were requested."""
+        self._ioctl(fd, _GPIOHANDLE_GET_LINE_VALUES_IOCTL, data)
+
+    def set_values(self, fd, data):
+        """Set all the lines of an output handle from data.values."""
+        self._ioctl(fd, _GPIOHANDLE_SET_LINE_VALUES_IOCTL, data)
+
+    def request_event(self, fd, offset, edge, label):
+        """Request a line of a GPIO chip as an input reporting edges.
+
+        Args:
+            fd: descriptor of the GPIO chip
+            offset: offset of the line on the chip
+            edge: edges to report: RISING, FALLING or CHANGE
+            label: consumer label of the line, as bytes
+
+        Returns:
+            Descriptor of the line event request. It becomes readable when
+            edges are pending.
+
+        """
+        request = _gpioevent_request()
+        request.lineoffset = offset
+        request.handleflags = _GPIOHANDLE_REQUEST_INPUT
+        request.eventflags = _GPIOEVENT_REQUEST_FLAGS[edge]
+        request.consumer_label = label
+        self._ioctl(fd, _GPIO_GET_LINEEVENT_IOCTL, request)
+        return request.fd
+
+    def read_events(self, fd):
+        """Consume the pending edges of a line event request.
+
+        Returns:
+            The number of edges consumed.
+
+        """
+        return len(self.read_edges(fd))
+
+    def read_edges(self, fd):
+        """Consume the pending edges of a line event request.
+
+        Returns:
+            List of the edges consumed, RISING or FALLING, oldest first.
+
+        """
+        size = _GPIOEVENT_DATA.size
+        data = os.read(fd, size * 64)
+        return [RISING if _GPIOEVENT_DATA.unpack_from(data, offset)[1] ==
+                _GPIOEVENT_EVENT_RISING_EDGE else FALLING
+                for offset in range(0, len(data) - size + 1, size)]
+
+    def _ioctl(self, fd, request, argument):
+        if _libc.ioctl(fd, ctypes.c_ulong(request), ctypes.byref(argument)):
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+
+class _OpStats(object):
+
+    """Counters and latency histogram of one kind of operation."""
+
+    __slots__ = ('count', 'errors', 'total', 'max', 'histogram')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        # Bucket n counts latencies below 2**n nanoseconds.
+        self.histogram = [0] * 48
+
+    def add(self, elapsed, error):
+        self.count += 1
+        if error:
+            self.errors += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        bucket = int(elapsed * 1e9).bit_length()
+        self.histogram[min(bucket, 47)] += 1
+
+    def snapshot(self):
+        return {'count': self.count,
+                'errors': self.errors,
+                'total': self.total,
+                'max': self.max,
+                'histogram': [(1 << bucket, n)
+                              for bucket, n in enumerate(self.histogram)
+                              if n]}
+
+
+class ADCCapture(object):
+
+    """Continuous capture of analog inputs through the IIO buffer.
+
+    The ADC samples the enabled channels on every trigger event and the
+    kernel queues the results, so no sample is lost while Python is busy
+    elsewhere and the sampling rate is set by the trigger, not by how fast
+    the library can read. Created by GPIOBase.analogCapture.
+
+    Samples are returned interleaved: one value per captured pin, in the
+    order given by the pins attribute, then the next scan.
+    """
+
+    def __init__(self, board, pins, raw):
+        self.board = board
+        self.raw = raw
+        self.path = '%s/iio:device%d' % (board.iio_path, board.adc_iio_device)
+        self.device = '%s%s/iio:device%d' % (board.root, IIO_DEVFS,
+                                            board.adc_iio_device)
+        self.fd = -1
+        self.buffer = bytearray()
+        channels = sorted(set((board.ADC_MAPPING[pin], pin) for pin in pins))
+        self.channels = tuple(adc for adc, pin in channels)
+        self.pins = tuple(pin for adc, pin in channels)
+        # (shift, mask) turning every element of a scan into a reading.
+        self.conversions = []
+        self.swap = False
+        self.dtype = None
+        self.scan_size = 2 * len(self.channels)
+
+    def read(self, count):
+        """Read captured scans, waiting until they are available.
+
+        Args:
+            count: number of scans to read
+
+        Returns:
+            array('H') with count * len(pins) interleaved readings.
+
+        """
+        data = self._fill(count * self.scan_size)
+        values = array.array('H', data.tobytes())
+        self._convert(values)
+        return values
+
+    def readinto(self, out):
+        """Read captured scans into a preallocated buffer.
+
+        As many whole scans as fit in out are read, with no allocation on
+        the way when out is a NumPy array.
+
+        Args:
+            out: array('H') or one dimensional NumPy integer array
+
+        Returns:
+            Number of readings stored in out.
+
+        """
+        scans = len(out) // len(self.channels)
+        data = self._fill(scans * self.scan_size)
+        numpy = sys.modules.get('numpy')
+        if numpy is not None and isinstance(out, numpy.ndarray):
+            values = numpy.frombuffer(data, dtype=self.dtype)
+            step = len(self.channels)
+            for i, (shift, mask) in enumerate(self.conversions):
+                out[i:len(values):step] = (values[i::step] >> shift) & mask
+            return len(values)
+        values = array.array('H', data.tobytes())
+        self._convert(values)
+        out[:len(values)] = values
+        return len(values)
+
+    def stop(self):
+        """Stop the capture and disable the captured channels."""
+        if self.fd < 0:
+            return
+        board = self.board
+        board._write_sysfs('analogCapture', self.path + '/buffer/enable', 0)
+        os.close(self.fd)
+        self.fd = -1
+        self._disable_channels()
+        if board.capture is self:
+            board.capture = None
+
+    def _disable_channels(self):
+        for adc in self.channels:
+            self.board._write_sysfs('analogCapture', '%s/scan_elements/'
+                                    'in_voltage%d_en' % (self.path, adc), 0,
+                                    ignore=(errno.ENOENT, ))
+
+    def _start(self, trigger, length):
+        board = self.board
+        scan = self.path + '/scan_elements'
+        # Anything else enabled in the scan would change its layout.
+        for adc in set(board.ADC_MAPPING.values()) - set(self.channels):
+            board._write_sysfs('analogCapture',
+                               '%s/in_voltage%d_en' % (scan, adc), 0,
+                               ignore=(errno.ENOENT, ))
+        board._write_sysfs('analogCapture', scan + '/in_timestamp_en', 0,
+                           ignore=(errno.ENOENT, ))
+
+        elements = []
+        for adc in self.channels:
+            if board._write_sysfs('analogCapture',
+                                  '%s/in_voltage%d_en' % (scan, adc), 1):
+                return False
+            index = board._read_sysfs('%s/in_voltage%d_index' % (scan, adc))
+            scan_type = board._read_sysfs('%s/in_voltage%d_type' %
+                                          (scan, adc))
+            match = _SCAN_TYPE.match(scan_type or '')
+            if index is None or match is None or match.group(4) != '16':
+                print("Unsupported scan element for ADC channel %d: %s" %
+                      (adc, scan_type))
+                return False
+            elements.append((int(index), match))
+
+        # The kernel lays the scan out in index order.
+        elements.sort(key=lambda element: element[0])
+        for index, match in elements:
+            endianness, sign, bits, storage, shift = match.groups()
+            bits = int(bits)
+            shift = int(shift)
+            mask = (1 << bits) - 1
+            if not self.raw and bits > 10:
+                # Same 10 bits resolution as analogRead.
+                shift += bits - 10
+                mask >>= bits - 10
+            self.conversions.append((shift, mask))
+        self.swap = (endianness == 'be') != (sys.byteorder == 'big')
+        self.dtype = '>u2' if endianness == 'be' else '<u2'
+
+        if trigger is not None:
+            if board._write_sysfs('analogCapture',
+                                  self.path + '/trigger/current_trigger',
+                                  trigger):
+                return False
+        if length is not None:
+            if board._write_sysfs('analogCapture',
+                                  self.path + '/buffer/length', length):
+                return False
+        if board._write_sysfs('analogCapture', self.path + '/buffer/enable',
+                              1):
+            return False
+        try:
+            self.fd = os.open(self.device, os.O_RDONLY)
+        except OSError as e:
+            print("Failed opening %s: %s" % (self.device, e.strerror))
+            board._write_sysfs('analogCapture', self.path + '/buffer/enable',
+                               0)
+            return False
+        return True
+
+    def _fill(self, size):
+        # Read size bytes into the preallocated buffer. The device hands out
+        # whole scans and blocks until at least one is available.
+        if len(self.buffer) < size:
+            self.buffer = bytearray(size)
+        view = memoryview(self.buffer)
+        done = 0
+        while done < size:
+            got = _readinto(self.fd, view[done:size])
+            if got == 0:
+                break
+            done += got
+        return view[:done - done % self.scan_size]
+
+    def _convert(self, values):
+        if self.swap:
+            values.byteswap()
+        step = len(self.channels)
+        for i, (shift, mask) in enumerate(self.conversions):
+            if shift or mask != 0xffff:
+                values[i::step] = array.array(
+                    'H', [(value >> shift) & mask for value in values[i::step]])
+
+
+class SampleBus(object):
+
+    """Ring buffer of timestamped samples in shared memory.
+
+    One process owns the board, samples a fixed set of analog and digital
+    pins and publishes every sample into a memory mapped file, usually under
+    /dev/shm. Any number of processes attach to the file and read the
+    samples without touching sysfs or the board at all.
+
+    The ring has a fixed number of fixed-size slots and is lock-free: the
+    single writer bumps a sequence number in a slot before and after filling
+    it, and readers drop the samples whose sequence number changed while
+    they were reading them, which only happens to readers lagging a whole
+    ring behind.
+
+    Use GPIOBase.startSampler to create and fill a bus, and SampleBus.attach
+    to read it from another process.
+    """
+
+    def __init__(self, path, fd, mapping):
+        self.path = path
+        self.fd = fd
+        self.map = mapping
+        magic, analog, digital, self.slots, self.slot_size = \
+            _BUS_HEADER.unpack_from(mapping, 0)
+        pins = struct.unpack_from('<40B', mapping, _BUS_HEADER.size)
+        self.analog_pins = pins[:analog]
+        self.digital_pins = pins[20:20 + digital]
+        self.slot = struct.Struct('<dI%dH' % analog)
+        self.count = _BUS_HEAD.unpack_from(mapping, _BUS_HEAD_OFFSET)[0]
+
+    @classmethod
+    def create(cls, path, analog_pins=(), digital_pins=(), slots=1024):
+        """Create a new bus, replacing any existing file.
+
+        Args:
+            path: file to map, e.g. '/dev/shm/wiringx86'
+            analog_pins: Arduino analog pin numbers (14-19) in every sample
+            digital_pins: Arduino pin numbers (0-19) in every sample
+            slots: number of samples kept in the ring
+
+        Returns:
+            A SampleBus object to publish samples with.
+
+        """
+        slot_size = (_BUS_SEQ.size + struct.calcsize(
+            '<dI%dH' % len(analog_pins)) + 7) & ~7
+        size = _BUS_SLOTS_OFFSET + slots * slot_size
+        # The bus is built aside and renamed over path. Truncating the
+        # file in place would kill readers still mapping the old bus with
+        # SIGBUS, this way they keep the old file until they detach.
+        fd, tmp = tempfile.mkstemp(prefix='.%s.' % os.path.basename(path),
+                                   dir=os.path.dirname(path) or '.')
+        try:
+            os.fchmod(fd, 0o644)
+            os.ftruncate(fd, size)
+            mapping = mmap.mmap(fd, size)
+            pins = (list(analog_pins) + [0] * 20)[:20] + \
+                (list(digital_pins) + [0] * 20)[:20]
+            struct.pack_into('<40B', mapping, _BUS_HEADER.size, *pins)
+            _BUS_HEADER.pack_into(mapping, 0, _BUS_MAGIC, len(analog_pins),
+                                  len(digital_pins), slots, slot_size)
+            os.rename(tmp, path)
+        except BaseException:
+            os.close(fd)
+            os.unlink(tmp)
+            raise
+        return cls(path, fd, mapping)
+
+    @classmethod
+    def attach(cls, path):
+        """Attach to an existing bus for reading.
+
+        Args:
+            path: file the bus was created on
+
+        Returns:
+            A read only SampleBus object, or None if path does not hold a
+            sample bus.
+
+        """
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError as e:
+            print("Failed opening %s: %s" % (path, e.strerror))
+            return None
+        size = os.fstat(fd).st_size
+        if size < _BUS_SLOTS_OFFSET:
+            os.close(fd)
+            print("%s is not a sample bus" % path)
+            return None
+        mapping = mmap.mmap(fd, size, access=mmap.ACCESS_READ)
+        if _BUS_HEADER.unpack_from(mapping, 0)[0] != _BUS_MAGIC:
+            mapping.close()
+            os.close(fd)
+            print("%s is not a sample bus" % path)
+            return None
+        return cls(path, fd, mapping)
+
+    def publish(self, timestamp, analog, digital):
+        """Append a sample to the ring. Only the creator of the bus may.
+
+        Args:
+            timestamp: time the sample was taken at, in seconds
+            analog: readings of the analog pins, in analog_pins order
+            digital: states of the digital pins, in digital_pins order
+
+        """
+        mask = 0
+        for i, state in enumerate(digital):
+            if state:
+                mask |= 1 << i
+        sequence = self.count
+        offset = _BUS_SLOTS_OFFSET + (sequence % self.slots) * self.slot_size
+        _BUS_SEQ.pack_into(self.map, offset, 2 * sequence + 1)
+        self.slot.pack_into(self.map, offset + _BUS_SEQ.size, timestamp,
+                            mask, *analog)
+        _BUS_SEQ.pack_into(self.map, offset, 2 * sequence + 2)
+        self.count = sequence + 1
+        _BUS_HEAD.pack_into(self.map, _BUS_HEAD_OFFSET, self.count)
+
+    def head(self):
+        """Return the number of samples published so far."""
+        return _BUS_HEAD.unpack_from(self.map, _BUS_HEAD_OFFSET)[0]
+
+    def read(self, cursor=0):
+        """Read the samples published since a previous call.
+
+        Args:
+            cursor: value returned by the previous call, or 0 to get
+                    everything still in the ring.
+
+        Returns:
+            (samples, cursor) tuple. samples is a list of (timestamp,
+            analog, digital) tuples, oldest first. Samples overwritten
+            before they could be read are skipped. Pass cursor to the next
+            call.
+
+        """
+        head = self.head()
+        cursor = max(cursor, head - self.slots)
+        samples = []
+        for sequence in range(cursor, head):
+            sample = self._read_slot(sequence)
+            if sample is not None:
+                samples.append(sample)
+        return samples, head
+
+    def latest(self):
+        """Return the newest sample as (timestamp, analog, digital), or
+        None if nothing has been published yet."""
+        while True:
+            head = self.head()
+            if head == 0:
+                return None
+            sample = self._read_slot(head - 1)
+            if sample is not None:
+                return sample
+
+    def close(self):
+        """Unmap the bus. The file is left in place for other readers."""
+        self.map.close()
+        os.close(self.fd)
+
+    def _read_slot(self, sequence):
+        offset = _BUS_SLOTS_OFFSET + (sequence % self.slots) * self.slot_size
+        before = _BUS_SEQ.unpack_from(self.map, offset)[0]
+        values = self.slot.unpack_from(self.map, offset + _BUS_SEQ.size)
+        after = _BUS_SEQ.unpack_from(self.map, offset)[0]
+        if before != after or after != 2 * sequence + 2:
+            return None
+        mask = values[1]
+        digital = tuple((mask >> i) & 1
+                        for i in range(len(self.digital_pins)))
+        return values[0], values[2:], digital
+
+
+class _Sampler(threading.Thread):
+
+    """Thread publishing samples of a board into a SampleBus."""
+
+    def __init__(self, board, bus, interval):
+        super(_Sampler, self).__init__()
+        self.daemon = True
+        self.board = board
+        self.bus = bus
+        self.interval = interval
+        self.stopping = threading.Event()
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+
+    def run(self):
+        board = self.board
+        bus = self.bus
+        analog_pins = bus.analog_pins
+        digital_pins = bus.digital_pins
+        analog = array.array('H', [0]) * len(analog_pins)
+        digital = ()
+        deadline = _monotonic()
+        while not self.stopping.is_set():
+            timestamp = _monotonic()
+            if analog_pins:
+                board.analogReadMany(analog_pins, out=analog)
+            if digital_pins:
+                digital = board.digitalReadMany(digital_pins)
+            bus.publish(timestamp, analog, digital)
+            # Absolute deadlines keep the rate from drifting. Deadlines
+            # missed are skipped rather than bunched up.
+            deadline += self.interval
+            if deadline < timestamp:
+                deadline = timestamp
+            _sleep_until(deadline)
+
+
+class _WaveformTrack(object):
+
+    """Sequence of duty cycles played on a PWM pin."""
+
+    __slots__ = ('values', 'period', 'loop', 'start', 'previous', 'fade')
+
+    def __init__(self, values, period, loop, start, previous, fade):
+        self.values = values
+        self.period = period
+        self.loop = loop
+        self.start = start
+        # Track faded out over the first fade seconds of this one.
+        self.previous = previous
+        self.fade = fade
+
+    def sample(self, now):
+        # Return the value at time now and when it changes next, or None
+        # for the latter once the track is over.
+        step = int((now - self.start) / self.period)
+        if step >= len(self.values) and not self.loop:
+            value, deadline = self.values[-1], None
+        else:
+            value = self.values[step % len(self.values)]
+            deadline = self.start + (step + 1) * self.period
+
+        if self.previous is not None:
+            elapsed = now - self.start
+            if elapsed >= self.fade:
+                self.previous = None
+            else:
+                old, old_deadline = self.previous.sample(now)
+                value = old + (value - old) * elapsed / self.fade
+                # Keep stepping the mix even if both tracks hold still.
+                deadlines = [d for d in (deadline, old_deadline) if d]
+                deadline = min(deadlines + [now + self.period])
+        return value, deadline
+
+
+class _WaveformPlayer(threading.Thread):
+
+    """Thread playing waveforms on PWM pins.
+
+    Every value is written when it is due according to the monotonic clock,
+    so the timing does not drift and late steps are skipped rather than
+    delayed. The thread sleeps until the next value is due, or until it is
+    woken up by a change of the waveforms.
+    """
+
+    def __init__(self, board):
+        super(_WaveformPlayer, self).__init__()
+        self.daemon = True
+        self.board = board
+        self.lock = threading.Lock()
+        self.tracks = {}
+        self.stopping = False
+        self.wakeup_read, self.wakeup_write = os.pipe()
+
+    def play(self, pins, values, period, loop, crossfade):
+        now = _monotonic()
+        with self.lock:
+            for pin in pins:
+                previous = self.tracks.get(pin) if crossfade > 0 else None
+                self.tracks[pin] = _WaveformTrack(values, period, loop, now,
+                                                  previous, crossfade)
+        os.write(self.wakeup_write, b'x')
+
+    def remove(self, pins):
+        with self.lock:
+            for pin in pins:
+                self.tracks.pop(pin, None)
+        os.write(self.wakeup_write, b'x')
+
+    def playing(self, pin):
+        return pin in self.tracks
+
+    def stop(self):
+        self.stopping = True
+        os.write(self.wakeup_write, b'x')
+        self.join()
+        os.close(self.wakeup_read)
+        os.close(self.wakeup_write)
+
+    def run(self):
+        board = self.board
+        while not self.stopping:
+            now = _monotonic()
+            deadline = None
+            with self.lock:
+                tracks = list(self.tracks.items())
+            for pin, track in tracks:
+                value, next_change = track.sample(now)
+                # Values already in place are skipped by _analog_write,
+                # which compares them with the duty cycle last written.
+                try:
+                    board._analog_write(pin, board.PWM_MAPPING[pin],
+                                        int(value + 0.5))
+                except Exception:
+                    traceback.print_exc()
+                if next_change is None:
+                    with self.lock:
+                        if self.tracks.get(pin) is track:
+                            del self.tracks[pin]
+                elif deadline is None or next_change < deadline:
+                    deadline = next_change
+
+            timeout = None
+            if deadline is not None:
+                timeout = max(deadline - _monotonic(), 0)
+            try:
+                readable = select.select([self.wakeup_read], [], [],
+                                         timeout)[0]
+            except (IOError, OSError, select.error) as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            if readable:
+                os.read(self.wakeup_read, 64)
+
+
+class ScheduledTask(object):
+
+    """Periodic task registered with Scheduler.every.
+
+    Attributes:
+        period: seconds between runs
+        runs: number of times the task has run
+        misses: number of deadlines that passed without the task running
+                because the scheduler was running late
+        max_lateness: longest delay seen, in seconds, between a deadline and
+                      the task actually starting
+    """
+
+    __slots__ = ('period', 'func', 'args', 'deadline', 'runs', 'misses',
+                 'max_lateness', 'cancelled')
+
+    def __init__(self, period, func, args, deadline):
+        self.period = period
+        self.func = func
+        self.args = args
+        self.deadline = deadline
+        self.runs = 0
+        self.misses = 0
+        self.max_lateness = 0.0
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return self.deadline < other.deadline
+
+    def cancel(self):
+        """Stop running the task."""
+        self.cancelled = True
+
+
+class Scheduler(object):
+
+    """Runs periodic tasks at absolute deadlines from a single thread.
+
+    Every task runs at start + n * period on the monotonic clock, and the
+    thread sleeps with clock_nanosleep until the next absolute deadline, or
+    until a task due earlier is added. The time spent running the tasks
+    therefore never shifts the following deadlines, unlike a loop around
+    time.sleep. Deadlines that can not be
+    met are counted as misses and skipped, so a task never runs several
+    times in a row to catch up.
+
+    Tasks are plain callables, e.g. Pin.write, GPIOBase.analogRead or a
+    function stepping a PWM output. They must return quickly: all of them
+    share the thread.
+    """
+
+    def __init__(self):
+        self.tasks = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.running = False
+        # Pipe waking the loop up when a task is due before the one it
+        # sleeps for, or on stop, while the loop runs. woken is set while a
+        # byte is waiting in it, so it never holds more than one.
+        self.wakeup = None
+        self.woken = False
+
+    def every(self, period, func, *args):
+        """Run func(*args) every period seconds.
+
+        The first run is one period from now. Tasks added with the same
+        period at the same time run in the order they were added.
+
+        Args:
+            period: seconds between runs
+            func: callable to run
+            args: arguments passed to func
+
+        Returns:
+            A ScheduledTask object, to check for deadline misses or cancel
+            the task.
+
+        """
+        task = ScheduledTask(period, func, args, _monotonic() + period)
+        with self.lock:
+            # A list kept sorted, oldest first for equal deadlines.
+            bisect.insort_right(self.tasks, task)
+            if self.tasks[0] is task:
+                self._wake()
+        return task
+
+    def start(self):
+        """Run the tasks from a background thread."""
+        if self.thread is not None:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        """Run the tasks from the calling thread until stop is called."""
+        self.running = True
+        self._loop()
+
+    def stop(self):
+        """Stop running the tasks. Waits for the background thread."""
+        with self.lock:
+            self.running = False
+            self._wake()
+        if (self.thread is not None and
+                self.thread is not threading.current_thread()):
+            self.thread.join()
+            self.thread = None
+
+    def _wake(self):
+        # Called with the lock held.
+        if self.wakeup is not None and not self.woken:
+            self.woken = True
+            os.write(self.wakeup[1], b'x')
+
+    def _wait(self, timeout):
+        # Wait for timeout seconds, forever if None. Returns True if woken
+        # up before.
+        try:
+            readable = select.select([self.wakeup[0]], [], [], timeout)[0]
+        except (IOError, OSError, select.error) as e:
+            if e.args[0] == errno.EINTR:
+                return True
+            raise
+        if not readable:
+            return False
+        with self.lock:
+            os.read(self.wakeup[0], 1)
+            self.woken = False
+        return True
+
+    def _loop(self):
+        with self.lock:
+            self.wakeup = os.pipe()
+            self.woken = False
+        try:
+            while self.running:
+                self._run_next()
+        finally:
+            with self.lock:
+                wakeup, self.wakeup = self.wakeup, None
+            os.close(wakeup[0])
+            os.close(wakeup[1])
+
+    def _run_next(self):
+        with self.lock:
+            while self.tasks and self.tasks[0].cancelled:
+                self.tasks.pop(0)
+            if not self.tasks:
+                task = None
+            else:
+                task = self.tasks[0]
+        if task is None:
+            self._wait(None)
+            return
+        timeout = task.deadline - _monotonic()
+        if timeout > 0:
+            if self._wait(timeout):
+                return
+            # select rounds the timeout, the absolute sleep does not.
+            _sleep_until(task.deadline)
+            if task.cancelled:
+                return
+
+        now = _monotonic()
+        lateness = now - task.deadline
+        if lateness > task.max_lateness:
+            task.max_lateness = lateness
+        try:
+            task.func(*task.args)
+        except Exception:
+            traceback.print_exc()
+        task.runs += 1
+
+        with self.lock:
+            if task.cancelled:
+                return
+            # Tasks added meanwhile may have gone in front of it.
+            self.tasks.remove(task)
+            task.deadline += task.period
+            now = _monotonic()
+            if task.deadline <= now:
+                missed = int((now - task.deadline) / task.period) + 1
+                task.misses += missed
+                task.deadline += missed * task.period
+            bisect.insort_right(self.tasks, task)
+
+
+class TraceRecorder(object):
+
+    """Ring buffer recording the low level operations of a board.
+
+    Every sysfs write, and every read and write through the open handlers,
+    is stored as a fixed size binary record: operation, path, value,
+    monotonic timestamp and duration. Paths are stored once in a string
+    table and referred to by index. Values are stored as numbers, except the
+    few that are words, such as directions, which go in the string table.
+
+    The setup holds the configuration of the board when the trace started,
+    as sysfs writes. Once the ring is full the oldest records are
+    overwritten, and the sysfs writes among them are folded into the setup
+    first: it keeps the last value written to every attribute still
+    exported. Replaying the setup before the records brings the board to
+    the configuration the oldest record found.
+
+    Created by GPIOBase.startTrace. Use dump to save the trace to a file and
+    TraceRecorder.load to read it back, e.g. with tools/replay_trace.py.
+    """
+
+    # Operations: sysfs attribute opened, written and closed, and write or
+    # read through an open handler.
+    OPERATIONS = ('write', 'pwrite', 'read')
+
+    def __init__(self, size=65536, board=''):
+        self.size = size
+        self.board = board
+        self.buffer = bytearray(size * _TRACE_RECORD.size)
+        self.count = 0
+        self.strings = []
+        self.string_ids = {}
+        # (path, value for exports) -> value of the folded sysfs writes.
+        self.setup = collections.OrderedDict()
+        # Records overwritten before the trace was saved, for loaded traces.
+        self.skipped = 0
+
+    def add(self, operation, path, value, start, end, error=0):
+        """Append a record. operation is an index into OPERATIONS, value a
+        number or a string."""
+        offset = (self.count % self.size) * _TRACE_RECORD.size
+        if (self.count >= self.size and
+                self.buffer[offset] == _TRACE_WRITE):
+            self._fold(offset)
+        _TRACE_RECORD.pack_into(self.buffer, offset, operation,
+                                min(error, 255), self._intern(path),
+                                self._value(value), int(start * 1e9),
+                                min(int((end - start) * 1e9), 0xffffffff))
+        self.count += 1
+
+    def add_setup(self, path, value):
+        """Add a sysfs write to the setup, replacing any previous write to
+        the same attribute. value is a number or a string."""
+        value = self._value(value)
+        self._intern(path)
+        if path.endswith('/unexport'):
+            # Forget the export and everything written under the directory.
+            directory = path[:-len('/unexport')]
+            prefix = '%s/%s%d/' % (directory, 'gpio' if directory.endswith(
+                '/gpio') else 'pwm', value)
+            for key in list(self.setup):
+                if key == (directory + '/export', value) or \
+                        key[0].startswith(prefix):
+                    del self.setup[key]
+            return
+        key = self._setup_key(path, value)
+        # Moved to the end: replayed in the order of the last writes.
+        self.setup.pop(key, None)
+        self.setup[key] = value
+
+    def records(self):
+        """Return the records in the ring, oldest first.
+
+        Returns:
+            List of (operation, path, value, timestamp, duration, errno)
+            tuples. operation is one of OPERATIONS, value a string,
+            timestamp the monotonic time in seconds and duration in
+            seconds.
+
+        """
+        first = max(self.count - self.size, 0)
+        records = []
+        for index in range(first, self.count):
+            offset = (index % self.size) * _TRACE_RECORD.size
+            operation, error, path, value, timestamp, duration = \
+                _TRACE_RECORD.unpack_from(self.buffer, offset)
+            records.append((self.OPERATIONS[operation], self.strings[path],
+                            self._string(value), timestamp * 1e-9,
+                            duration * 1e-9, error))
+        return records
+
+    def setup_writes(self):
+        """Return the sysfs writes folded from the records overwritten, as
+        (path, value) tuples in the order to replay them."""
+        return [(key[0], self._string(value))
+                for key, value in self.setup.items()]
+
+    def overwritten(self):
+        """Return the number of records overwritten in the ring."""
+        return self.skipped + max(self.count - self.size, 0)
+
+    def dump(self, path):
+        """Save the setup and the records in the ring to a file, oldest
+        first.
+
+        Returns:
+            Number of records saved.
+
+        """
+        first = max(self.count - self.size, 0)
+        with open(path, 'wb') as f:
+            f.write(_TRACE_HEADER.pack(_TRACE_MAGIC, len(self.strings),
+                                       len(self.setup), self.overwritten(),
+                                       self.count - first))
+            for string in [self.board] + self.strings:
+                data = string.encode('utf-8')
+                f.write(struct.pack('<H', len(data)) + data)
+            for key, value in self.setup.items():
+                f.write(_TRACE_SETUP.pack(self.string_ids[key[0]], value))
+            for index in range(first, self.count):
+                offset = (index % self.size) * _TRACE_RECORD.size
+                f.write(self.buffer[offset:offset + _TRACE_RECORD.size])
+        return self.count - first
+
+    @classmethod
+    def load(cls, path):
+        """Read a trace saved with dump.
+
+        Returns:
+            A TraceRecorder holding the setup and the records of the file.
+            Its board attribute is the name of the board class that
+            recorded it.
+
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, strings, setup, skipped, count = \
+            _TRACE_HEADER.unpack_from(data, 0)
+        if magic != _TRACE_MAGIC:
+            raise ValueError('%s is not a trace file' % path)
+        offset = _TRACE_HEADER.size
+        table = []
+        for i in range(strings + 1):
+            length = struct.unpack_from('<H', data, offset)[0]
+            offset += 2
+            table.append(data[offset:offset + length].decode('utf-8'))
+            offset += length
+
+        trace = cls(max(count, 1), table[0])
+        trace.strings = table[1:]
+        trace.string_ids = dict((s, i) for i, s in enumerate(trace.strings))
+        for i in range(setup):
+            path, value = _TRACE_SETUP.unpack_from(data, offset)
+            offset += _TRACE_SETUP.size
+            trace.setup[trace._setup_key(trace.strings[path], value)] = value
+        trace.skipped = skipped
+        size = count * _TRACE_RECORD.size
+        trace.buffer[:size] = data[offset:offset + size]
+        trace.count = count
+        return trace
+
+    def _intern(self, string):
+        index = self.string_ids.get(string)
+        if index is None:
+            index = self.string_ids[string] = len(self.strings)
+            self.strings.append(string)
+        return index
+
+    def _value(self, value):
+        if isinstance(value, int):
+            return value
+        return int(value) if value.isdigit() else -1 - self._intern(value)
+
+    def _string(self, value):
+        return str(value) if value >= 0 else self.strings[-1 - value]
+
+    def _setup_key(self, path, value):
+        # Every GPIO or PWM channel exported has an entry of its own.
+        return (path, value if path.endswith('/export') else None)
+
+    def _fold(self, offset):
+        # Fold the sysfs write about to be overwritten into the setup.
+        operation, error, path, value = \
+            _TRACE_RECORD.unpack_from(self.buffer, offset)[:4]
+        if not error:
+            self.add_setup(self.strings[path], value)
+
 
 class GPIOBase(object):
 
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, root='', simulator=None, registers=None,
+                 gpiochip=None):
         """Constructor
 
         Args:
             debug: enables the debug mode showing the interaction with sysfs
+            root: prefix prepended to every sysfs path. Defaults to the real
+                  filesystem root.
+            simulator: SysfsSimulator instance to run against instead of a
+                       real board. Its root overrides the root argument.
+            registers: file to map the GPIO controller registers from, or
+                       True for the PCI resource file of the board
+                       (GPIO_REGISTERS_PATH). digitalWrite and digitalRead
+                       then access the registers of the pins listed in
+                       GPIO_REGISTERS directly. Disabled when None.
+            gpiochip: True to drive the GPIOs through the GPIO character
+                      devices (/dev/gpiochipN) rather than through sysfs,
+                      or the GPIOChipIO-like object to make the calls with.
+                      Boards with a simulator use its simulated devices.
 
         """
         self.debug = debug
-        self.pins_in_use = []
+        self.simulator = simulator
+        if simulator is not None:
+            root = simulator.root
+        self.root = root
+        self.gpio_path = root + GPIO_SYSFS
+        self.pwm_path = root + PWM_SYSFS
+        self.iio_path = root + IIO_SYSFS
+        self.gpio_debug_path = root + GPIO_DEBUGFS
+        # Exported Linux GPIOs, and the Arduino pins whose muxing uses each
+        # of them. A GPIO shared by several pins is exported only once.
+        self.pins_in_use = set()
+        self.gpio_users = {}
+        self.pin_gpios = {}
+        # Value handlers are raw descriptors, always left at offset 0.
+        # fd_paths maps every cached descriptor to the file it was opened on.
         self.gpio_handlers = {}
-        self.exported_pwm = []
-        self.enabled_pwm = {}
+        self.fd_paths = {}
+        # Lists of value descriptors for the last pin sets seen by
+        # digitalReadMany, digitalWriteMany and analogReadMany.
+        self.many_fds = {}
+        # Arduino pin -> Pin object, for every pin configured with pinMode.
+        self.pins = {}
+        self.exported_pwm = set()
+        self.pwm_handlers = {}
+        # Shadow copy of what has been written to each exported PWM channel:
+        # duty_cycle, enable and period.
+        self.pwm_state = {}
+        # Shadow copy of what has been written to each exported Linux GPIO:
+        # direction, drive, value and muxmode.
+        self.gpio_state = {}
+        # Interrupts: Arduino pin -> file descriptor watched for edges.
+        self.interrupt_fds = {}
+        self.dispatcher = None
+        # Running ADCCapture. The IIO device has a single buffer.
+        self.capture = None
+        # Operation name -> _OpStats. Value and ADC reads and writes through
+        # open handlers are only timed when handler_stats is set, and are
+        # counted in handler_counts the rest of the time.
+        self.op_stats = {}
+        self.handler_counts = dict.fromkeys(_HANDLER_OPS, 0)
+        self.handler_stats = False
+        self.tracer = None
+        # Whether handler operations go through _handler_io.
+        self.instrumented = False
+        self.sampler = None
+        self.player = None
+        # Mapped GPIO controller registers, and register offset -> c_uint32
+        # on the mapping for the registers in use.
+        self.register_map = None
+        self.register_words = {}
+        if registers is not None:
+            if registers is True:
+                registers = root + (self.GPIO_REGISTERS_PATH or '')
+            self._map_registers(registers)
+        # GPIO character devices: the object making the calls, the chips as
+        # (base, ngpio, device) once looked up and their descriptors, Linux
+        # GPIO -> (_LineHandle, index) for every requested line, and the
+        # event request of every Linux GPIO with an interrupt attached.
+        if gpiochip is True:
+            gpiochip = (GPIOChipIO() if simulator is None else
+                        simulator.gpiochip)
+        self.gpiochip = gpiochip
+        self.line_chips = None
+        self.chip_fds = {}
+        self.line_handles = {}
+        self.line_events = {}
+        # Cleared if the kernel turns down the bias flags.
+        self.line_bias = True
 
         if self.has_pinmux():
-            self._export_pin(self.pinmux)
-            self._set_direction(self.pinmux, self.HIGH)
+            self._apply_operations([(self.pinmux, 'export', None),
+                                    (self.pinmux, 'direction', self.HIGH)])
 
     def has_pinmux(self):
         return hasattr(self, 'pinmux')
@@ -81,176 +1622,794 @@ class GPIOBase(object):
                 PWM:            Pin used as analog output (PWM).
 
         """
-        if pin not in self.GPIO_MAPPING:
-            return False
+        return self.pinModes({pin: mode})
+
+    def pinModes(self, modes):
+        """Set the mode of several GPIO pins at once.
+
+        Equivalent to calling pinMode for every pin in ascending pin order,
+        but the muxing of all the pins is merged into a single sequence
+        first. Muxing GPIOs shared by several pins are exported and written
+        only once, and writes that a later pin would overwrite anyway are
+        dropped. On boards with a global pinmux line it is toggled just once.
+
+        Args:
+            modes: dictionary mapping Arduino pin numbers (0-19) to pin
+                   modes. See pinMode for the valid modes.
+
+        Returns:
+            False, without touching the board, if any of the pins or modes is
+            not valid. True otherwise.
+
+        """
+        start = _monotonic()
+        plans = []
+        for pin in sorted(modes):
+            mode = modes[pin]
+            if pin not in self.GPIO_MAPPING:
+                return False
+            mux = self._select_muxing(mode, pin)
+            if mux is None:
+                return False
+            plans.append((pin, mode, self._mux_operations(pin, mode, mux)))
+
+        # The last pin touching a GPIO decides its final state. Operations
+        # from earlier pins on the same GPIO are duplicates or conflicts.
+        owners = {}
+        for pin, mode, operations in plans:
+            for linux_pin, attribute, value in operations:
+                if attribute != 'export':
+                    owners[linux_pin, attribute == 'muxmode'] = pin
+
+        merged = []
+        exported = set()
+        for pin, mode, operations in plans:
+            for operation in operations:
+                linux_pin, attribute, value = operation
+                if attribute == 'export':
+                    if linux_pin in exported:
+                        continue
+                    exported.add(linux_pin)
+                elif owners[linux_pin, attribute == 'muxmode'] != pin:
+                    continue
+                merged.append(operation)
+
+        if self.has_pinmux():
+            self._apply_operations([(self.pinmux, 'direction', self.LOW)])
+
+        self._apply_operations(merged)
+
+        for pin, mode, operations in plans:
+            self._claim_gpios(pin, set(op[0] for op in operations))
+            linux_pin = self.GPIO_MAPPING[pin]
+            # In these two cases we open file handlers to write directly into
+            # them. That makes it faster than going through sysfs.
+            if mode == ANALOG_INPUT:
+                adc = self.ADC_MAPPING[pin]
+                self._open_analog_handler(linux_pin, adc)
+            elif mode in (OUTPUT, INPUT, INPUT_PULLUP, INPUT_PULLDOWN):
+                # Requested lines are read and written through their handle.
+                if self.gpiochip is None:
+                    self._open_digital_handler(linux_pin)
+            elif mode == PWM:
+                self._init_pwm(pin)
+            self._update_pin(pin, mode)
 
         if self.has_pinmux():
-            self._set_direction(self.pinmux, self.LOW)
+            self._apply_operations([(self.pinmux, 'direction', self.HIGH)])
+
+        self._record('pin_mode', start)
+        return True
+
+    def pin(self, pin):
+        """Get the Pin object of a GPIO pin.
+
+        Args:
+            pin: Arduino pin number (0-19)
+
+        Returns:
+            The Pin object of the pin, or None if the pin has not been
+            configured with pinMode.
+
+        """
+        return self.pins.get(pin)
+
+    def digitalWrite(self, pin, state):
+        """Write a value to a GPIO pin.
+
+        The GPIO pin is assumed to be configured as OUTPUT
+
+        Args:
+            pin: Arduino pin number (0-19)
+            state: pin state to be written (LOW-HIGH)
+
+        """
+        slot = self.pins.get(pin)
+        if slot is None:
+            return self._not_configured(pin)
+        slot.write(state)
+
+    def digitalRead(self, pin):
+        """Read GPIO pin's state.
+
+        The GPIO pin is assumed to be configured as INPUT
+
+        Args:
+            pin: Arduino pin number (0-19)
+
+        Returns:
+            Current value of the GPIO pin as an Integer, or None if the pin
+            has not been configured with pinMode.
+
+        """
+        slot = self.pins.get(pin)
+        if slot is None:
+            return self._not_configured(pin)
+        return slot.read()
+
+    def digitalWriteMany(self, states):
+        """Write values to several GPIO pins.
+
+        The GPIO pins are assumed to be configured as OUTPUT. Much faster
+        than calling digitalWrite for every pin: the value files of each set
+        of pins are looked up only the first time it is used.
+
+        Args:
+            states: dictionary mapping Arduino pin numbers (0-19) to the
+                    state to be written (LOW-HIGH)
+
+        """
+        if self.gpiochip is not None:
+            return self._write_lines(states)
+        fds = self._many_fds(tuple(states))
+        if fds is None:
+            return
+        start = _monotonic()
+        for fd, state in zip(fds, states.values()):
+            _pwrite(fd, _LOW_BYTES if state == LOW else _HIGH_BYTES)
+        if self.instrumented:
+            self._handler_io('value_write_many', fds,
+                             [0 if state == LOW else 1
+                              for state in states.values()], start)
+        else:
+            self.handler_counts['value_write_many'] += 1
+
+    def digitalReadMany(self, pins):
+        """Read the state of several GPIO pins.
+
+        The GPIO pins are assumed to be configured as INPUT. Much faster
+        than calling digitalRead for every pin: the value files of each set
+        of pins are looked up only the first time it is used.
+
+        Args:
+            pins: sequence of Arduino pin numbers (0-19)
+
+        Returns:
+            Tuple with the current value of each pin as an Integer, in the
+            same order as pins.
+
+        """
+        if self.gpiochip is not None:
+            return self._read_lines(pins)
+        fds = self._many_fds(tuple(pins))
+        if fds is None:
+            return
+        start = _monotonic()
+        states = tuple([1 if _pread(fd, 1) == _HIGH_BYTES else 0
+                        for fd in fds])
+        if self.instrumented:
+            self._handler_io('value_read_many', fds, states, start)
+        else:
+            self.handler_counts['value_read_many'] += 1
+        return states
+
+    def analogWrite(self, pin, value):
+        """Write analog output (PWM)
+
+        The GPIO pin is assumed to be configured as PWM. Generates a PWM
+        signal with the desired duty cycle. The value must be in range 0-255.
+
+        Args:
+            pin: Arduino PWM pin number (3, 5, 6, 9, 10, 11)
+            value: the duty cycle: between 0 (always off) and 255 (always on)
+
+        """
+        if pin not in self.PWM_MAPPING:
+            return
+        self._analog_write(pin, self.PWM_MAPPING[pin], value)
+
+    def playWaveform(self, pins, values, period, loop=False, crossfade=0):
+        """Play a sequence of duty cycles on PWM pins.
 
-        mux = self._select_muxing(mode, pin)
-        if mux is None:
+        The GPIO pins are assumed to be configured as PWM. The values are
+        written one every period from a background thread, which keeps the
+        timing steady without any work from the caller. The call returns
+        immediately. Playing a new waveform on a pin replaces the one it was
+        playing. Once a waveform is over the pin keeps its last value.
+
+        Args:
+            pins: Arduino PWM pin number (3, 5, 6, 9, 10, 11), or a sequence
+                  of them to play the same waveform on all in sync.
+            values: sequence of duty cycles, as in analogWrite (0-255)
+            period: time each value lasts, in seconds
+            loop: start over when the end is reached, until stopped.
+            crossfade: seconds to blend from the waveform the pins were
+                       playing into the new one.
+
+        Returns:
+            False if any of the arguments is not valid, or any of the pins
+            is not configured as PWM. True otherwise.
+
+        """
+        if isinstance(pins, int):
+            pins = (pins, )
+        if (not pins or not values or period <= 0 or
+                any(not self._is_pwm_pin(pin) for pin in pins)):
             return False
 
-        linux_pin = self.GPIO_MAPPING[pin]
-        self._export_pin(linux_pin)
+        if self.player is None:
+            self.player = _WaveformPlayer(self)
+            self.player.start()
+        self.player.play(pins, tuple(values), period, loop, crossfade)
+        return True
 
-        # In these two cases we open file handlers to write directly into them.
-        # That makes it faster than going through sysfs.
-        # No bother with PWM.
-        if mode == ANALOG_INPUT:
-            adc = self.ADC_MAPPING[pin]
-            self._open_analog_handler(linux_pin, adc)
-        elif mode in (OUTPUT, INPUT, INPUT_PULLUP, INPUT_PULLDOWN):
-            self._open_digital_handler(linux_pin)
+    def _not_configured(self, pin):
+        # Invalid pins are silently ignored, like the rest of the API does.
+        if pin in self.GPIO_MAPPING:
+            print('Pin %d has not been configured with pinMode' % pin)
 
-        # Walk through the muxing table and set the pins to their values. This
-        # is the actual muxing.
-        for vpin, value in mux:
-            self._export_pin(vpin)
+    def _is_pwm_pin(self, pin):
+        # Configured as PWM, on a pin that has a PWM channel on this board.
+        slot = self.pins.get(pin)
+        return (slot is not None and slot.mode == PWM and
+                self.PWM_MAPPING.get(pin) is not None)
 
-            self._set_direction(vpin, value)
-            if value == NONE:
-                self._set_drive(vpin, DRIVE_HIZ)
-            elif value in (HIGH, LOW):
-                self._set_drive(vpin, DRIVE_STRONG)
-                self._write_value(vpin, value)
-            elif value in ALL_MODES:
-                self._muxmode(vpin, value)
+    def stopWaveform(self, pins=None):
+        """Stop playing waveforms. The pins keep their current value.
 
-        if mode == OUTPUT:
-            self._set_direction(linux_pin, OUTPUT)
-            self._set_drive(linux_pin, DRIVE_STRONG)
-            self._write_value(linux_pin, LOW)
-        elif mode in (INPUT, INPUT_PULLUP, INPUT_PULLDOWN):
-            self._set_direction(linux_pin, INPUT)
-        elif mode == PWM:
-            self._init_pwm(pin)
+        Args:
+            pins: Arduino PWM pin number or sequence of them. All the pins
+                  are stopped when None.
 
-        if self.has_pinmux():
-            self._set_direction(self.pinmux, self.HIGH)
+        """
+        if self.player is None:
+            return
+        if pins is None:
+            self.player.stop()
+            self.player = None
+            return
+        if isinstance(pins, int):
+            pins = (pins, )
+        self.player.remove(pins)
+
+    def isPlaying(self, pin):
+        """Return True if a waveform is playing on a PWM pin."""
+        return self.player is not None and self.player.playing(pin)
+
+    def analogRead(self, pin):
+        """Read analog input from the pin
+
+        The GPIO pin is assumed to be configured as ANALOG_INPUT.
+        Returns values in range 0-1023
+
+        Args:
+            pin: Arduino analog pin number (14-19)
+
+        Returns:
+            Digital representation with 10 bits resolution (range 0-1023) of
+            voltage on the pin, or None if the pin has not been configured
+            with pinMode.
+
+        """
+        if pin not in self.ADC_MAPPING:
+            return
+        slot = self.pins.get(pin)
+        if slot is None:
+            return self._not_configured(pin)
+        return slot.read()
+
+    def analogReadOversampled(self, pin, n, method='mean', bits=10):
+        """Read an analog input averaging several samples.
+
+        The GPIO pin is assumed to be configured as ANALOG_INPUT. The ADC is
+        read n times in a row at full 12 bits resolution and the samples are
+        combined, which filters out noise. It is much cheaper than calling
+        analogRead n times.
+
+        Averaging also adds resolution: every extra bit above 12 takes 4
+        times as many samples, e.g. n=16 for 14 bits, as long as the signal
+        carries some noise.
+
+        Args:
+            pin: Arduino analog pin number (14-19)
+            n: number of samples to take
+            method: 'mean' or 'median'. The median ignores spikes, but it
+                    does not add resolution.
+            bits: resolution of the returned value. 10 bits, the default,
+                  gives the same range as analogRead.
+
+        Returns:
+            Combined reading with the requested resolution (range
+            0 - 2**bits-1).
+
+        """
+        slot = self.pins.get(pin)
+        if (slot is None or slot.mode != ANALOG_INPUT or n < 1 or
+                method not in ('mean', 'median')):
+            return
+        fd = slot.fd
+        start = _monotonic()
+        samples = [int(_pread(fd, 16)) for i in range(n)]
+        if self.instrumented:
+            self._handler_io('adc_read_oversampled', [fd] * n, samples,
+                             start)
+        else:
+            self.handler_counts['adc_read_oversampled'] += 1
+        if method == 'median':
+            samples.sort()
+            total = samples[(n - 1) // 2] + samples[n // 2]
+            n = 2
+        else:
+            total = sum(samples)
+        # total / n is in 12 bits. Scale it and round to nearest.
+        scale = 1 << bits
+        return min((2 * total * scale // 4096 + n) // (2 * n), scale - 1)
+
+    def analogReadMany(self, pins, raw=False, out=None):
+        """Read several analog inputs.
+
+        The GPIO pins are assumed to be configured as ANALOG_INPUT. Much
+        faster than calling analogRead for every pin: the value files of each
+        set of pins are looked up only the first time it is used.
+
+        Args:
+            pins: sequence of Arduino analog pin numbers (14-19)
+            raw: return the raw 12 bits readings (range 0-4095) instead of
+                 the 10 bits ones returned by analogRead.
+            out: array('H'), or any other mutable sequence, with room for
+                 len(pins) readings. Reusing it saves an allocation per call.
+
+        Returns:
+            out, or a new array('H') when omitted, with the reading of each
+            pin in the same order as pins.
+
+        """
+        fds = self._many_fds(tuple(pins), analog=True)
+        if fds is None:
+            return
+        if out is None:
+            out = array.array('H', [0]) * len(fds)
+        shift = 0 if raw else 2
+        start = _monotonic()
+        for i, fd in enumerate(fds):
+            out[i] = int(_pread(fd, 16)) >> shift
+        if self.instrumented:
+            self._handler_io('adc_read_many', fds, out, start)
+        else:
+            self.handler_counts['adc_read_many'] += 1
+        return out
+
+    def analogCapture(self, pins, trigger=None, length=None, raw=False):
+        """Start a continuous capture of analog inputs.
+
+        The ADC samples all the pins on every event of the trigger and the
+        kernel buffers the readings until they are read from the returned
+        object. Only one capture can run at a time. analogRead still works
+        on other pins while it runs.
+
+        Args:
+            pins: sequence of Arduino analog pin numbers (14-19)
+            trigger: name of the IIO trigger driving the sampling, e.g.
+                     'hrtimer-trig0'. The current trigger is kept when None.
+            length: number of scans the kernel buffer holds. The current
+                    length is kept when None.
+            raw: return the raw 12 bits readings instead of the 10 bits
+                 analogRead resolution.
+
+        Returns:
+            An ADCCapture object, or None if the capture could not be
+            started.
+
+        """
+        if self.capture is not None:
+            print("An analog capture is already running")
+            return None
+        if not pins or any(pin not in self.ADC_MAPPING for pin in pins):
+            return None
+
+        capture = ADCCapture(self, pins, raw)
+        if not capture._start(trigger, length):
+            capture._disable_channels()
+            return None
+        self.capture = capture
+        return capture
+
+    def startSampler(self, path, analog_pins=(), digital_pins=(),
+                     interval=0.001, slots=1024):
+        """Start publishing samples of some pins into shared memory.
+
+        A background thread reads all the pins every interval and appends
+        the readings to a SampleBus created on path. Other processes can
+        then get the samples with SampleBus.attach(path) instead of opening
+        the board themselves. Only one sampler can run at a time.
+
+        The pins are assumed to be configured as ANALOG_INPUT and one of the
+        INPUT modes respectively.
+
+        Args:
+            path: file to create the bus on, e.g. '/dev/shm/wiringx86'
+            analog_pins: Arduino analog pin numbers (14-19) to sample. Their
+                         readings have 10 bits resolution, as analogRead.
+            digital_pins: Arduino pin numbers (0-19) to sample
+            interval: sampling period in seconds
+            slots: number of samples kept in the ring
+
+        Returns:
+            The SampleBus the samples are published to, or None if the
+            sampler could not be started.
+
+        """
+        if self.sampler is not None:
+            print("A sampler is already running")
+            return None
+        analog_pins = tuple(analog_pins)
+        digital_pins = tuple(digital_pins)
+        if ((analog_pins and self.analogReadMany(analog_pins) is None) or
+                (digital_pins and self.digitalReadMany(digital_pins) is None)):
+            print("Sampled pins must be configured with pinMode first")
+            return None
+        try:
+            bus = SampleBus.create(path, analog_pins, digital_pins, slots)
+        except (IOError, OSError) as e:
+            print("Failed creating sample bus %s: %s" % (path, e))
+            return None
+        self.sampler = _Sampler(self, bus, interval)
+        self.sampler.start()
+        return bus
+
+    def stopSampler(self):
+        """Stop the sampler started with startSampler.
+
+        The shared memory file is left in place for readers still attached
+        to it.
+
+        """
+        if self.sampler is None:
+            return
+        self.sampler.stop()
+        self.sampler.bus.close()
+        self.sampler = None
+
+    def setPWMPeriod(self, pin, period):
+        """Set the PWM period
+
+        Check if the period is valid for the current system and proceed to
+        set the new period.
+
+        Args:
+            pin: Arduino PWM pin number (3, 5, 6, 9, 10, 11)
+            period: period in nanoseconds
+
+        """
+        if period < self.PWM_MIN_PERIOD or period > self.PWM_MAX_PERIOD:
+            return
+
+        self._set_pwm_period(pin, period)
+
+    def cleanup(self):
+        """Do a general cleanup.
+
+        Detach all interrupts.
+        Stop the analog capture, the sampler and the waveforms.
+        Close all open handlers for reading and writing.
+        Unexport all exported GPIO pins.
+        Unexport all exported PWM channels.
+
+        Calling this function is not mandatory but it's recommended once you
+        are done using the library if it's being used with a larger
+        application that runs for a long period of time.
+
+        """
+        for pin in list(self.interrupt_fds):
+            self.detachInterrupt(pin)
+        if self.dispatcher is not None:
+            self.dispatcher.stop()
+            self.dispatcher = None
+        if self.capture is not None:
+            self.capture.stop()
+        self.stopSampler()
+        self.stopWaveform()
+
+        if self.gpiochip is not None:
+            self._close_lines()
+        else:
+            for pin in self.pins_in_use:
+                self._unexport_pin(pin)
+        self.pins_in_use.clear()
+        self.gpio_users.clear()
+        self.pin_gpios.clear()
 
+        for fd in self.gpio_handlers.values():
+            self._close_fd(fd)
+        self.gpio_handlers.clear()
+        self.many_fds.clear()
+
+        for slot in self.pins.values():
+            self._invalidate_pin(slot)
+        self.pins.clear()
+        self._unmap_registers()
+
+        for fds in self.pwm_handlers.values():
+            for fd in fds:
+                self._close_fd(fd)
+        self.pwm_handlers.clear()
+
+        for pwm in self.exported_pwm:
+            self._unexport_pwm(pwm)
+        self.exported_pwm.clear()
+        self.pwm_state.clear()
+
+    def attachInterrupt(self, pin, callback, mode):
+        """Call a function when the level of a GPIO pin changes.
+
+        The GPIO pin is assumed to be configured as one of the INPUT modes.
+        Edges are detected by the kernel, so short pulses are not missed the
+        way they are when polling digitalRead. All pins share a single
+        background thread, from which the callbacks are run.
+
+        Args:
+            pin: Arduino pin number (0-19)
+            callback: function called as callback(pin, timestamp), where
+                      timestamp is the monotonic time in seconds at which the
+                      edge was seen
+            mode: edge that triggers the interrupt:
+                RISING:  from LOW to HIGH.
+                FALLING: from HIGH to LOW.
+                CHANGE:  any of them.
+
+        Returns:
+            True if the interrupt was attached, False otherwise.
+
+        """
+        if pin not in self.GPIO_MAPPING:
+            return False
+        if mode not in (RISING, FALLING, CHANGE):
+            return False
+
+        self.detachInterrupt(pin)
+        linux_pin = self.GPIO_MAPPING[pin]
+        if self.gpiochip is None and self._set_edge(linux_pin, mode) != 0:
+            return False
+
+        if self.dispatcher is None:
+            self.dispatcher = _InterruptDispatcher()
+            self.dispatcher.start()
+        if self.gpiochip is not None:
+            return self._attach_line_event(pin, linux_pin, callback, mode)
+
+        fd = None
+        try:
+            fd = self._open_edge_fd(linux_pin)
+            self.dispatcher.add(fd, pin, callback)
+        except (IOError, OSError) as e:
+            print('Failed watching pin %d for edges: %s' %
+                  (pin, os.strerror(e.errno)))
+            if fd is not None:
+                os.close(fd)
+            self._set_edge(linux_pin, 'none')
+            return False
+        self.interrupt_fds[pin] = fd
         return True
 
-    def digitalWrite(self, pin, state):
-        """Write a value to a GPIO pin.
+    def detachInterrupt(self, pin):
+        """Stop calling the function attached to a GPIO pin.
+
+        Args:
+            pin: Arduino pin number (0-19)
+
+        """
+        fd = self.interrupt_fds.pop(pin, None)
+        if fd is None:
+            return
+        self.dispatcher.remove(fd)
+        linux_pin = self.GPIO_MAPPING[pin]
+        if self.gpiochip is not None:
+            self._release_line_event(linux_pin, fd)
+            return
+        os.close(fd)
+        self._set_edge(linux_pin, 'none')
+
+    def releasePin(self, pin):
+        """Release the resources held by a GPIO pin.
 
-        The GPIO pin is assumed to be configured as OUTPUT
+        Close the handlers of the pin and unexport its PWM channel. The GPIOs
+        used for its muxing are unexported as well, unless other pins
+        configured with pinMode still use them.
 
         Args:
             pin: Arduino pin number (0-19)
-            state: pin state to be written (LOW-HIGH)
 
         """
         if pin not in self.GPIO_MAPPING:
             return
-        self._write_value_to_handler(self.GPIO_MAPPING[pin], state)
 
-    def digitalRead(self, pin):
-        """Read GPIO pin's state.
+        self.detachInterrupt(pin)
+        self._close_handler(self.GPIO_MAPPING[pin])
+        slot = self.pins.pop(pin, None)
+        if slot is not None:
+            self._invalidate_pin(slot)
 
-        The GPIO pin is assumed to be configured as INPUT
+        pwm = self.PWM_MAPPING.get(pin)
+        if pwm in self.exported_pwm:
+            for fd in self.pwm_handlers.pop(pwm, ()):
+                self._close_fd(fd)
+            self._unexport_pwm(pwm)
+            self.exported_pwm.discard(pwm)
+            self.pwm_state.pop(pwm, None)
 
-        Args:
-            pin: Arduino pin number (0-19)
+        unused = [linux_pin for linux_pin in self._claim_gpios(pin, set())
+                  if linux_pin in self.pins_in_use]
+        if self.gpiochip is not None:
+            # Release all the lines at once.
+            for linux_pin in unused:
+                self.gpio_state.pop(linux_pin, None)
+            self._configure_lines(unused)
+        else:
+            for linux_pin in unused:
+                self._unexport_pin(linux_pin)
+        self.pins_in_use.difference_update(unused)
+
+    def stats(self):
+        """Return a snapshot of the operation counters.
+
+        Every sysfs write is counted and timed: exports, directions, drives,
+        muxing, values and PWM settings, plus whole pinMode calls. Reads and
+        writes through the open value and ADC handlers are counted too, but
+        only timed while enableHandlerStats is on.
 
         Returns:
-            Current value of the GPIO pin as an Integer
+            Dictionary mapping operation names, such as 'export', 'mux',
+            'value_write', 'adc_read' or 'pwm_duty', to a dictionary with
+            the number of operations ('count'), how many failed ('errors'),
+            the total and maximum time spent, in seconds ('total', 'max'),
+            and a latency histogram ('histogram'). The histogram is a list
+            of (limit, count) tuples, limit being a power of two of
+            nanoseconds: count operations took less than limit and at least
+            half of it.
 
         """
-        if pin not in self.GPIO_MAPPING:
-            return
-        handler = self.gpio_handlers[self.GPIO_MAPPING[pin]]
-        state = handler.read()
-        handler.seek(0)
-        return int(state.strip())
+        snapshot = dict((op, stats.snapshot())
+                        for op, stats in self.op_stats.items())
+        for op, count in self.handler_counts.items():
+            if count:
+                snapshot.setdefault(op, _OpStats().snapshot())['count'] += \
+                    count
+        return snapshot
 
-    def analogWrite(self, pin, value):
-        """Write analog output (PWM)
+    def resetStats(self):
+        """Clear all the operation counters."""
+        self.op_stats.clear()
+        for op in _HANDLER_OPS:
+            self.handler_counts[op] = 0
 
-        The GPIO pin is assumed to be configured as PWM. Generates a PWM
-        signal with the desired duty cycle. The value must be in range 0-255.
+    def enableHandlerStats(self, enable=True):
+        """Time the operations on open handlers too.
+
+        Covers digitalWrite, digitalRead, analogRead, their Many variants
+        and the Pin objects. They are always counted, but not timed by
+        default to keep them as fast as possible.
 
         Args:
-            pin: Arduino PWM pin number (3, 5, 6, 9, 10, 11)
-            value: the duty cycle: between 0 (always off) and 255 (always on)
+            enable: True to start timing them, False to stop.
 
         """
-        if pin not in self.PWM_MAPPING:
-            return
-
-        if value < 0:
-            value = 0
-        elif value > 255:
-            value = 255
-
-        pwm = self.PWM_MAPPING[pin]
-        if not self.enabled_pwm.get(pwm, False):
-            self._enable_pwm(pwm)
-        self._set_pwm_duty_cycle(pwm, self._get_pwm_period(pin) * value / 255)
+        self.handler_stats = enable
+        self._update_instrumentation()
 
-    def analogRead(self, pin):
-        """Read analog input from the pin
+    def startTrace(self, size=65536):
+        """Start recording every low level operation into a ring buffer.
 
-        The GPIO pin is assumed to be configured as ANALOG_INPUT.
-        Returns values in range 0-1023
+        Records every sysfs write, and every read and write through the
+        open handlers, with its path, value, monotonic timestamp and
+        duration. Tracing slows down the handler operations, much like
+        enableHandlerStats does. Starting a new trace drops the previous
+        one.
 
         Args:
-            pin: Arduino analog pin number (14-19)
+            size: number of records kept. Older ones are overwritten.
 
         Returns:
-            Digital representation with 10 bits resolution (range 0-1023) of
-            voltage on the pin.
+            The TraceRecorder the operations are recorded into.
 
         """
-        if pin not in self.ADC_MAPPING:
-            return
-        handler = self.gpio_handlers[self.GPIO_MAPPING[pin]]
-        voltage = handler.read()
-        handler.seek(0)
-        # ADC chip on the board reports voltages with 12 bits resolution.
-        # To convert it to 10 bits just shift right 2 bits.
-        return int(voltage.strip()) >> 2
+        self.tracer = TraceRecorder(size, type(self).__name__)
+        self._trace_setup()
+        self._update_instrumentation()
+        return self.tracer
 
-    def setPWMPeriod(self, pin, period):
-        """Set the PWM period
+    def stopTrace(self):
+        """Stop recording operations.
 
-        Check if the period is valid for the current system and proceed to
-        set the new period.
+        Returns:
+            The TraceRecorder holding the trace, or None if no trace was
+            running.
+
+        """
+        tracer = self.tracer
+        self.tracer = None
+        self._update_instrumentation()
+        return tracer
+
+    def dumpTrace(self, path):
+        """Save the running trace to a file. It keeps recording.
 
         Args:
-            pin: Arduino PWM pin number (3, 5, 6, 9, 10, 11)
-            period: period in nanoseconds
+            path: file to write
 
-        """
-        if period < self.PWM_MIN_PERIOD or period > self.PWM_MAX_PERIOD:
-            return
+        Returns:
+            Number of records saved, or None if no trace is running.
 
-        self._set_pwm_period(pin, period)
+        """
+        if self.tracer is None:
+            return None
+        return self.tracer.dump(path)
 
-    def cleanup(self):
-        """Do a general cleanup.
+    def pwmState(self):
+        """Return the shadow state of the PWM pins, for debugging.
 
-        Close all open handlers for reading and writing.
-        Unexport all exported GPIO pins.
-        Unexport all exported PWM channels.
+        analogWrite and setPWMPeriod skip the writes that would not change
+        anything according to this state.
 
-        Calling this function is not mandatory but it's recommended once you
-        are done using the library if it's being used with a larger
-        application that runs for a long period of time.
+        Returns:
+            Dictionary mapping every Arduino PWM pin with an exported channel
+            to a dictionary with the last duty_cycle and period written, in
+            nanoseconds, whether the channel has been enabled and the last
+            value given to analogWrite. Values not written yet are missing.
 
         """
-        for pin in self.pins_in_use:
-            self._unexport_pin(pin)
-        del self.pins_in_use[:]
+        return dict((pin, dict(self.pwm_state[channel]))
+                    for pin, channel in self.PWM_MAPPING.items()
+                    if channel in self.pwm_state)
 
-        for handler in self.gpio_handlers.values():
-            handler.close()
-        self.gpio_handlers.clear()
+    def resync(self):
+        """Reload the shadow state of the GPIOs from sysfs.
 
-        for pwm in self.exported_pwm:
-            self._unexport_pwm(pwm)
-        del self.exported_pwm[:]
-        self.enabled_pwm.clear()
+        pinMode only writes the muxing settings that differ from what it
+        wrote last time. Call this function if something else, like another
+        process, may have changed the GPIOs used by this object since then.
+
+        """
+        for linux_pin in list(self.gpio_state):
+            path = '%s/gpio%d' % (self.gpio_path, linux_pin)
+            if self.gpiochip is not None:
+                # Nobody else can change the lines requested by us.
+                state = self.gpio_state[linux_pin]
+            elif not os.path.isdir(path):
+                # Unexported behind our back. Forget it, so that the next
+                # pinMode exports it again and reopens its value file.
+                del self.gpio_state[linux_pin]
+                self.pins_in_use.discard(linux_pin)
+                self._close_handler(linux_pin)
+                for slot in self.pins.values():
+                    if slot.linux_pin == linux_pin:
+                        self._invalidate_pin(slot)
+                continue
+            else:
+                state = {}
+                for attribute in ('direction', 'drive'):
+                    value = self._read_sysfs('%s/%s' % (path, attribute))
+                    if value is not None:
+                        state[attribute] = value
+                if state.get('direction') == OUTPUT:
+                    value = self._read_sysfs(path + '/value')
+                    if value is not None:
+                        state['value'] = LOW if value == '0' else HIGH
+            if self.has_pinmux():
+                value = self._read_sysfs('%s/gpio%d/current_pinmux' %
+                                         (self.gpio_debug_path, linux_pin))
+                if value is not None:
+                    state['muxmode'] = value
+            self.gpio_state[linux_pin] = state
 
     def _select_muxing(self, mode, pin):
         if mode == OUTPUT:
@@ -267,82 +2426,797 @@ class GPIOBase(object):
             return self.GPIO_MUX_PWM[pin]
         return None
 
+    def _mux_operations(self, pin, mode, mux):
+        """Return the list of sysfs operations needed to set a pin mode.
+
+        Each operation is a (linux_pin, attribute, value) tuple, where
+        attribute is one of 'export', 'direction', 'drive', 'value' or
+        'muxmode'.
+        """
+        linux_pin = self.GPIO_MAPPING[pin]
+        operations = [(linux_pin, 'export', None)]
+
+        # Walk through the muxing table and set the pins to their values. This
+        # is the actual muxing.
+        for vpin, value in mux:
+            operations.append((vpin, 'export', None))
+            if value == NONE:
+                operations.append((vpin, 'direction', value))
+                operations.append((vpin, 'drive', DRIVE_HIZ))
+            elif value in (HIGH, LOW):
+                operations.append((vpin, 'direction', value))
+                operations.append((vpin, 'drive', DRIVE_STRONG))
+                operations.append((vpin, 'value', value))
+            elif value in ALL_MODES:
+                operations.append((vpin, 'muxmode', value))
+
+        if mode == OUTPUT:
+            operations.append((linux_pin, 'direction', OUTPUT))
+            operations.append((linux_pin, 'drive', DRIVE_STRONG))
+            operations.append((linux_pin, 'value', LOW))
+        elif mode in (INPUT, INPUT_PULLUP, INPUT_PULLDOWN):
+            operations.append((linux_pin, 'direction', INPUT))
+
+        return operations
+
+    def _apply_operations(self, operations):
+        if self.gpiochip is not None:
+            return self._apply_line_operations(operations)
+        # Skip everything the shadow state says is already in place.
+        for linux_pin, attribute, value in operations:
+            state = self.gpio_state.get(linux_pin)
+            if state is not None:
+                if attribute == 'export':
+                    continue
+                if (attribute == 'direction' and value in (HIGH, LOW) and
+                        state.get('direction') == OUTPUT):
+                    # Already an output, so only the level may need changing.
+                    attribute = 'value'
+                # digitalWrite changes the value of pins with an open handler
+                # behind our back, so that value can't be trusted.
+                trusted = (attribute != 'value' or
+                           linux_pin not in self.gpio_handlers)
+                if trusted and state.get(attribute) == value:
+                    continue
+
+            if attribute == 'export':
+                self._export_pin(linux_pin)
+            elif attribute == 'direction':
+                self._set_direction(linux_pin, value)
+            elif attribute == 'drive':
+                self._set_drive(linux_pin, value)
+            elif attribute == 'value':
+                self._write_value(linux_pin, value)
+            elif attribute == 'muxmode':
+                self._muxmode(linux_pin, value)
+
+    def _claim_gpios(self, pin, linux_pins):
+        """Record the Linux GPIOs used by a pin's muxing.
+
+        Returns the GPIOs the pin no longer uses and nobody else does either.
+        """
+        unused = []
+        for linux_pin in self.pin_gpios.get(pin, set()) - linux_pins:
+            users = self.gpio_users.get(linux_pin, set())
+            users.discard(pin)
+            if not users:
+                self.gpio_users.pop(linux_pin, None)
+                unused.append(linux_pin)
+        for linux_pin in linux_pins:
+            self.gpio_users.setdefault(linux_pin, set()).add(pin)
+        if linux_pins:
+            self.pin_gpios[pin] = linux_pins
+        else:
+            self.pin_gpios.pop(pin, None)
+        return unused
+
+    def _many_fds(self, pins, analog=False):
+        key = (ANALOG_INPUT, pins) if analog else pins
+        fds = self.many_fds.get(key)
+        if fds is None:
+            if analog and any(pin not in self.ADC_MAPPING for pin in pins):
+                return None
+            try:
+                fds = [self.gpio_handlers[self.GPIO_MAPPING[pin]]
+                       for pin in pins]
+            except KeyError:
+                return None
+            # Callers varying the pin sets would grow it forever.
+            if len(self.many_fds) >= _MANY_FDS_CACHED:
+                self.many_fds.clear()
+            self.many_fds[key] = fds
+        return fds
+
+    def _update_pin(self, pin, mode):
+        # Keep the Pin object in sync with the handlers just opened. Users
+        # may hold references to it, so it is updated rather than replaced.
+        slot = self.pins.get(pin)
+        if slot is None:
+            slot = self.pins[pin] = Pin(self, pin)
+        slot.mode = mode
+        slot.fd = self.gpio_handlers.get(slot.linux_pin, -1)
+        slot.registers = None
+        slot.line = None
+        if mode in (OUTPUT, INPUT, INPUT_PULLUP, INPUT_PULLDOWN):
+            slot.registers = self._pin_registers(slot.linux_pin)
+            slot.line = self.line_handles.get(slot.linux_pin)
+        slot.__class__ = self._pin_class(slot)
+
+    def _pin_class(self, slot):
+        if slot.registers is not None:
+            return _RegisterPin
+        if slot.line is not None:
+            return _LinePin
+        return Pin
+
+    def _invalidate_pin(self, slot):
+        slot.fd = -1
+        slot.registers = None
+        slot.line = None
+        slot.__class__ = self._pin_class(slot)
+
+    def _map_registers(self, path):
+        if not self.GPIO_REGISTERS:
+            print("No memory mapped GPIO registers on this board")
+            return
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_SYNC)
+        except OSError as e:
+            print("Failed opening GPIO registers %s: %s" % (path, e))
+            return
+        try:
+            size = os.fstat(fd).st_size
+            needed = max(offset for entry in self.GPIO_REGISTERS.values()
+                         for offset in entry[:3] if offset is not None) + 4
+            if size < needed:
+                print("GPIO registers %s are too small" % path)
+                return
+            self.register_map = mmap.mmap(fd, size, mmap.MAP_SHARED,
+                                          mmap.PROT_READ | mmap.PROT_WRITE)
+        except (EnvironmentError, ValueError) as e:
+            print("Failed mapping GPIO registers %s: %s" % (path, e))
+        finally:
+            # The mapping stays valid once the file is closed.
+            os.close(fd)
+
+    def _unmap_registers(self):
+        if self.register_map is None:
+            return
+        # The c_uint32 objects must be gone before the mapping is closed.
+        self.register_words.clear()
+        self.register_map.close()
+        self.register_map = None
+
+    def _pin_registers(self, linux_pin):
+        entry = self.GPIO_REGISTERS.get(linux_pin)
+        if self.register_map is None or entry is None:
+            return None
+        level, output, clear, bit = entry
+        return (self._register(level), self._register(output),
+                None if clear is None else self._register(clear), 1 << bit)
+
+    def _register(self, offset):
+        word = self.register_words.get(offset)
+        if word is None:
+            # A c_uint32 makes every access a single aligned 32 bits load
+            # or store, as the controller expects.
+            word = ctypes.c_uint32.from_buffer(self.register_map, offset)
+            self.register_words[offset] = word
+        return word
+
+    def _apply_line_operations(self, operations):
+        # The character device version of _apply_operations. The shadow
+        # state is updated first and the lines are then requested, a chip
+        # and a direction at a time.
+        changed = []
+        for linux_pin, attribute, value in operations:
+            if attribute == 'export':
+                self.pins_in_use.add(linux_pin)
+                self.gpio_state.setdefault(linux_pin, {})
+            elif attribute == 'muxmode':
+                if self.gpio_state[linux_pin].get('muxmode') != value:
+                    self._muxmode(linux_pin, value)
+            else:
+                self._update_state(linux_pin, attribute, value)
+                changed.append(linux_pin)
+        self._configure_lines(changed)
+
+    def _line_output(self, linux_pin):
+        # True or False for the direction the line must be requested with,
+        # None if it must not be requested.
+        if linux_pin in self.line_events:
+            return None
+        direction = self.gpio_state.get(linux_pin, {}).get('direction')
+        if direction == OUTPUT:
+            return True
+        if direction == INPUT:
+            return False
+        return None
+
+    def _line_flags(self, linux_pin):
+        # Handle flags applying the drive of a line. Outputs are always
+        # push-pull, which is DRIVE_STRONG. Inputs with DRIVE_HIZ get their
+        # bias disabled, others keep whatever bias they have.
+        state = self.gpio_state.get(linux_pin, {})
+        if (self.line_bias and state.get('drive') == DRIVE_HIZ and
+                state.get('direction') == INPUT):
+            return _GPIOHANDLE_REQUEST_BIAS_DISABLE
+        return 0
+
+    def _configure_lines(self, linux_pins):
+        """Bring the line requests in line with the shadow state.
+
+        Lines staying in their handle just get their new value. Handles of
+        lines changing direction, or being released, are closed and all
+        their lines requested again, together with the new lines.
+        """
+        start = _monotonic()
+        dirty = set()
+        pending = set()
+        for linux_pin in linux_pins:
+            entry = self.line_handles.get(linux_pin)
+            output = self._line_output(linux_pin)
+            if entry is not None and entry[0].event:
+                continue
+            if (entry is not None and entry[0].output == output and
+                    entry[0].flags == self._line_flags(linux_pin)):
+                handle, index = entry
+                if output:
+                    handle.values.values[index] = \
+                        self.gpio_state[linux_pin].get('value') == HIGH
+                    dirty.add(handle)
+            elif entry is not None or output is not None:
+                pending.add(linux_pin)
+
+        # Lines of the closed handles keep their current values.
+        values = {}
+        for linux_pin in list(pending):
+            entry = self.line_handles.get(linux_pin)
+            if entry is None:
+                continue
+            handle = entry[0]
+            for index, line in enumerate(handle.lines):
+                values[line] = handle.values.values[index]
+                pending.add(line)
+                del self.line_handles[line]
+            self.gpiochip.close(handle.fd)
+            handle.fd = None
+            dirty.discard(handle)
+        for linux_pin in linux_pins:
+            values[linux_pin] = \
+                self.gpio_state.get(linux_pin, {}).get('value') == HIGH
+
+        requests = {}
+        for linux_pin in pending:
+            output = self._line_output(linux_pin)
+            location = self._line_location(linux_pin)
+            if output is None or location is None:
+                continue
+            chip, offset = location
+            key = (chip, output, self._line_flags(linux_pin))
+            requests.setdefault(key, []).append(
+                (offset, linux_pin, values.get(linux_pin, 0)))
+        for (chip, output, flags), lines in sorted(requests.items()):
+            lines.sort()
+            for first in range(0, len(lines), _GPIOHANDLES_MAX):
+                self._request_lines(chip, output, flags,
+                                    lines[first:first + _GPIOHANDLES_MAX])
+
+        for handle in dirty:
+            handle.set()
+        if dirty:
+            self._record('line_values', start)
+        self._refresh_line_pins(pending)
+
+    def _request_lines(self, chip, output, flags, lines):
+        start = _monotonic()
+        error = 0
+        try:
+            fd = self.gpiochip.request_lines(
+                self._chip_fd(chip), [line[0] for line in lines], output,
+                [int(line[2]) for line in lines], _GPIO_CONSUMER, flags)
+        except (IOError, OSError) as e:
+            if e.errno == errno.EINVAL and flags:
+                # Bias flags came with Linux 5.5. Older kernels get the
+                # lines without them, the pulls being left as they are.
+                if self.line_bias:
+                    print("GPIO bias not supported by the kernel, high "
+                          "impedance inputs keep their pull resistors")
+                    self.line_bias = False
+                return self._request_lines(chip, output, 0, lines)
+            print("Failed requesting GPIOs %s: %s" %
+                  (', '.join(str(line[1]) for line in lines),
+                   os.strerror(e.errno)))
+            error = e.errno
+        else:
+            handle = _LineHandle(self.gpiochip, fd,
+                                 tuple(line[1] for line in lines), output,
+                                 [line[2] for line in lines], flags=flags)
+            for index, line in enumerate(lines):
+                self.line_handles[line[1]] = (handle, index)
+        self._record('line_request', start, error)
+
+    def _refresh_line_pins(self, linux_pins):
+        # Pin objects of the lines that moved to another handle.
+        for slot in self.pins.values():
+            if slot.linux_pin in linux_pins and slot.mode in (
+                    OUTPUT, INPUT, INPUT_PULLUP, INPUT_PULLDOWN):
+                slot.line = self.line_handles.get(slot.linux_pin)
+                slot.__class__ = self._pin_class(slot)
+
+    def _line_location(self, linux_pin):
+        # (character device, offset) of a Linux GPIO number. Chip bases
+        # are only found in the gpiochipN entries of the sysfs GPIO class,
+        # whose device directory holds the matching character device.
+        if self.line_chips is None:
+            self.line_chips = []
+            names = os.listdir(self.gpio_path) if os.path.isdir(
+                self.gpio_path) else []
+            for name in sorted(names):
+                if not name.startswith('gpiochip'):
+                    continue
+                path = '%s/%s' % (self.gpio_path, name)
+                base = self._read_sysfs(path + '/base')
+                ngpio = self._read_sysfs(path + '/ngpio')
+                if base is None or ngpio is None:
+                    continue
+                for device in os.listdir(path + '/device'):
+                    if re.match(r'gpiochip\d+$', device):
+                        self.line_chips.append(
+                            (int(base), int(ngpio), '%s%s/%s' %
+                             (self.root, GPIO_DEVFS, device)))
+                        break
+        for base, ngpio, device in self.line_chips:
+            if base <= linux_pin < base + ngpio:
+                return device, linux_pin - base
+        print("No GPIO chip found for GPIO %d" % linux_pin)
+        return None
+
+    def _chip_fd(self, device):
+        fd = self.chip_fds.get(device)
+        if fd is None:
+            fd = self.chip_fds[device] = self.gpiochip.open(device)
+        return fd
+
+    def _close_lines(self):
+        handles = set(entry[0] for entry in self.line_handles.values())
+        for handle in handles:
+            self.gpiochip.close(handle.fd)
+            handle.fd = None
+        self.line_handles.clear()
+        self.line_events.clear()
+        for fd in self.chip_fds.values():
+            self.gpiochip.close(fd)
+        self.chip_fds.clear()
+        for linux_pin in self.pins_in_use:
+            self.gpio_state.pop(linux_pin, None)
+
+    def _write_lines(self, states):
+        # One set_values call per handle the pins are in.
+        handles = []
+        for pin, state in states.items():
+            slot = self.pins.get(pin)
+            if slot is None or slot.line is None:
+                return
+            handle, index = slot.line
+            handle.values.values[index] = state != LOW
+            if handle not in handles:
+                handles.append(handle)
+        for handle in handles:
+            handle.set()
+        self.handler_counts['value_write_many'] += 1
+
+    def _read_lines(self, pins):
+        # One get_values call per handle the pins are in.
+        levels = {}
+        states = []
+        for pin in pins:
+            slot = self.pins.get(pin)
+            if slot is None or slot.line is None:
+                return
+            handle, index = slot.line
+            if handle not in levels:
+                levels[handle] = handle.get()
+            states.append(levels[handle][index])
+        self.handler_counts['value_read_many'] += 1
+        return tuple(states)
+
+    def _attach_line_event(self, pin, linux_pin, callback, mode):
+        fd = None
+        try:
+            fd = self._request_line_event(linux_pin, mode)
+            self.dispatcher.add(fd, pin, callback, self.gpiochip.read_events)
+        except (IOError, OSError) as e:
+            print('Failed watching pin %d for edges: %s' %
+                  (pin, os.strerror(e.errno)))
+            if fd is not None:
+                self._release_line_event(linux_pin, fd)
+            return False
+        self.interrupt_fds[pin] = fd
+        return True
+
+    def _request_line_event(self, linux_pin, mode):
+        # A line can only be requested once, so it leaves its handle for
+        # the time it has an event request of its own. Returns the
+        # descriptor of the event request, raises OSError on failure.
+        location = self._line_location(linux_pin)
+        if location is None:
+            raise OSError(errno.ENODEV, os.strerror(errno.ENODEV))
+        self.line_events[linux_pin] = None
+        self._configure_lines([linux_pin])
+        try:
+            chip, offset = location
+            fd = self.gpiochip.request_event(self._chip_fd(chip), offset, mode,
+                                             _GPIO_CONSUMER)
+        except:
+            del self.line_events[linux_pin]
+            self._configure_lines([linux_pin])
+            raise
+        handle = _LineHandle(self.gpiochip, fd, (linux_pin, ), False, (0, ),
+                             event=True)
+        self.line_events[linux_pin] = handle
+        self.line_handles[linux_pin] = (handle, 0)
+        self._refresh_line_pins((linux_pin, ))
+        return fd
+
+    def _release_line_event(self, linux_pin, fd):
+        # Back into a handle like any other input.
+        self.line_events.pop(linux_pin)
+        del self.line_handles[linux_pin]
+        self.gpiochip.close(fd)
+        self._configure_lines([linux_pin])
+
+    def _open_fd(self, path, flags=os.O_RDWR):
+        fd = os.open(path, flags)
+        self.fd_paths[fd] = path
+        return fd
+
+    def _close_fd(self, fd):
+        del self.fd_paths[fd]
+        os.close(fd)
+
+    def _open_handler(self, linux_pin, path, flags=os.O_RDWR):
+        # Reuse the handler if it is already open on the same file. Close it
+        # if the pin switched between digital and analog.
+        fd = self.gpio_handlers.get(linux_pin)
+        if fd is not None:
+            if self.fd_paths[fd] == path:
+                return
+            self._close_handler(linux_pin)
+        self.gpio_handlers[linux_pin] = self._open_fd(path, flags)
+        self.many_fds.clear()
+
+    def _close_handler(self, linux_pin):
+        fd = self.gpio_handlers.pop(linux_pin, None)
+        if fd is not None:
+            self._close_fd(fd)
+            self.many_fds.clear()
+
     def _open_digital_handler(self, linux_pin):
         try:
-            f = open('/sys/class/gpio/gpio%d/value' % linux_pin, 'r+')
-            self.gpio_handlers[linux_pin] = f
+            path = '%s/gpio%d/value' % (self.gpio_path, linux_pin)
+            self._open_handler(linux_pin, path)
         except:
-            print "Failed opening digital value file for pin %d" % linux_pin
+            print("Failed opening digital value file for pin %d" % linux_pin)
 
     def _open_analog_handler(self, linux_pin, adc):
         try:
-            f = open('/sys/bus/iio/devices/iio:device%d/in_voltage%d_raw' % (self.adc_iio_device, adc), 'r+')
-            self.gpio_handlers[linux_pin] = f
+            path = '%s/iio:device%d/in_voltage%d_raw' % (self.iio_path,
+                                                         self.adc_iio_device,
+                                                         adc)
+            self._open_handler(linux_pin, path, os.O_RDONLY)
         except:
-            print "Failed opening analog value file for pin %d" % linux_pin
+            print("Failed opening analog value file for pin %d" % linux_pin)
+
+    def _open_pwm_handlers(self, channel):
+        # Keep duty_cycle and enable open so analogWrite is a single write.
+        try:
+            path = '%s/pwm%d' % (self.pwm_path, channel)
+            duty_cycle = self._open_fd(path + '/duty_cycle')
+            enable = self._open_fd(path + '/enable')
+            self.pwm_handlers[channel] = (duty_cycle, enable)
+        except:
+            print("Failed opening PWM files for channel %d" % channel)
 
     def _write_value(self, linux_pin, state):
         value = 1
         if state == LOW:
             value = 0
-        cmd = 'echo %d > /sys/class/gpio/gpio%d/value' % (value, linux_pin)
-        self._exec_cmd(self._write_value.__name__, cmd)
-
-    def _write_value_to_handler(self, linux_pin, state):
-        handler = self.gpio_handlers[linux_pin]
-        value = '0' if state == LOW else '1'
-        handler.write(value)
-        handler.seek(0)
+        path = '%s/gpio%d/value' % (self.gpio_path, linux_pin)
+        if self._write_sysfs(self._write_value.__name__, path, value) == 0:
+            self._update_state(linux_pin, 'value', state)
 
     def _set_direction(self, linux_pin, direction):
-        dirfile = '/sys/class/gpio/gpio%d/direction' % linux_pin
-        cmd = 'test -f %s && echo %s > %s 2>&1' % (dirfile, direction, dirfile)
-        self._exec_cmd(self._set_direction.__name__, cmd)
+        # Not every muxing GPIO has a direction attribute. Just skip those.
+        path = '%s/gpio%d/direction' % (self.gpio_path, linux_pin)
+        if self._write_sysfs(self._set_direction.__name__, path, direction,
+                             ignore=(errno.ENOENT, )) == 0:
+            self._update_state(linux_pin, 'direction', direction)
 
     def _export_pin(self, linux_pin):
-        self.pins_in_use.append(linux_pin)
-        cmd = 'echo %d > /sys/class/gpio/export 2>&1' % linux_pin
-        self._exec_cmd(self._export_pin.__name__, cmd)
+        if linux_pin in self.pins_in_use:
+            return
+        # Pins exported by someone else are just taken over.
+        if not os.path.isdir('%s/gpio%d' % (self.gpio_path, linux_pin)):
+            # EBUSY means the pin has already been exported.
+            error = self._write_sysfs(self._export_pin.__name__,
+                                      self.gpio_path + '/export', linux_pin,
+                                      ignore=(errno.EBUSY, ))
+            if error not in (0, errno.EBUSY):
+                # Left unregistered, so the next pinMode tries again.
+                return
+        self.pins_in_use.add(linux_pin)
+        self.gpio_state.setdefault(linux_pin, {})
 
     def _unexport_pin(self, linux_pin):
-        cmd = 'echo %d > /sys/class/gpio/unexport 2>&1' % linux_pin
-        self._exec_cmd(self._unexport_pin.__name__, cmd)
+        self.gpio_state.pop(linux_pin, None)
+        self._write_sysfs(self._unexport_pin.__name__,
+                          self.gpio_path + '/unexport', linux_pin,
+                          ignore=(errno.EINVAL, ))
 
     def _muxmode(self, linux_pin, mode):
-        cmd = 'echo %s > /sys/kernel/debug/gpio_debug/gpio%d/current_pinmux' % (mode, linux_pin)
-        self._exec_cmd(self._muxmode.__name__, cmd)
+        path = '%s/gpio%d/current_pinmux' % (self.gpio_debug_path, linux_pin)
+        if self._write_sysfs(self._muxmode.__name__, path, mode) == 0:
+            self._update_state(linux_pin, 'muxmode', mode)
 
     def _set_drive(self, linux_pin, drive):
         if not self.has_pinmux():
-            cmd = 'echo %s > /sys/class/gpio/gpio%d/drive > /dev/null' % (drive, linux_pin)
-            self._exec_cmd(self._set_drive.__name__, cmd)
+            path = '%s/gpio%d/drive' % (self.gpio_path, linux_pin)
+            if self._write_sysfs(self._set_drive.__name__, path, drive) == 0:
+                self._update_state(linux_pin, 'drive', drive)
+
+    def _update_state(self, linux_pin, attribute, value):
+        state = self.gpio_state.setdefault(linux_pin, {})
+        if attribute == 'direction':
+            if value in (HIGH, LOW):
+                # high and low set the direction and the value in one go.
+                state['direction'] = OUTPUT
+                state['value'] = value
+                return
+            # Any other direction leaves the value undefined.
+            state.pop('value', None)
+        state[attribute] = value
+
+    def _set_edge(self, linux_pin, edge):
+        path = '%s/gpio%d/edge' % (self.gpio_path, linux_pin)
+        return self._write_sysfs(self._set_edge.__name__, path, edge)
+
+    def _open_edge_fd(self, linux_pin):
+        # Edges are waited for on a descriptor of its own. Without pread,
+        # acknowledging them moves the file offset, which would race with the
+        # value handler.
+        path = '%s/gpio%d/value' % (self.gpio_path, linux_pin)
+        return os.open(path, os.O_RDONLY)
 
     def _export_pwm(self, channel):
-        self.exported_pwm.append(channel)
-        cmd = 'echo %d > /sys/class/pwm/pwmchip0/export 2>&1' % channel
-        self._exec_cmd(self._export_pwm.__name__, cmd)
+        if channel in self.exported_pwm:
+            return
+        self.exported_pwm.add(channel)
+        # Nothing is known about channels exported by someone else.
+        self.pwm_state[channel] = {}
+        if not os.path.isdir('%s/pwm%d' % (self.pwm_path, channel)):
+            self._write_sysfs(self._export_pwm.__name__,
+                              self.pwm_path + '/export', channel,
+                              ignore=(errno.EBUSY, ))
+        self._open_pwm_handlers(channel)
 
     def _unexport_pwm(self, channel):
-        cmd = 'echo %d > /sys/class/pwm/pwmchip0/unexport 2>&1' % channel
-        self._exec_cmd(self._unexport_pwm.__name__, cmd)
+        self._write_sysfs(self._unexport_pwm.__name__,
+                          self.pwm_path + '/unexport', channel,
+                          ignore=(errno.EINVAL, ))
+
+    def _analog_write(self, pin, pwm, value):
+        if value < 0:
+            value = 0
+        elif value > 255:
+            value = 255
+
+        state = self.pwm_state.setdefault(pwm, {})
+        # Remembered to keep the duty cycle if the period changes.
+        state['value'] = value
+        if not state.get('enable'):
+            self._enable_pwm(pwm)
+        duty_cycle = self._get_pwm_period(pin) * value // 255
+        if state.get('duty_cycle') != duty_cycle:
+            self._set_pwm_duty_cycle(pwm, duty_cycle)
+
+    def _clear_pwm_duty_cycle(self, pwm):
+        self._update_pwm_state(pwm, 'value', 0)
+        self._set_pwm_duty_cycle(pwm, 0)
 
     def _set_pwm_duty_cycle(self, channel, duty_cycle):
-        cmd = 'echo %d > /sys/class/pwm/pwmchip0/pwm%d/duty_cycle' % (duty_cycle, channel)
-        self._exec_cmd(self._set_pwm_duty_cycle.__name__, cmd)
+        if channel in self.pwm_handlers:
+            fd = self.pwm_handlers[channel][0]
+            error = self._write_handler(self._set_pwm_duty_cycle.__name__, fd,
+                                        '%d' % duty_cycle)
+        else:
+            path = '%s/pwm%d/duty_cycle' % (self.pwm_path, channel)
+            error = self._write_sysfs(self._set_pwm_duty_cycle.__name__, path,
+                                      '%d' % duty_cycle)
+        if error == 0:
+            self._update_pwm_state(channel, 'duty_cycle', duty_cycle)
 
     def _enable_pwm(self, pwm):
-        self.enabled_pwm[pwm] = True
-        cmd = 'echo 1 > /sys/class/pwm/pwmchip0/pwm%d/enable' % pwm
-        self._exec_cmd(self._enable_pwm.__name__, cmd)
+        if pwm in self.pwm_handlers:
+            fd = self.pwm_handlers[pwm][1]
+            error = self._write_handler(self._enable_pwm.__name__, fd, '1')
+        else:
+            path = '%s/pwm%d/enable' % (self.pwm_path, pwm)
+            error = self._write_sysfs(self._enable_pwm.__name__, path, 1)
+        if error == 0:
+            self._update_pwm_state(pwm, 'enable', True)
+
+    def _set_channel_period(self, pin, period):
+        # For boards with a period per channel. Returns the error of the
+        # write, or 0 if the period is set already.
+        channel = self.PWM_MAPPING[pin]
+        current = self.pwm_state.get(channel, {}).get('period')
+        if current == period:
+            return 0
+        error = self._change_pwm_period([channel], current, period,
+                                        self._pwm_period_path(channel))
+        if error == 0:
+            self._update_pwm_state(channel, 'period', period)
+        return error
+
+    def _pwm_period_path(self, channel):
+        return '%s/pwm%d/period' % (self.pwm_path, channel)
+
+    def _change_pwm_period(self, channels, current, period, path):
+        """Write a new PWM period keeping the duty cycles of the channels.
+
+        The duty cycles are in nanoseconds, so they are rescaled to keep the
+        0-255 values last given to analogWrite, and written right before or
+        after the period in one go. A duty cycle longer than the period is
+        invalid, so a shorter period goes after the duty cycles and a longer
+        one before.
+        """
+        duty_cycles = []
+        for channel in channels:
+            state = self.pwm_state.get(channel, {})
+            if 'value' in state:
+                duty_cycle = period * state['value'] // 255
+                if duty_cycle != state.get('duty_cycle'):
+                    duty_cycles.append((channel, duty_cycle))
+
+        shorter = current is not None and period < current
+        if shorter:
+            for channel, duty_cycle in duty_cycles:
+                self._set_pwm_duty_cycle(channel, duty_cycle)
+        error = self._write_sysfs(self._set_pwm_period.__name__, path,
+                                  '%d' % period)
+        if error == 0 and not shorter:
+            for channel, duty_cycle in duty_cycles:
+                self._set_pwm_duty_cycle(channel, duty_cycle)
+        return error
+
+    def _update_pwm_state(self, channel, attribute, value):
+        self.pwm_state.setdefault(channel, {})[attribute] = value
 
     def __debug(self, func_name, cmd):
         if self.debug:
             now = datetime.datetime.now().strftime("%B %d %I:%M:%S")
-            print '{0} {1: <20}{2}'.format(now, func_name + ':', cmd)
+            print('{0} {1: <20}{2}'.format(now, func_name + ':', cmd))
+
+    def _trace_setup(self):
+        # Add the configuration known from the shadow state to the setup of
+        # the trace, so that replays start from it.
+        add = self.tracer.add_setup
+        for linux_pin in sorted(self.pins_in_use):
+            add(GPIO_SYSFS + '/export', linux_pin)
+        for linux_pin, state in sorted(self.gpio_state.items()):
+            if 'muxmode' in state:
+                add('%s/gpio%d/current_pinmux' % (GPIO_DEBUGFS, linux_pin),
+                    state['muxmode'])
+            path = '%s/gpio%d/' % (GPIO_SYSFS, linux_pin)
+            for attribute in ('drive', 'direction'):
+                if attribute in state:
+                    add(path + attribute, state[attribute])
+            if 'value' in state:
+                add(path + 'value', 0 if state['value'] == LOW else 1)
+        root = len(self.root)
+        for channel in sorted(self.exported_pwm):
+            add(PWM_SYSFS + '/export', channel)
+            state = self.pwm_state.get(channel, {})
+            if 'period' in state:
+                add(self._pwm_period_path(channel)[root:], state['period'])
+            if 'duty_cycle' in state:
+                add('%s/pwm%d/duty_cycle' % (PWM_SYSFS, channel),
+                    state['duty_cycle'])
+            if state.get('enable'):
+                add('%s/pwm%d/enable' % (PWM_SYSFS, channel), 1)
+
+    def _update_instrumentation(self):
+        self.instrumented = self.handler_stats or self.tracer is not None
+
+    def _handler_io(self, op, fds, values, start):
+        # Account for reads or writes through open handlers. Operations
+        # done in a batch share its timestamp and duration in the trace.
+        if self.handler_stats:
+            self._record(op, start)
+        else:
+            self.handler_counts[op] += 1
+        if self.tracer is not None:
+            end = _monotonic()
+            operation = _TRACE_READ if 'read' in op else _TRACE_PWRITE
+            root = len(self.root)
+            for fd, value in zip(fds, values):
+                self.tracer.add(operation, self.fd_paths[fd][root:],
+                                value, start, end)
+
+    def _record(self, op, start, error=0):
+        stats = self.op_stats.get(op)
+        if stats is None:
+            stats = self.op_stats[op] = _OpStats()
+        stats.add(_monotonic() - start, error)
+
+    def _write_sysfs(self, caller, path, value, ignore=()):
+        """Write a value into a sysfs attribute.
+
+        The attribute is opened, written and closed straight from Python
+        rather than forking a shell for it.
+
+        Args:
+            caller: name of the calling function, shown in debug mode
+            path: absolute path of the sysfs attribute
+            value: value to be written. It is converted to a string.
+            ignore: errno values that are expected and must not be reported
+
+        Returns:
+            0 on success or the errno of the failed operation.
+
+        """
+        value = str(value)
+        self.__debug(caller, 'echo %s > %s' % (value, path))
+        start = _monotonic()
+        error = 0
+        try:
+            fd = os.open(path, os.O_WRONLY)
+            try:
+                os.write(fd, (value + '\n').encode('ascii'))
+            finally:
+                os.close(fd)
+            if self.simulator is not None:
+                self.simulator.notify(path[len(self.root):], value)
+        except (IOError, OSError) as e:
+            if e.errno not in ignore:
+                print('Failed writing %s to %s: %s' % (value, path,
+                                                     os.strerror(e.errno)))
+            error = e.errno
+        self._record(_STATS_OPS.get(caller, caller), start, error)
+        if self.tracer is not None:
+            self.tracer.add(_TRACE_WRITE, path[len(self.root):], value, start,
+                            _monotonic(), error)
+        return error
+
+    def _read_sysfs(self, path):
+        """Return the stripped contents of a sysfs attribute or None."""
+        try:
+            with open(path) as f:
+                return f.readline().strip()
+        except (IOError, OSError):
+            return None
 
-    def _exec_cmd(self, caller, command):
-        self.__debug(caller, command)
-        os.system(command)
+    def _write_handler(self, caller, fd, value):
+        """Write a value through an already open sysfs attribute."""
+        if self.debug:
+            self.__debug(caller, 'echo %s > %s' % (value, self.fd_paths[fd]))
+        start = _monotonic()
+        error = 0
+        try:
+            _pwrite(fd, (value + '\n').encode('ascii'))
+        except (IOError, OSError) as e:
+            print('Failed writing %s to %s: %s' % (value, self.fd_paths[fd],
+                                                 os.strerror(e.errno)))
+            error = e.errno
+        # Only PWM settings go through here. They are timed like the sysfs
+        # writes, as reading the clock costs little next to the write, even
+        # for fades changing the duty cycle at every step.
+        self._record(_STATS_OPS.get(caller, caller), start, error)
+        if self.tracer is not None:
+            self.tracer.add(_TRACE_PWRITE, self.fd_paths[fd][len(self.root):],
+                            value, start, _monotonic(), error)
+        return error
 
 
 setattr(GPIOBase, 'INPUT', INPUT)
@@ -353,6 +3227,9 @@ setattr(GPIOBase, 'ANALOG_INPUT', ANALOG_INPUT)
 setattr(GPIOBase, 'PWM', PWM)
 setattr(GPIOBase, 'LOW', LOW)
 setattr(GPIOBase, 'HIGH', HIGH)
+setattr(GPIOBase, 'RISING', RISING)
+setattr(GPIOBase, 'FALLING', FALLING)
+setattr(GPIOBase, 'CHANGE', CHANGE)
 
 
 class GPIOGalileo(GPIOBase):
@@ -385,6 +3262,11 @@ class GPIOGalileo(GPIOBase):
         19: 49,
     }
 
+    # None of the Arduino pins is wired to a memory mapped GPIO controller:
+    # they go through the I2C GPIO expander or the legacy I/O port GPIOs.
+    GPIO_REGISTERS_PATH = None
+    GPIO_REGISTERS = {}
+
     ADC_MAPPING = {
         14: 0,
         15: 1,
@@ -452,33 +3334,31 @@ class GPIOGalileo(GPIOBase):
     PWM_MAX_PERIOD = 7999999
     PWM_DEFAULT_PERIOD = 5000000
 
+    adc_iio_device = 0
+
     def __init__(self, **kwargs):
-        self.adc_iio_device = 0
         super(GPIOGalileo, self).__init__(**kwargs)
         self.pwm_periods = {}
         for pwm in self.PWM_MAPPING.keys():
             self.pwm_periods[pwm] = self.PWM_DEFAULT_PERIOD
 
     def _set_pwm_period(self, pin, period):
-        channel = self.PWM_MAPPING[pin]
-        self.pwm_periods[pin] = period
-        cmd = 'echo %d > /sys/class/pwm/pwmchip0/pwm%d/period' % (period, channel)
-        self._exec_cmd(self._set_pwm_period.__name__, cmd)
+        if self._set_channel_period(pin, period) == 0:
+            self.pwm_periods[pin] = period
 
     def _get_pwm_period(self, pin):
         return self.pwm_periods[pin]
 
     def _init_pwm(self, pin):
         linux_pin = self.GPIO_MAPPING[pin]
-        self._set_drive(linux_pin, DRIVE_STRONG)
-        self._set_direction(linux_pin, OUTPUT)
-        self._write_value(linux_pin, HIGH)
+        self._apply_operations([(linux_pin, 'drive', DRIVE_STRONG),
+                                (linux_pin, 'direction', OUTPUT),
+                                (linux_pin, 'value', HIGH)])
 
         pwm = self.PWM_MAPPING[pin]
         self._export_pwm(pwm)
-        self.enabled_pwm[pwm] = False
         self._set_pwm_period(pin, self.pwm_periods[pin])
-        self._set_pwm_duty_cycle(pwm, 0)
+        self._clear_pwm_duty_cycle(pwm)
 
 
 class GPIOGalileoGen2(GPIOBase):
@@ -511,6 +3391,19 @@ class GPIOGalileoGen2(GPIOBase):
         19: 58,
     }
 
+    # Quark X1000 GPIO controller, linux GPIOs 0-7. Linux GPIO ->
+    # (level register, output register, clear register, bit). There is no
+    # clear register: the data register is read, modified and written back.
+    GPIO_REGISTERS_PATH = '/sys/devices/pci0000:00/0000:00:15.2/resource1'
+    GPIO_REGISTERS = {
+        0: (0x50, 0x00, None, 0),
+        1: (0x50, 0x00, None, 1),
+        4: (0x50, 0x00, None, 4),
+        5: (0x50, 0x00, None, 5),
+        6: (0x50, 0x00, None, 6),
+        7: (0x50, 0x00, None, 7),
+    }
+
     ADC_MAPPING = {
         14: 0,
         15: 1,
@@ -643,8 +3536,9 @@ class GPIOGalileoGen2(GPIOBase):
     PWM_MAX_PERIOD = 41666666
     PWM_DEFAULT_PERIOD = 5000000
 
+    adc_iio_device = 0
+
     def __init__(self, **kwargs):
-        self.adc_iio_device = 0
         super(GPIOGalileoGen2, self).__init__(**kwargs)
         self.pwm_period = self.PWM_DEFAULT_PERIOD
         self.is_pwm_period_set = False
@@ -652,23 +3546,34 @@ class GPIOGalileoGen2(GPIOBase):
     def _set_pwm_period(self, pin, period):
         """On GalileoGen2 all PWM channels share the same period. When this is
         set all the PWM outputs are disabled for at least 1ms while the chip
-        reconfigures itself. The PWM pin is then ignored.
+        reconfigures itself, so it is only written if it changes. The PWM pin
+        is then ignored.
         """
-        self.pwm_period = period
-        cmd = 'echo %d > /sys/class/pwm/pwmchip0/device/pwm_period' % period
-        self._exec_cmd(self._set_pwm_period.__name__, cmd)
+        current = self.pwm_period if self.is_pwm_period_set else None
+        if period == current:
+            return
+        if self._change_pwm_period(self.exported_pwm, current, period,
+                                   self._pwm_period_path(None)) == 0:
+            self.pwm_period = period
+            self.is_pwm_period_set = True
+            for channel in self.exported_pwm:
+                self._update_pwm_state(channel, 'period', period)
 
     def _get_pwm_period(self, pin):
         return self.pwm_period
 
+    def _pwm_period_path(self, channel):
+        # A single period for all the channels.
+        return self.pwm_path + '/device/pwm_period'
+
     def _init_pwm(self, pin):
         pwm = self.PWM_MAPPING[pin]
         self._export_pwm(pwm)
-        self._set_pwm_duty_cycle(pwm, 0)
-        self.enabled_pwm[pwm] = False
-        if not self.is_pwm_period_set:
+        self._clear_pwm_duty_cycle(pwm)
+        if self.is_pwm_period_set:
+            self._update_pwm_state(pwm, 'period', self.pwm_period)
+        else:
             self._set_pwm_period(pin, self.pwm_period)
-            self.is_pwm_period_set = True
 
 
 class GPIOEdison(GPIOBase):
@@ -701,6 +3606,32 @@ class GPIOEdison(GPIOBase):
        19: 165,                                                                 
     } 
 
+    # Merrifield GPIO controller. Linux GPIO -> (GPLR, GPSR, GPCR, bit):
+    # level, set and clear registers of the bank of 32 GPIOs it is in.
+    GPIO_REGISTERS_PATH = '/sys/devices/pci0000:00/0000:00:0c.0/resource0'
+    GPIO_REGISTERS = {
+        12: (0x04, 0x34, 0x4c, 12),
+        13: (0x04, 0x34, 0x4c, 13),
+        14: (0x04, 0x34, 0x4c, 14),
+        40: (0x08, 0x38, 0x50, 8),
+        41: (0x08, 0x38, 0x50, 9),
+        42: (0x08, 0x38, 0x50, 10),
+        43: (0x08, 0x38, 0x50, 11),
+        44: (0x08, 0x38, 0x50, 12),
+        45: (0x08, 0x38, 0x50, 13),
+        46: (0x08, 0x38, 0x50, 14),
+        47: (0x08, 0x38, 0x50, 15),
+        48: (0x08, 0x38, 0x50, 16),
+        49: (0x08, 0x38, 0x50, 17),
+        128: (0x14, 0x44, 0x5c, 0),
+        129: (0x14, 0x44, 0x5c, 1),
+        130: (0x14, 0x44, 0x5c, 2),
+        131: (0x14, 0x44, 0x5c, 3),
+        165: (0x18, 0x48, 0x60, 5),
+        182: (0x18, 0x48, 0x60, 22),
+        183: (0x18, 0x48, 0x60, 23),
+    }
+
     ADC_MAPPING = {
         14: 0,
         15: 1,
@@ -834,22 +3765,32 @@ class GPIOEdison(GPIOBase):
     PWM_MAX_PERIOD = 218453000
     PWM_DEFAULT_PERIOD = 2048000
 
-    def __init__(self, **kwargs):
-        self.pinmux = 214
-        self.adc_iio_device = 1
+    pinmux = 214
+    adc_iio_device = 1
+
+    def __init__(self, safe_state=True, **kwargs):
+        """Constructor
+
+        Args:
+            safe_state: set all pins as inputs at startup. The muxing of the
+                        20 pins is applied as a single batch. Pass False to
+                        skip it when the board is known to be in a safe
+                        state already.
+
+        See GPIOBase for the rest of the arguments.
+
+        """
         super(GPIOEdison, self).__init__(**kwargs)
         self.pwm_periods = {}
         for pin in self.PWM_MAPPING.keys():
             self.pwm_periods[pin] = self.PWM_DEFAULT_PERIOD
         # Set all pins into a safe state at startup.
-        for i in range(0, 20):
-            self.pinMode(i, INPUT)
+        if safe_state:
+            self.pinModes(dict((i, INPUT) for i in range(0, 20)))
 
     def _set_pwm_period(self, pin, period):
-        self.pwm_periods[pin] = period
-        channel = self.PWM_MAPPING[pin]
-        cmd = 'echo %d > /sys/class/pwm/pwmchip0/pwm%d/period' % (period, channel)
-        self._exec_cmd(self._set_pwm_period.__name__, cmd)
+        if self._set_channel_period(pin, period) == 0:
+            self.pwm_periods[pin] = period
 
     def _get_pwm_period(self, pin):
         return self.pwm_periods[pin]
@@ -858,5 +3799,305 @@ class GPIOEdison(GPIOBase):
         pwm = self.PWM_MAPPING[pin]
         self._export_pwm(pwm)
         self._set_pwm_period(pin, self.pwm_periods[pin])
-        self._set_pwm_duty_cycle(pwm, 0)
+        self._clear_pwm_duty_cycle(pwm)
         self._enable_pwm(pwm)
+
+
+class SysfsSimulator(object):
+
+    """Simulated sysfs tree for running the library without a board.
+
+    A temporary directory is filled with the sysfs and debugfs files a board
+    class expects to find. Writes to the export and unexport files create and
+    remove GPIO and PWM directories the way the kernel does, so a board
+    created with simulator=SysfsSimulator(BoardClass) behaves like the real
+    thing from the library's point of view.
+    """
+
+    def __init__(self, board, root=None, scan_type='be:u12/16>>0'):
+        """Constructor
+
+        Args:
+            board: board class to simulate (GPIOGalileo, GPIOGalileoGen2 or
+                   GPIOEdison)
+            root: directory to build the tree in. A temporary directory is
+                  created when omitted.
+            scan_type: IIO scan element format of the ADC channels
+
+        """
+        self.board = board
+        self.scan_type = scan_type
+        self.root = root or tempfile.mkdtemp(prefix='wiringx86-')
+        self.gpio_path = self.root + GPIO_SYSFS
+        self.pwm_path = self.root + PWM_SYSFS
+        self.iio_path = '%s%s/iio:device%d' % (self.root, IIO_SYSFS,
+                                              board.adc_iio_device)
+        self.iio_device = '%s%s/iio:device%d' % (self.root, IIO_DEVFS,
+                                                board.adc_iio_device)
+        self.gpio_debug_path = self.root + GPIO_DEBUGFS
+
+        self.gpios = set(board.GPIO_MAPPING.values())
+        for table in (board.GPIO_MUX_OUTPUT, board.GPIO_MUX_INPUT,
+                      board.GPIO_MUX_INPUT_PULLUP,
+                      board.GPIO_MUX_INPUT_PULLDOWN,
+                      board.GPIO_MUX_ANALOG_INPUT, board.GPIO_MUX_PWM):
+            for mux in table.values():
+                self.gpios.update(vpin for vpin, value in mux)
+        if hasattr(board, 'pinmux'):
+            self.gpios.add(board.pinmux)
+        self.pwms = set(pwm for pwm in board.PWM_MAPPING.values()
+                        if pwm is not None)
+
+        self._write(self.gpio_path + '/export', '')
+        self._write(self.gpio_path + '/unexport', '')
+        self._write(self.pwm_path + '/export', '')
+        self._write(self.pwm_path + '/unexport', '')
+        self._write(self.pwm_path + '/npwm', len(self.pwms))
+        self._write(self.pwm_path + '/device/pwm_period',
+                    board.PWM_DEFAULT_PERIOD)
+        for adc in board.ADC_MAPPING.values():
+            self._write('%s/in_voltage%d_raw' % (self.iio_path, adc), 0)
+            scan = '%s/scan_elements/in_voltage%d' % (self.iio_path, adc)
+            self._write(scan + '_en', 0)
+            self._write(scan + '_index', adc)
+            self._write(scan + '_type', scan_type)
+        self._write(self.iio_path + '/scan_elements/in_timestamp_en', 0)
+        self._write(self.iio_path + '/trigger/current_trigger', '')
+        self._write(self.iio_path + '/buffer/length', 2)
+        self._write(self.iio_path + '/buffer/enable', 0)
+        os.makedirs(os.path.dirname(self.iio_device))
+        # A GPIO chip of 32 lines for every block of GPIOs in use, with its
+        # sysfs class entry and its character device. Boards created with
+        # gpiochip=True drive them through the simulated calls in gpiochip.
+        self.chip_bases = {}
+        bases = sorted(set(gpio // 32 * 32 for gpio in self.gpios))
+        for index, base in enumerate(bases):
+            name = 'gpiochip%d' % index
+            chip = '%s/gpiochip%d' % (self.gpio_path, base)
+            self._write(chip + '/base', base)
+            self._write(chip + '/ngpio', 32)
+            os.makedirs('%s/device/%s' % (chip, name))
+            self._write('%s%s/%s' % (self.root, GPIO_DEVFS, name), '')
+            self.chip_bases[name] = base
+        self.gpiochip = _SimulatedGPIOChipIO(self)
+        if hasattr(board, 'pinmux'):
+            for gpio in self.gpios:
+                self._write('%s/gpio%d/current_pinmux' %
+                            (self.gpio_debug_path, gpio), MODE_0)
+
+    def notify(self, path, value):
+        """Apply the side effects of a sysfs write.
+
+        Called by the board after every successful write. Raises OSError with
+        the errno the kernel would return for an invalid write.
+
+        Args:
+            path: path of the written attribute, relative to the root
+            value: value that was written as a string
+
+        """
+        if path == GPIO_SYSFS + '/export':
+            self._export_gpio(int(value))
+        elif path == GPIO_SYSFS + '/unexport':
+            self._unexport(self._gpio_dir(int(value)))
+        elif path == PWM_SYSFS + '/export':
+            self._export_pwm(int(value))
+        elif path == PWM_SYSFS + '/unexport':
+            self._unexport('%s/pwm%d' % (self.pwm_path, int(value)))
+        elif path.startswith(IIO_SYSFS) and path.endswith('/buffer/enable'):
+            # Enabling the buffer starts with an empty character device.
+            if int(value):
+                open(self.iio_device, 'wb').close()
+        elif path.startswith(GPIO_SYSFS) and path.endswith('/direction'):
+            # Writing high or low sets the direction and the value at once.
+            if value in (HIGH, LOW):
+                gpio_dir = os.path.dirname(self.root + path)
+                self._write(gpio_dir + '/direction', OUTPUT)
+                self._write(gpio_dir + '/value', int(value == HIGH))
+
+    def exported(self):
+        """Return the set of currently exported Linux GPIO numbers."""
+        gpios = set()
+        for name in os.listdir(self.gpio_path):
+            if name.startswith('gpio') and name[4:].isdigit():
+                gpios.add(int(name[4:]))
+        return gpios
+
+    def set_digital(self, pin, value):
+        """Drive the value read back from an Arduino pin configured as input.
+        """
+        gpio = self.board.GPIO_MAPPING[pin]
+        if gpio in self.gpiochip.requested:
+            self.gpiochip.set_level(gpio, int(value))
+            return
+        path = self._gpio_dir(gpio) + '/value'
+        self._write(path, int(value))
+
+    def get_digital(self, pin):
+        """Return the value last written to an Arduino pin."""
+        gpio = self.board.GPIO_MAPPING[pin]
+        if gpio in self.gpiochip.requested:
+            return self.gpiochip.levels.get(gpio, 0)
+        path = self._gpio_dir(gpio) + '/value'
+        return int(self._read(path))
+
+    def set_analog(self, pin, raw):
+        """Set the raw 12 bits ADC reading of an Arduino analog pin."""
+        adc = self.board.ADC_MAPPING[pin]
+        self._write('%s/in_voltage%d_raw' % (self.iio_path, adc), raw)
+
+    def feed_capture(self, scans):
+        """Queue ADC scans to be read by a running analog capture.
+
+        Args:
+            scans: sequence of scans. Each one is a sequence with the raw
+                   12 bits reading of every enabled ADC channel, in channel
+                   order.
+
+        """
+        endianness, sign, bits, storage, shift = \
+            _SCAN_TYPE.match(self.scan_type).groups()
+        layout = ('>' if endianness == 'be' else '<') + 'H'
+        data = b''.join(struct.pack(layout, raw << int(shift))
+                        for scan in scans for raw in scan)
+        with open(self.iio_device, 'ab') as f:
+            f.write(data)
+
+    def read(self, path):
+        """Return the contents of a simulated file, relative to the root."""
+        return self._read(self.root + path)
+
+    def destroy(self):
+        """Remove the simulated tree from disk."""
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _gpio_dir(self, gpio):
+        return '%s/gpio%d' % (self.gpio_path, gpio)
+
+    def _export_gpio(self, gpio):
+        if gpio not in self.gpios:
+            raise OSError(errno.EINVAL, os.strerror(errno.EINVAL))
+        gpio_dir = self._gpio_dir(gpio)
+        if os.path.isdir(gpio_dir):
+            raise OSError(errno.EBUSY, os.strerror(errno.EBUSY))
+        self._write(gpio_dir + '/value', 0)
+        self._write(gpio_dir + '/direction', INPUT)
+        self._write(gpio_dir + '/edge', 'none')
+        if not hasattr(self.board, 'pinmux'):
+            self._write(gpio_dir + '/drive', DRIVE_STRONG)
+
+    def _export_pwm(self, pwm):
+        if pwm not in self.pwms:
+            raise OSError(errno.EINVAL, os.strerror(errno.EINVAL))
+        pwm_dir = '%s/pwm%d' % (self.pwm_path, pwm)
+        if os.path.isdir(pwm_dir):
+            raise OSError(errno.EBUSY, os.strerror(errno.EBUSY))
+        self._write(pwm_dir + '/period', 0)
+        self._write(pwm_dir + '/duty_cycle', 0)
+        self._write(pwm_dir + '/enable', 0)
+
+    def _unexport(self, path):
+        if not os.path.isdir(path):
+            raise OSError(errno.EINVAL, os.strerror(errno.EINVAL))
+        shutil.rmtree(path)
+
+    def _write(self, path, value):
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(path, 'w') as f:
+            f.write('%s\n' % value)
+
+    def _read(self, path):
+        # Files are rewritten in place without truncating them, as sysfs
+        # attributes are. The first line holds the latest value.
+        with open(path) as f:
+            return f.readline().strip()
+
+
+class _SimulatedGPIOChipIO(GPIOChipIO):
+
+    """GPIO character devices of a SysfsSimulator.
+
+    The levels of the lines are kept in memory. Line event requests are
+    pipes, written to when SysfsSimulator.set_digital changes the level of
+    their line.
+    """
+
+    def __init__(self, simulator):
+        self.simulator = simulator
+        # Chip descriptor -> base, request descriptor -> (Linux GPIOs,
+        # output, edge, write end of the event pipe), requested Linux GPIOs,
+        # Linux GPIO -> level and Linux GPIO -> flags of its last request.
+        self.chips = {}
+        self.requests = {}
+        self.requested = set()
+        self.levels = {}
+        self.flags = {}
+
+    def open(self, path):
+        base = self.simulator.chip_bases.get(os.path.basename(path))
+        if base is None:
+            raise OSError(errno.ENOENT, os.strerror(errno.ENOENT))
+        fd = os.open(os.devnull, os.O_RDWR)
+        self.chips[fd] = base
+        return fd
+
+    def close(self, fd):
+        self.chips.pop(fd, None)
+        entry = self.requests.pop(fd, None)
+        if entry is not None:
+            lines, output, edge, pipe = entry
+            self.requested.difference_update(lines)
+            if pipe is not None:
+                os.close(pipe)
+        os.close(fd)
+
+    def request_lines(self, fd, offsets, output, values, label, flags=0):
+        lines = self._claim(fd, offsets)
+        if output:
+            for line, value in zip(lines, values):
+                self.levels[line] = int(value)
+        for line in lines:
+            self.flags[line] = flags
+        handle = os.open(os.devnull, os.O_RDWR)
+        self.requests[handle] = (lines, output, None, None)
+        return handle
+
+    def get_values(self, fd, data):
+        for index, line in enumerate(self.requests[fd][0]):
+            data.values[index] = self.levels.get(line, 0)
+
+    def set_values(self, fd, data):
+        lines, output, edge, pipe = self.requests[fd]
+        if not output:
+            raise OSError(errno.EPERM, os.strerror(errno.EPERM))
+        for index, line in enumerate(lines):
+            self.levels[line] = data.values[index]
+
+    def request_event(self, fd, offset, edge, label):
+        lines = self._claim(fd, (offset, ))
+        read_end, write_end = os.pipe()
+        self.requests[read_end] = (lines, False, edge, write_end)
+        return read_end
+
+    def set_level(self, line, value):
+        """Drive the level of a requested input line."""
+        previous = self.levels.get(line, 0)
+        self.levels[line] = value
+        if value == previous:
+            return
+        edge = RISING if value else FALLING
+        for lines, output, wanted, pipe in self.requests.values():
+            if pipe is not None and lines[0] == line and \
+                    wanted in (edge, CHANGE):
+                os.write(pipe, _GPIOEVENT_DATA.pack(int(_monotonic() * 1e9),
+                                                    1 if value else 2))
+
+    def _claim(self, fd, offsets):
+        base = self.chips[fd]
+        lines = tuple(base + offset for offset in offsets)
+        if self.requested.intersection(lines):
+            raise OSError(errno.EBUSY, os.strerror(errno.EBUSY))
+        self.requested.update(lines)
+        return lines
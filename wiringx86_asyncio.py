@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright © 2014, Emutex Ltd.
+# All rights reserved.
+# http://www.emutex.com
+#
+# See license in LICENSE.txt file.
+#
+# asyncio support for Wiring-x86. Requires Python 3.7 or newer.
+
+import asyncio
+import errno
+import os
+import select
+
+from wiringx86 import CHANGE, FALLING, RISING, _monotonic
+
+
+class AsyncGPIO(object):
+
+    """asyncio facade over a GPIO object.
+
+    Waiting for edges and sampling analog inputs never blocks the event loop,
+    so many pins can be watched concurrently from coroutines without
+    threads. Every other attribute is taken from the wrapped GPIO object, so
+    pinMode, digitalWrite and friends are used as usual.
+
+    Sysfs value files always poll as readable and signal edges with
+    POLLPRI, which the event loop does not watch for. The value files, or
+    the line event requests on boards using the GPIO character devices, are
+    therefore registered with an epoll object of our own and the event loop
+    watches that one instead.
+
+    Watched pins always report both edges, so that waits for different
+    edges of the same pin can be pending at once. Every wait only completes
+    on the edge it asked for.
+    """
+
+    def __init__(self, gpio):
+        """Constructor
+
+        Args:
+            gpio: GPIOGalileo, GPIOGalileoGen2 or GPIOEdison object
+
+        """
+        self.gpio = gpio
+        self.loop = None
+        self.epoll = select.epoll()
+        # Arduino pin -> descriptor for every watched pin, and descriptor
+        # -> list of (edge, future) waiting for the next such edge.
+        self.watched = {}
+        self.waiters = {}
+
+    def __getattr__(self, name):
+        return getattr(self.gpio, name)
+
+    async def wait_for_edge(self, pin, mode=CHANGE, timeout=None):
+        """Wait until the level of a GPIO pin changes.
+
+        The GPIO pin is assumed to be configured as one of the INPUT modes.
+
+        Args:
+            pin: Arduino pin number (0-19)
+            mode: edge to wait for: RISING, FALLING or CHANGE
+            timeout: seconds to wait before raising asyncio.TimeoutError.
+                     Waits forever when None.
+
+        Returns:
+            Monotonic time in seconds at which the edge was seen.
+
+        """
+        fd = self._watch(pin, mode)
+        waiter = (mode, self.loop.create_future())
+        self.waiters[fd].append(waiter)
+        try:
+            return await asyncio.wait_for(waiter[1], timeout)
+        finally:
+            if waiter in self.waiters.get(fd, ()):
+                self.waiters[fd].remove(waiter)
+
+    async def sample(self, pin, interval, count=None):
+        """Read an analog input periodically.
+
+        The GPIO pin is assumed to be configured as ANALOG_INPUT. Readings are
+        scheduled at absolute deadlines, so the period does not drift with
+        the time spent reading. Deadlines missed because the event loop was
+        busy are skipped rather than bunched up.
+
+        Args:
+            pin: Arduino analog pin number (14-19)
+            interval: sampling period in seconds
+            count: number of samples to take. Runs forever when None.
+
+        Yields:
+            (timestamp, value) tuples, where value is the analogRead result
+            and timestamp the monotonic time in seconds it was taken at.
+
+        """
+        loop = self._get_loop()
+        deadline = loop.time()
+        taken = 0
+        while count is None or taken < count:
+            yield _monotonic(), self.gpio.analogRead(pin)
+            taken += 1
+            deadline += interval
+            now = loop.time()
+            if deadline < now:
+                deadline = now
+            await asyncio.sleep(deadline - now)
+
+    def unwatch(self, pin):
+        """Stop watching a GPIO pin for edges.
+
+        Pending wait_for_edge calls on the pin are cancelled.
+
+        Args:
+            pin: Arduino pin number (0-19)
+
+        """
+        if pin not in self.watched:
+            return
+        fd = self.watched.pop(pin)
+        for mode, future in self.waiters.pop(fd):
+            future.cancel()
+        self._unregister(self.gpio.GPIO_MAPPING[pin], fd)
+
+    def close(self):
+        """Stop watching all the pins and release the epoll object."""
+        for pin in list(self.watched):
+            self.unwatch(pin)
+        self._remove_reader()
+        self.epoll.close()
+
+    def _get_loop(self):
+        # The epoll object is watched by the loop running the caller, which
+        # changes with every asyncio.run call for instance.
+        loop = asyncio.get_running_loop()
+        if loop is not self.loop:
+            self._remove_reader()
+            # Futures of the previous loop can not be completed any more.
+            for fd in self.waiters:
+                self.waiters[fd] = []
+            loop.add_reader(self.epoll.fileno(), self._dispatch)
+            self.loop = loop
+        return loop
+
+    def _remove_reader(self):
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.remove_reader(self.epoll.fileno())
+        self.loop = None
+
+    def _watch(self, pin, mode):
+        if pin not in self.gpio.GPIO_MAPPING:
+            raise ValueError('Invalid pin %r' % (pin, ))
+        if mode not in (RISING, FALLING, CHANGE):
+            raise ValueError('Invalid edge mode %r' % (mode, ))
+        self._get_loop()
+
+        fd = self.watched.get(pin)
+        if fd is None:
+            fd = self._register(self.gpio.GPIO_MAPPING[pin])
+            self.watched[pin] = fd
+            self.waiters[fd] = []
+        return fd
+
+    def _register(self, linux_pin):
+        # Line event requests are readable while edges are queued, value
+        # files signal them with POLLPRI.
+        if self.gpio.gpiochip is not None:
+            fd = self.gpio._request_line_event(linux_pin, CHANGE)
+            try:
+                self.epoll.register(fd, select.EPOLLIN | select.EPOLLERR)
+            except OSError:
+                self.gpio._release_line_event(linux_pin, fd)
+                raise
+            return fd
+
+        error = self.gpio._set_edge(linux_pin, CHANGE)
+        if error:
+            raise OSError(error, os.strerror(error))
+        fd = self.gpio._open_edge_fd(linux_pin)
+        try:
+            # Reading the value file acknowledges any pending edge.
+            os.pread(fd, 8, 0)
+            self.epoll.register(fd, select.EPOLLPRI | select.EPOLLERR)
+        except OSError:
+            os.close(fd)
+            self.gpio._set_edge(linux_pin, 'none')
+            raise
+        return fd
+
+    def _unregister(self, linux_pin, fd):
+        self.epoll.unregister(fd)
+        if self.gpio.gpiochip is not None:
+            self.gpio._release_line_event(linux_pin, fd)
+            return
+        os.close(fd)
+        self.gpio._set_edge(linux_pin, 'none')
+
+    def _dispatch(self):
+        try:
+            events = self.epoll.poll(0)
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                return
+            raise
+        timestamp = _monotonic()
+        for fd, mask in events:
+            if fd not in self.waiters:
+                continue
+            if self.gpio.gpiochip is not None:
+                edges = self.gpio.gpiochip.read_edges(fd)
+            else:
+                # The level read back tells which edge it was.
+                value = os.pread(fd, 8, 0)
+                edges = [RISING if value[:1] == b'1' else FALLING]
+            pending = []
+            for waiter in self.waiters[fd]:
+                mode, future = waiter
+                if future.done():
+                    continue
+                if mode == CHANGE or mode in edges:
+                    future.set_result(timestamp)
+                else:
+                    pending.append(waiter)
+            self.waiters[fd] = pending